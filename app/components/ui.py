@@ -1,4 +1,5 @@
 import streamlit as st
+import time
 
 def load_custom_css():
     st.markdown("""
@@ -67,3 +68,17 @@ def load_custom_css():
         
         </style>
     """, unsafe_allow_html=True)
+
+def show_job_progress(message):
+    """后台任务进行中的提示 (不中断脚本，页面其余部分照常渲染)"""
+    st.info(f"⏳ {message}（后台生成中，可以先去其他页面，完成后回来查看）")
+
+def rerun_after(interval=2):
+    """稍后重跑脚本再次查询任务状态；放在脚本末尾，避免之后的内容 (如其他标签页) 来不及渲染"""
+    time.sleep(interval)
+    st.rerun()
+
+def wait_for_job(message, interval=2):
+    """后台任务进行中: 显示提示，稍后重跑脚本再次查询任务状态"""
+    show_job_progress(message)
+    rerun_after(interval)
@@ -6,12 +6,14 @@ import json
 # Path hack
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from database.models import init_db, SessionLocal, InterviewSession
+from database.models import init_db, session_scope
 from core.auth import init_admin_user, get_user_by_username
 from database import crud
 from core.agents.interviewer import InterviewerAgent
 from core.llm import get_llm
-from components.ui import load_custom_css
+from core.memory import ConversationMemory
+from core import jobs
+from components.ui import load_custom_css, wait_for_job
 
 # --- Page Config ---
 st.set_page_config(page_title="AI 面试官", page_icon="🤖", layout="wide")
@@ -22,23 +24,19 @@ if "logged_in" not in st.session_state:
     # Initialize DB and Admin User
     try:
         init_db()
-        db = SessionLocal()
-        init_admin_user(db)
-        
-        # Auto-login as admin
-        admin_user = get_user_by_username(db, "admin")
+        with session_scope() as db:
+            init_admin_user(db)
+            
+            # Auto-login as admin
+            admin_user = get_user_by_username(db, "admin")
         if admin_user:
             st.session_state.logged_in = True
             st.session_state.user_id = admin_user.id
             st.session_state.username = admin_user.username
-        db.close()
     except Exception as e:
         st.error(f"System Init Failed: {e}")
 
 # --- Resources ---
-def get_db():
-    return SessionLocal()
-
 @st.cache_resource
 def get_interviewer():
     try:
@@ -88,11 +86,10 @@ if not st.session_state.interview_session_id:
             if mode == "JD 模拟" and not jd_text:
                 st.error("请务必填写 JD 内容")
             else:
-                db = get_db()
-                sess = crud.create_interview_session(db, st.session_state.user_id, topic)
+                with session_scope() as db:
+                    sess = crud.create_interview_session(db, st.session_state.user_id, topic)
                 st.session_state.interview_session_id = sess.id
                 st.session_state.current_jd = jd_text
-                db.close()
                 st.rerun()
 
 else:
@@ -116,14 +113,27 @@ else:
     # Report View
     if st.session_state.get("show_report", False):
         st.title("📑 面试评估报告")
-        db = get_db()
-        sess = db.get(InterviewSession, st.session_state.interview_session_id)
+        with session_scope() as db:
+            sess = crud.get_interview_session(db, st.session_state.interview_session_id, with_feedback=True)
+            msgs = crud.get_session_messages(db, sess.id)
         
         if not sess.feedback and interviewer:
-            with st.spinner("🧠 面试官正在深度复盘整场面试..."):
-                rep = interviewer.generate_final_report(sess.messages)
-                crud.update_session_feedback(db, sess.id, rep.get("total_score", 0), json.dumps(rep))
-                sess = db.get(InterviewSession, sess.id)
+            # 报告由后台任务生成，同一场面试只会有一个生成任务
+            report_key = jobs.final_report_key(sess.id)
+            job = jobs.get_latest_job(report_key)
+            if job is None:
+                job = jobs.submit("final_report", report_key, {"session_id": sess.id}, user_id=st.session_state.user_id)
+            if job.status == "done":
+                # 任务在上面读取面试之后才完成: 重新读取报告，不再重复入队
+                with session_scope() as db:
+                    sess = crud.get_interview_session(db, sess.id, with_feedback=True)
+            if job.status == "failed" or (job.status == "done" and not sess.feedback):
+                st.error(f"报告生成失败: {job.error or '未找到报告'}")
+                if st.button("🔄 重新生成报告"):
+                    jobs.submit("final_report", report_key, {"session_id": sess.id}, user_id=st.session_state.user_id)
+                    st.rerun()
+            elif jobs.is_active(job):
+                wait_for_job("面试官正在深度复盘整场面试...")
         
         if sess.feedback:
             try:
@@ -132,7 +142,7 @@ else:
                 # Score Card
                 c1, c2, c3 = st.columns(3)
                 c1.metric("最终得分", data.get("total_score"))
-                c2.metric("对话轮次", int(len(sess.messages)/2))
+                c2.metric("对话轮次", int(len(msgs)/2))
                 
                 st.info(f"**综合评价**: {data.get('summary')}")
                 
@@ -154,16 +164,14 @@ else:
              st.session_state.show_report = False
              st.session_state.interview_session_id = None
              st.rerun()
-             
-        db.close()
 
     # Active Chat
     else:
         st.subheader("正在面试中...")
         
-        db = get_db()
-        sess = db.get(InterviewSession, st.session_state.interview_session_id)
-        msgs = sess.messages if sess.messages else []
+        with session_scope() as db:
+            sess = crud.get_interview_session(db, st.session_state.interview_session_id)
+            msgs = crud.get_session_messages(db, sess.id)
         
         # Chat Container
         chat_container = st.container()
@@ -179,27 +187,36 @@ else:
         if not msgs or msgs[-1]["role"] == "human" or msgs[-1]["role"] == "user":
              if interviewer:
                  with st.chat_message("assistant", avatar="🤖"):
-                     with st.spinner("面试官思考中..."):
-                         # Context for AI
-                         context = {
-                             "mode": "通用", # Simplified for now
-                             "topic": sess.topic,
-                             "jd": st.session_state.current_jd
-                         }
-                         
-                         response = interviewer.conduct_interview(msgs, context)
-                         st.write(response)
-                         
-                         # Save to DB
+                     # Context for AI
+                     context = {
+                         "mode": "通用", # Simplified for now
+                         "topic": sess.topic,
+                         "jd": st.session_state.current_jd
+                     }
+
+                     # 早前对话以滚动摘要形式带入，prompt 长度不随面试轮数增长
+                     memory = ConversationMemory.from_state(interviewer.llm, sess.memory)
+
+                     # 流式输出，首个 token 到达即开始渲染
+                     # 传入 session_id: 上一轮预取的题库真题已就绪时，模型只需写点评
+                     response = st.write_stream(interviewer.conduct_interview_stream(msgs, context, memory, session_id=sess.id))
+
+                     # Save to DB (完整回复只写一次，流式生成期间不占用数据库连接)
+                     with session_scope() as db:
                          crud.add_message_to_session(db, sess.id, "ai", response)
-                         # Rerun to update state
-                         st.rerun()
+
+                     # 每满 K 轮在后台更新摘要，用户作答期间完成，不阻塞下一轮
+                     if memory.needs_update(len(msgs) + 1):
+                         jobs.submit("memory_summary", jobs.memory_summary_key(sess.id), {"session_id": sess.id}, user_id=st.session_state.user_id)
+                     # 用户作答期间在后台预取下一题
+                     interviewer.prefetch_next_question(sess.id, msgs + [{"role": "ai", "content": response}], context)
+                     # Rerun to update state
+                     st.rerun()
 
         # User Input
         if prompt := st.chat_input("请输入你的回答..."):
             with st.chat_message("user", avatar="🧑‍💻"):
                 st.write(prompt)
-            crud.add_message_to_session(db, sess.id, "human", prompt)
+            with session_scope() as db:
+                crud.add_message_to_session(db, sess.id, "human", prompt)
             st.rerun()
-            
-        db.close()
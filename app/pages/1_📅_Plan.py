@@ -1,15 +1,17 @@
 import streamlit as st
 import sys
 import os
+from datetime import date
 
 # Path hack
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
-from database.models import SessionLocal
+from database.models import session_scope
 from database import crud
 from core.agents.supervisor import SupervisorAgent
 from core.llm import get_llm
-from components.ui import load_custom_css
+from core import jobs
+from components.ui import load_custom_css, show_job_progress, rerun_after
 from core.data.templates import get_template_names, get_template
 
 st.set_page_config(page_title="每日规划", page_icon="📅", layout="wide")
@@ -23,10 +25,6 @@ if "logged_in" not in st.session_state or not st.session_state.logged_in:
     
 user_id = st.session_state.user_id
 
-def get_db():
-    db = SessionLocal()
-    return db
-
 st.title("📅 学习规划与监督")
 
 # Sidebar
@@ -45,12 +43,14 @@ def get_agent():
         return None
 
 supervisor = get_agent()
-db = get_db()
 
 tab1, tab2 = st.tabs(["📋 今日待办", "🗺️ 长期路线"])
+# 有进行中的后台任务时，两个标签页都渲染完后再统一重跑轮询
+polling = False
 
 with tab1:
-    today_plan = crud.get_today_plan(db, user_id)
+    with session_scope() as db:
+        today_plan = crud.get_today_plan(db, user_id)
     
     if today_plan:
         st.success(f"🗓️ {today_plan.date} | {today_plan.encouragement}")
@@ -84,7 +84,8 @@ with tab1:
                 updated = True
 
         if updated:
-            crud.update_plan_status(db, today_plan.id, tasks)
+            with session_scope() as db:
+                crud.update_plan_status(db, today_plan.id, tasks)
             st.rerun()
 
         # Progress
@@ -94,23 +95,26 @@ with tab1:
 
     else:
         st.write("美好的一天从规划开始。")
+        with session_scope() as db:
+            frequent_weaknesses = crud.get_frequent_weaknesses(db, user_id, days=30, limit=3)
+        if frequent_weaknesses:
+            st.caption(f"🎯 近 30 天的高频短板: {', '.join(w['weakness'] for w in frequent_weaknesses)}")
+        # 计划由后台任务生成并直接写入数据库，离开页面也不会中断
+        plan_key = jobs.daily_plan_key(user_id, date.today())
+        plan_job = jobs.get_latest_job(plan_key)
+        if jobs.is_active(plan_job):
+            show_job_progress("AI 正在分析你的近期表现并生成计划...")
+            polling = True
+        if plan_job and plan_job.status == "failed":
+            st.error(f"计划生成失败: {plan_job.error}")
+
         if st.button("生成今日计划", type="primary"):
             if not supervisor:
                 st.error("LLM Agent 未初始化，请检查配置。")
             else:
-                with st.spinner("AI 正在分析你的近期表现并生成计划..."):
-                    weaknesses = crud.get_recent_weaknesses(db, user_id)
-                    user_profile = {"target_role": target_role, "days_left": days_left, "current_level": current_level}
-                    plan = supervisor.generate_daily_plan(user_profile, recent_weaknesses=weaknesses)
-                    
-                    if "error" in plan:
-                        st.error(plan['error'])
-                    else:
-                        tasks_raw = plan.get('tasks', [])
-                        # Normalize
-                        final_tasks = [{"topic": t.get("topic",""), "description": t.get("description",""), "estimated_time": t.get("estimated_time","30min"), "status": "pending"} for t in tasks_raw]
-                        crud.create_daily_plan(db, user_id, final_tasks, plan.get("encouragement"))
-                        st.rerun()
+                user_profile = {"target_role": target_role, "days_left": days_left, "current_level": current_level}
+                jobs.submit("daily_plan", plan_key, {"user_id": user_id, "user_profile": user_profile}, user_id=user_id)
+                st.rerun()
 
 with tab2:
     st.subheader("职业路线图")
@@ -118,6 +122,12 @@ with tab2:
     if "roadmap" not in st.session_state:
         st.session_state.roadmap = None
 
+    roadmap_job = jobs.get_latest_job(jobs.roadmap_key(user_id))
+    if roadmap_job and roadmap_job.status == "done" and st.session_state.get("roadmap_job_id") != roadmap_job.id:
+        # 后台生成完成 (或刷新页面后恢复上次的结果)
+        st.session_state.roadmap = roadmap_job.result
+        st.session_state.roadmap_job_id = roadmap_job.id
+
     selected_template = st.selectbox("选择路线图模板", ["Custom"] + get_template_names())
     
     if selected_template != "Custom":
@@ -137,12 +147,22 @@ with tab2:
     else:
         st.info("暂无路线图。")
 
+    if jobs.is_active(roadmap_job):
+        show_job_progress("正在规划...")
+        polling = True
+    if roadmap_job and roadmap_job.status == "failed":
+        st.error(f"路线图生成失败: {roadmap_job.error}")
+
     if st.button("从头生成 (AI)", help="利用 DeepSeek 规划你的职业路径"):
         if not supervisor:
             st.error("缺少 API Key")
         else:
-             with st.spinner("正在规划..."):
-                 st.session_state.roadmap = supervisor.generate_roadmap({"target_role": target_role, "days_left": days_left})
-                 st.rerun()
+            jobs.submit(
+                "roadmap", jobs.roadmap_key(user_id),
+                {"user_profile": {"target_role": target_role, "days_left": days_left}},
+                user_id=user_id
+            )
+            st.rerun()
 
-db.close()
+if polling:
+    rerun_after()
@@ -4,11 +4,12 @@ import os
 import json
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
-from database.models import SessionLocal, InterviewSession
+from database.models import session_scope
 from database import crud
 from core.agents.interviewer import InterviewerAgent
 from core.llm import get_llm
-from components.ui import load_custom_css
+from core import jobs
+from components.ui import load_custom_css, wait_for_job
 
 st.set_page_config(page_title="Mock Interview", page_icon="🤖", layout="wide")
 load_custom_css()
@@ -18,9 +19,6 @@ if "logged_in" not in st.session_state or not st.session_state.logged_in:
     st.warning("Please login from the main page first.")
     st.stop()
 
-def get_db():
-    return SessionLocal()
-
 @st.cache_resource
 def get_interviewer():
     try:
@@ -59,11 +57,10 @@ with col_conf:
         if mode == "JD Simulation" and not jd_text:
             st.error("Please input JD first")
         else:
-            db = get_db()
-            sess = crud.create_interview_session(db, st.session_state.user_id, topic)
+            with session_scope() as db:
+                sess = crud.create_interview_session(db, st.session_state.user_id, topic)
             st.session_state.interview_session_id = sess.id
             st.session_state.current_jd = jd_text
-            db.close()
             st.rerun()
 
     if st.session_state.interview_session_id:
@@ -75,14 +72,25 @@ with col_conf:
 with col_chat:
     if st.session_state.get("show_report", False):
         st.subheader("📑 面试评估报告")
-        db = get_db()
-        sess = db.query(InterviewSession).get(st.session_state.interview_session_id)
+        with session_scope() as db:
+            sess = crud.get_interview_session(db, st.session_state.interview_session_id, with_feedback=True)
         
         if not sess.feedback and interviewer:
-            with st.spinner("AI 面试官正在整理面试笔记..."):
-                rep = interviewer.generate_final_report(sess.messages)
-                crud.update_session_feedback(db, sess.id, rep.get("total_score", 0), json.dumps(rep))
-                sess = db.query(InterviewSession).get(sess.id)
+            report_key = jobs.final_report_key(sess.id)
+            job = jobs.get_latest_job(report_key)
+            if job is None:
+                job = jobs.submit("final_report", report_key, {"session_id": sess.id}, user_id=st.session_state.user_id)
+            if job.status == "done":
+                # 任务在上面读取面试之后才完成: 重新读取报告，不再重复入队
+                with session_scope() as db:
+                    sess = crud.get_interview_session(db, sess.id, with_feedback=True)
+            if job.status == "failed" or (job.status == "done" and not sess.feedback):
+                st.error(f"报告生成失败: {job.error or '未找到报告'}")
+                if st.button("🔄 重新生成"):
+                    jobs.submit("final_report", report_key, {"session_id": sess.id}, user_id=st.session_state.user_id)
+                    st.rerun()
+            elif jobs.is_active(job):
+                wait_for_job("AI 面试官正在整理面试笔记...")
         
         if sess.feedback:
             try:
@@ -108,14 +116,12 @@ with col_chat:
         if st.button("返回"):
             st.session_state.show_report = False
             st.rerun()
-            
-        db.close()
 
     elif st.session_state.interview_session_id:
         # Chat Interface
-        db = get_db()
-        sess = db.query(InterviewSession).get(st.session_state.interview_session_id)
-        msgs = sess.messages if sess.messages else []
+        with session_scope() as db:
+            sess = crud.get_interview_session(db, st.session_state.interview_session_id)
+            msgs = crud.get_session_messages(db, sess.id)
         
         chat_box = st.container(height=600)
         
@@ -137,8 +143,9 @@ with col_chat:
              if interviewer:
                  with st.spinner("面试官正在准备题目..."):
                      q = interviewer.generate_question(sess.topic, difficulty, jd_text=st.session_state.current_jd)
+                 with session_scope() as db:
                      crud.add_message_to_session(db, sess.id, "assistant", q)
-                     st.rerun()
+                 st.rerun()
         
         elif msgs[-1]["role"] == "user":
              if interviewer:
@@ -158,13 +165,13 @@ with col_chat:
                          next_q_text = f"**下一题**: {new_q}"
                      
                      full_resp = f"{feedback}\n\n---SEPARATOR---\n\n{next_q_text}"
+                 with session_scope() as db:
                      crud.add_message_to_session(db, sess.id, "assistant", full_resp)
-                     st.rerun()
+                 st.rerun()
 
         if prompt := st.chat_input("输入回答..."):
-            crud.add_message_to_session(db, sess.id, "user", prompt)
+            with session_scope() as db:
+                crud.add_message_to_session(db, sess.id, "user", prompt)
             st.rerun()
-            
-        db.close()
     else:
         st.info("👈 请在左侧配置并开始新的面试。")
@@ -1,13 +1,16 @@
 import streamlit as st
 import sys
 import os
-from datetime import datetime
+import time
+import hashlib
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
-from components.ui import load_custom_css
-from core.llm import get_llm
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from components.ui import load_custom_css, wait_for_job
+from core import jobs
+from core.search import SearchIndex
+from core.config import LIBRARY_INDEX_PATH
+from database.models import session_scope
+from database import crud
 
 st.set_page_config(page_title="Library", page_icon="📚", layout="wide")
 load_custom_css()
@@ -204,11 +207,51 @@ LLM 有两大痛点：**知识过期**（训练数据截止于过去）和 **幻
 """
 }
 
-# Session State for User Docs
-if "user_docs" not in st.session_state:
-    st.session_state.user_docs = {}
-
-all_docs = {**DEFAULT_DOCS, **st.session_state.user_docs}
+# --- Docs ---
+# 预置文章以标题为 key，数据库中的研报以 "kb:<id>" 为 key；目录只查标题，正文在选中时才加载
+def kb_key(doc_id):
+    return f"kb:{doc_id}"
+
+with session_scope() as db:
+    kb_titles = crud.list_knowledge_doc_titles(db)
+
+doc_titles = {title: title for title in DEFAULT_DOCS}
+doc_titles.update({kb_key(row.id): row.topic for row in kb_titles})
+kb_rows = {kb_key(row.id): row for row in kb_titles}
+
+def load_doc_content(doc_key):
+    if doc_key in DEFAULT_DOCS:
+        return DEFAULT_DOCS[doc_key]
+    with session_scope() as db:
+        doc = crud.get_knowledge_doc(db, kb_rows[doc_key].id)
+        return doc.content if doc else ""
+
+# --- Search Index ---
+@st.cache_resource
+def get_search_index():
+    return SearchIndex.load_or_create(LIBRARY_INDEX_PATH)
+
+def sync_search_index(index):
+    """增量同步: 只为新增或有更新的文档加载正文并索引，有变化时落盘"""
+    changed = False
+    for title, content in DEFAULT_DOCS.items():
+        signature = hashlib.md5(content.encode("utf-8")).hexdigest()
+        if index.signature(title) != signature:
+            index.add_document(title, title, content, signature=signature)
+            changed = True
+    for doc_key, row in kb_rows.items():
+        signature = str(row.updated_at)
+        if index.signature(doc_key) != signature:
+            index.add_document(doc_key, row.topic, load_doc_content(doc_key), signature=signature)
+            changed = True
+    if changed:
+        index.save(LIBRARY_INDEX_PATH)
+
+search_index = get_search_index()
+sync_search_index(search_index)
+
+if "selected_doc" not in st.session_state:
+    st.session_state.selected_doc = None
 
 # UI Layout
 col_list, col_content = st.columns([1, 3])
@@ -219,44 +262,75 @@ with col_list:
     # Tool: AI Researcher
     with st.expander("🕵️‍♂️ AI 深度调研员", expanded=True):
         new_topic = st.text_input("输入想调研的课题", placeholder="例如: 扩散模型原理, K8s架构")
+        force_refresh = st.checkbox("忽略已有研报，重新生成", value=False)
         if st.button("生成深度研报", type="primary", use_container_width=True):
              if not new_topic:
                  st.error("请输入主题")
              else:
-                 with st.spinner(f"正在全网检索并撰写 '{new_topic}' 的技术内参..."):
-                     try:
-                         llm = get_llm()
-                         prompt = ChatPromptTemplate.from_template("""
-你是一名资深技术专家和大学教授。请为主题 "{topic}" 撰写一篇**深度技术内参**。
-要求：
-1. **结构清晰**：包含 核心概念、底层原理 (源码/数学级)、工业界应用场景、面试高频考察点 (Pros/Cons)。
-2. **拒绝浅薄**：不要只写百科简介，要写出"内行看门道"的深度。如果涉及算法，请简要解释关键公式；如果涉及系统，请提及架构取舍。
-3. **格式美观**：使用 Markdown，合理使用由标题、列表、代码块。
-4. **语言**：使用中文。
-                         """)
-                         chain = prompt | llm | StrOutputParser()
-                         content = chain.invoke({"topic": new_topic})
-                         st.session_state.user_docs[new_topic] = content
-                         st.rerun()
-                     except Exception as e:
-                         st.error(f"生成失败: {e}")
+                 with session_scope() as db:
+                     existing = crud.get_knowledge_doc_by_topic(db, new_topic)
+
+                 if existing and not force_refresh:
+                     # 热门课题只生成一次，直接复用
+                     st.session_state.selected_doc = kb_key(existing.id)
+                 else:
+                     # 同一课题同时只会有一个生成任务，多人同时点击共享同一份结果
+                     job = jobs.submit(
+                         "research", jobs.research_key(new_topic),
+                         {"topic": new_topic, "user_id": st.session_state.user_id, "overwrite": force_refresh},
+                         user_id=st.session_state.user_id
+                     )
+                     st.session_state.research_job_id = job.id
+                 st.rerun()
+
+        research_job_id = st.session_state.get("research_job_id")
+        if research_job_id:
+            job = jobs.get_job(research_job_id)
+            if jobs.is_active(job):
+                wait_for_job(f"正在全网检索并撰写 '{job.payload['topic']}' 的技术内参...")
+            st.session_state.research_job_id = None
+            if job and job.status == "done":
+                st.session_state.selected_doc = kb_key(job.result["doc_id"])
+                st.rerun()
+            elif job:
+                st.error(f"生成失败: {job.error}")
 
     st.markdown("---")
-    selected_doc = st.radio("文章列表", list(all_docs.keys()), label_visibility="collapsed")
+    query = st.text_input("🔍 搜索知识库", placeholder="例如: 缓存雪崩, LoRA, MVCC")
+    if query:
+        start = time.perf_counter()
+        doc_options = [doc_key for doc_key, _ in search_index.search(query, limit=50) if doc_key in doc_titles]
+        st.caption(f"找到 {len(doc_options)} 篇 ({(time.perf_counter() - start) * 1000:.1f} ms)")
+    else:
+        doc_options = list(doc_titles.keys())
+
+    selected_index = doc_options.index(st.session_state.selected_doc) if st.session_state.selected_doc in doc_options else 0
+    selected_doc = st.radio(
+        "文章列表", doc_options, index=selected_index if doc_options else None,
+        format_func=lambda k: doc_titles[k], label_visibility="collapsed"
+    )
+    st.session_state.selected_doc = selected_doc
 
 with col_content:
     if selected_doc:
-        st.header(selected_doc)
-        st.markdown(all_docs[selected_doc])
+        st.header(doc_titles[selected_doc])
+        st.markdown(load_doc_content(selected_doc))
         
         # Action Buttons
         c1, c2 = st.columns([1, 6])
         with c1:
             if st.button("🗑️ 删除笔记"):
-                 if selected_doc in st.session_state.user_docs:
-                     del st.session_state.user_docs[selected_doc]
-                     st.rerun()
-                 else:
+                 if selected_doc not in kb_rows:
                      st.error("系统预置内容无法删除")
+                 else:
+                     with session_scope() as db:
+                         deleted = crud.delete_knowledge_doc(db, kb_rows[selected_doc].id, st.session_state.user_id)
+                     if deleted:
+                         search_index.remove_document(selected_doc)
+                         search_index.save(LIBRARY_INDEX_PATH)
+                         st.session_state.selected_doc = None
+                         st.rerun()
+                     else:
+                         st.error("只能删除自己生成的研报")
     else:
         st.info("👈 请在左侧选择文章，或使用 AI 调研新知识")
@@ -47,44 +47,77 @@ if "scout_results" not in st.session_state:
 if do_search and scout:
     with st.spinner(f"正在全网探测 '{search_kw}' 相关的高质量机会..."):
         results = scout.hunt_jobs(search_kw)
-        st.session_state.scout_results = results
+        # 复制一份，分析结果会写回 job dict
+        st.session_state.scout_results = [dict(j) for j in results]
+
+def render_analysis(analysis):
+    st.markdown("### 🕵️‍♂️ 侦探报告")
+    
+    ac1, ac2, ac3 = st.columns(3)
+    with ac1:
+        st.metric("💰 真实薪资预估", analysis.get('estimated_salary', 'N/A'))
+    with ac2:
+        diff = analysis.get('difficulty_score', 50)
+        color = "red" if diff > 80 else "orange" if diff > 50 else "green"
+        st.markdown(f"**面试难度**: :{color}[{diff}/100]")
+    with ac3:
+         st.markdown(f"**毒舌点评**: *{analysis.get('insider_comment')}*")
+    
+    st.divider()
+    
+    if analysis.get('red_flags'):
+        st.error("🚩 **风险预警 (Red Flags)**")
+        for flag in analysis['red_flags']:
+            st.write(f"- {flag}")
+    else:
+        st.success("✅ 未发现明显深坑")
+        
+    st.info("📝 **简历修改建议**")
+    for tip in analysis.get('resume_tips', []):
+        st.write(f"👉 {tip}")
 
 if st.session_state.scout_results:
-    st.subheader(f"找到 {len(st.session_state.scout_results)} 个精选机会")
+    jobs = st.session_state.scout_results
+    st.subheader(f"找到 {len(jobs)} 个精选机会")
+
+    # 批量分析: 并发调用，谁先完成先展示谁，成功的结果存回 job["analysis"]，失败的仍算待分析
+    pending_count = sum(1 for j in jobs if not j.get("analysis"))
+    if pending_count and scout:
+        if st.button(f"⚡ 一键揭秘全部岗位 ({pending_count} 个待分析)", use_container_width=True):
+            progress = st.progress(0.0, text="侦探们已出发...")
+            done = 0
+            for idx, analysis in scout.analyze_jobs(jobs):
+                done += 1
+                job = jobs[idx]
+                progress.progress(done / pending_count, text=f"已完成 {done}/{pending_count}")
+                if "error" in analysis:
+                    st.write(f"❌ {job.get('company','Unknown')} | {job.get('title','Job')}: {analysis['error']}")
+                else:
+                    st.write(f"✅ {job.get('company','Unknown')} | {job.get('title','Job')}: *{analysis.get('insider_comment')}*")
+            if not any(j.get("analysis_error") for j in jobs):
+                st.rerun()
+            # 有失败的岗位时不立即刷新，留出时间查看上面的错误；失败的岗位可再次点击批量分析重试
     
-    for idx, job in enumerate(st.session_state.scout_results):
+    for idx, job in enumerate(jobs):
         with st.expander(f"🏢 {job.get('company','Unknown')} | {job.get('title','Job')} | {job.get('salary','Negotiable')}", expanded=False):
             st.write(f"📍 **地点**: {job.get('location','Remote')}")
             st.write(f"🏷️ **标签**: {', '.join(job.get('tags',[]))}")
             st.caption("📜 职位描述摘要:")
             st.text(job.get('content','').strip())
             
-            if st.button("🕵️‍♂️ 揭秘此岗位 (AI 深度分析)", key=f"btn_{idx}"):
-                if scout:
-                    with st.spinner("侦探正在调查背景..."):
-                        analysis = scout.analyze_jd(job.get('content',''))
-                        
-                        st.markdown("### 🕵️‍♂️ 侦探报告")
-                        
-                        ac1, ac2, ac3 = st.columns(3)
-                        with ac1:
-                            st.metric("💰 真实薪资预估", analysis.get('estimated_salary', 'N/A'))
-                        with ac2:
-                            diff = analysis.get('difficulty_score', 50)
-                            color = "red" if diff > 80 else "orange" if diff > 50 else "green"
-                            st.markdown(f"**面试难度**: :{color}[{diff}/100]")
-                        with ac3:
-                             st.markdown(f"**毒舌点评**: *{analysis.get('insider_comment')}*")
-                        
-                        st.divider()
-                        
-                        if analysis.get('red_flags'):
-                            st.error("🚩 **风险预警 (Red Flags)**")
-                            for flag in analysis['red_flags']:
-                                st.write(f"- {flag}")
+            if job.get("analysis"):
+                render_analysis(job["analysis"])
+            else:
+                if job.get("analysis_error"):
+                    st.error(f"上次分析失败，可重试: {job['analysis_error']}")
+                if st.button("🕵️‍♂️ 揭秘此岗位 (AI 深度分析)", key=f"btn_{idx}"):
+                    if scout:
+                        with st.spinner("侦探正在调查背景..."):
+                            analysis = scout.analyze_jd(job.get('content',''))
+                        if "error" in analysis:
+                            job["analysis_error"] = analysis["error"]
+                            st.error(analysis["error"])
                         else:
-                            st.success("✅ 未发现明显深坑")
-                            
-                        st.info("📝 **简历修改建议**")
-                        for tip in analysis.get('resume_tips', []):
-                            st.write(f"👉 {tip}")
+                            job["analysis"] = analysis
+                            job.pop("analysis_error", None)
+                            render_analysis(analysis)
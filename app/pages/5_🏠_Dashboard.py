@@ -5,15 +5,25 @@ import os
 # Path hack (adjusted for pages folder)
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
 
-from database.models import init_db, SessionLocal
+from database.models import init_db, session_scope, get_pool_stats
 from core.auth import verify_password, get_user_by_username, create_user
 from database import crud
 from components.ui import load_custom_css
+from components.charts import render_radar_chart
+from core.llm import get_llm
+from core.agents.analyst import AnalystAgent
 
 # --- Config ---
 st.set_page_config(page_title="CS 仪表盘", page_icon="🏠", layout="wide")
 load_custom_css()
 
+@st.cache_resource
+def get_analyst():
+    try:
+        return AnalystAgent(get_llm())
+    except Exception:
+        return None
+
 # --- Auth Check ---
 if "logged_in" not in st.session_state or not st.session_state.logged_in:
     st.warning("请先在主页完成自动登录。")
@@ -30,13 +40,14 @@ with st.sidebar:
 
 st.title("📊 个人仪表盘")
 
-db = SessionLocal()
-try:
-    user_id = st.session_state.user_id
+user_id = st.session_state.user_id
+with session_scope() as db:
     stats = crud.get_study_stats(db, user_id)
     today_plan = crud.get_today_plan(db, user_id)
-finally:
-    db.close()
+    # 汇总表按主题预聚合，不用逐场加载面试记录
+    topic_stats = crud.get_topic_score_stats(db, user_id)
+    frequent_weaknesses = crud.get_frequent_weaknesses(db, user_id, days=30, limit=5)
+    weakness_by_topic = crud.get_weakness_counts_by_topic(db, user_id, days=30)
 
 # Metrics
 c1, c2, c3 = st.columns(3)
@@ -55,6 +66,45 @@ c3.metric("今日待办任务", todo_count)
 
 st.divider()
 
+# Ability Analysis
+st.subheader("📈 能力分析")
+if topic_stats:
+    st.dataframe(
+        [{"主题": t["topic"], "场次": t["sessions"], "平均分": round(t["average_score"], 1)} for t in topic_stats],
+        use_container_width=True, hide_index=True
+    )
+else:
+    st.info("完成一场模拟面试后，这里会展示各主题的表现。")
+
+if st.button("🔄 生成/更新 能力评估报告"):
+    analyst = get_analyst()
+    if analyst is None:
+        st.error("LLM Agent 未初始化，请检查配置。")
+    else:
+        with st.spinner("分析师正在查阅你的所有档案..."):
+            st.session_state.analysis_report = analyst.analyze_progress([], stats, topic_stats=topic_stats)
+
+if "analysis_report" in st.session_state:
+    report = st.session_state.analysis_report
+    if report.get("radar_chart"):
+        render_radar_chart(report["radar_chart"])
+    st.info(f"📈 **趋势分析**: {report.get('trend_analysis')}")
+    st.success(f"💡 **核心建议**: {report.get('key_suggestion')}")
+
+# Weak Spots
+st.subheader("🎯 近 30 天高频短板")
+if frequent_weaknesses:
+    w1, w2 = st.columns(2)
+    with w1:
+        for w in frequent_weaknesses:
+            st.write(f"- {w['weakness']} (出现 {w['count']} 次)")
+    with w2:
+        st.bar_chart(weakness_by_topic)
+else:
+    st.info("最近 30 天的面试报告中没有记录到短板。")
+
+st.divider()
+
 # Navigation Cards
 st.subheader("🚀 你的 PDCA 闭环")
 
@@ -76,3 +126,14 @@ with col3:
     st.write("AI 模拟面试")
     if st.button("开始模拟面试", key="btn_interview"):
         st.switch_page("main.py")
+
+# System Status
+with st.expander("🔧 系统状态 (数据库连接池)"):
+    pool_stats = get_pool_stats()
+    if "avg_wait_ms" in pool_stats:
+        p1, p2, p3, p4 = st.columns(4)
+        p1.metric("已借出连接", f"{pool_stats['checked_out']} / {pool_stats['size']}")
+        p2.metric("平均等待", f"{pool_stats['avg_wait_ms']:.1f} ms")
+        p3.metric("最长等待", f"{pool_stats['max_wait_ms']:.1f} ms")
+        p4.metric("取连接超时", pool_stats["timeouts"])
+    st.caption(pool_stats["status"])
@@ -0,0 +1,96 @@
+import streamlit as st
+import sys
+import os
+import json
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from database.models import session_scope
+from database import crud
+from components.ui import load_custom_css
+from components.charts import render_trend_chart
+
+st.set_page_config(page_title="面试历史", page_icon="📜", layout="wide")
+load_custom_css()
+
+# --- Login Check ---
+if "logged_in" not in st.session_state or not st.session_state.logged_in:
+    st.warning("请先从主页登录。")
+    st.stop()
+
+user_id = st.session_state.user_id
+PAGE_SIZE = 20
+
+# 游标栈: 栈顶是当前页的游标，None 表示第一页
+if "history_cursors" not in st.session_state:
+    st.session_state.history_cursors = [None]
+if "history_session_id" not in st.session_state:
+    st.session_state.history_session_id = None
+
+st.title("📜 面试历史")
+
+with session_scope() as db:
+    trend = crud.get_score_trend(db, user_id)
+    rows, next_cursor = crud.get_session_history_page(
+        db, user_id, limit=PAGE_SIZE, cursor=st.session_state.history_cursors[-1]
+    )
+
+if trend:
+    render_trend_chart(trend)
+
+col_list, col_detail = st.columns([2, 3])
+
+with col_list:
+    page_no = len(st.session_state.history_cursors)
+    st.subheader(f"第 {page_no} 页")
+
+    if not rows:
+        st.info("暂无已完成的面试记录。")
+
+    for row in rows:
+        c1, c2 = st.columns([4, 1])
+        with c1:
+            st.write(f"**{row.topic}** · {row.score} 分 · {row.created_at:%Y-%m-%d %H:%M}")
+        with c2:
+            if st.button("查看", key=f"hist_{row.id}"):
+                st.session_state.history_session_id = row.id
+                st.rerun()
+
+    p1, p2 = st.columns(2)
+    with p1:
+        if page_no > 1 and st.button("⬅️ 上一页", use_container_width=True):
+            st.session_state.history_cursors.pop()
+            st.rerun()
+    with p2:
+        if next_cursor and st.button("下一页 ➡️", use_container_width=True):
+            st.session_state.history_cursors.append(next_cursor)
+            st.rerun()
+
+with col_detail:
+    session_id = st.session_state.history_session_id
+    if not session_id:
+        st.info("👈 选择一场面试查看对话记录和评估报告")
+    else:
+        # 只有打开某一场时才加载它的对话记录和反馈
+        with session_scope() as db:
+            sess = crud.get_session_detail(db, session_id, user_id)
+            msgs = crud.get_session_messages(db, session_id) if sess else []
+
+        if not sess:
+            st.error("记录不存在")
+        else:
+            st.subheader(f"{sess.topic} · {sess.score} 分")
+            if sess.feedback:
+                try:
+                    report = json.loads(sess.feedback)
+                    st.info(report.get("summary"))
+                    with st.expander("⚠️ 不足 (Weaknesses)"):
+                        for w in report.get("weaknesses", []):
+                            st.write(f"- {w}")
+                except ValueError:
+                    st.error("报告解析失败")
+
+            st.markdown("### 💬 对话记录")
+            for m in msgs:
+                is_ai = m["role"] in ("assistant", "ai")
+                with st.chat_message(m["role"], avatar="🤖" if is_ai else "🧑‍💻"):
+                    st.markdown(m["content"])
@@ -0,0 +1,120 @@
+import streamlit as st
+import sys
+import os
+import pandas as pd
+from datetime import datetime, timedelta
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from database.models import session_scope
+from database import crud
+from core.metrics import summarize_metrics, summarize_turns
+from core.llm import get_llm_cache
+from core.parsing import parse_stats
+from core.config import LLM_STRUCTURED_OUTPUT
+from components.ui import load_custom_css
+
+st.set_page_config(page_title="LLM 用量监控", page_icon="📈", layout="wide")
+load_custom_css()
+
+# --- Login Check ---
+if "logged_in" not in st.session_state or not st.session_state.logged_in:
+    st.warning("请先从主页登录。")
+    st.stop()
+
+st.title("📈 LLM 用量与性能")
+
+PERIODS = {"最近 24 小时": timedelta(hours=24), "最近 7 天": timedelta(days=7), "最近 30 天": timedelta(days=30)}
+period = st.selectbox("统计区间", list(PERIODS.keys()))
+
+with session_scope() as db:
+    since = datetime.utcnow() - PERIODS[period]
+    rows = crud.get_llm_call_metrics(db, since)
+    turn_rows = crud.get_turn_metrics(db, since)
+    recent_errors = crud.get_recent_llm_errors(db)
+
+summary = summarize_metrics(rows)
+
+# Overview
+total_calls = sum(g["calls"] for g in summary)
+total_errors = sum(g["errors"] for g in summary)
+total_cache_hits = sum(g["cache_hits"] for g in summary)
+c1, c2, c3, c4 = st.columns(4)
+c1.metric("调用次数", total_calls)
+c2.metric("预估费用", f"¥{sum(g['cost'] for g in summary):.2f}")
+c3.metric("错误率", f"{(total_errors / total_calls * 100) if total_calls else 0:.1f}%")
+c4.metric("缓存命中", total_cache_hits)
+
+st.divider()
+
+# Per Feature
+st.subheader("按功能统计")
+if not summary:
+    st.info("该区间内暂无 LLM 调用记录。")
+else:
+    df = pd.DataFrame([{
+        "功能": f"{g['agent']}.{g['method']}",
+        "调用": g["calls"],
+        "错误率 %": round(g["error_rate"], 1),
+        "缓存命中": g["cache_hits"],
+        "输入 tokens": g["prompt_tokens"],
+        "输出 tokens": g["completion_tokens"],
+        "前缀缓存 %": round(g["cached_rate"], 1),
+        "p50 延迟 (s)": round(g["p50_ms"] / 1000, 2) if g["p50_ms"] is not None else None,
+        "p95 延迟 (s)": round(g["p95_ms"] / 1000, 2) if g["p95_ms"] is not None else None,
+        "首 token p50 (s)": round(g["ttft_p50_ms"] / 1000, 2) if g["ttft_p50_ms"] is not None else None,
+        "费用 (¥)": round(g["cost"], 4),
+    } for g in summary])
+    st.dataframe(df, use_container_width=True, hide_index=True)
+    st.caption("延迟只统计成功且未命中缓存的调用；费用按 LLM_PRICE_PROMPT_PER_M / LLM_PRICE_CACHED_PROMPT_PER_M / LLM_PRICE_COMPLETION_PER_M 估算。"
+               "前缀缓存 % = 命中服务端 KV cache 的输入 tokens 占比。")
+
+# Per Turn
+st.subheader("面试逐轮开销 (interviewer.evaluate)")
+turn_summary = summarize_turns(turn_rows)
+if not turn_summary:
+    st.info("该区间内暂无面试对话记录。")
+else:
+    turn_df = pd.DataFrame([{
+        "轮次": t["turn"],
+        "调用": t["calls"],
+        "平均输入 tokens": round(t["avg_prompt_tokens"]),
+        "平均缓存命中 tokens": round(t["avg_cached_tokens"]),
+        "前缀缓存 %": round(t["cached_rate"], 1),
+        "p50 延迟 (s)": round(t["p50_ms"] / 1000, 2) if t["p50_ms"] is not None else None,
+        "首 token p50 (s)": round(t["ttft_p50_ms"] / 1000, 2) if t["ttft_p50_ms"] is not None else None,
+        "平均费用 (¥)": round(t["avg_cost"], 5),
+    } for t in turn_summary])
+    st.line_chart(turn_df.set_index("轮次")[["平均输入 tokens", "平均缓存命中 tokens"]])
+    st.dataframe(turn_df, use_container_width=True, hide_index=True)
+    st.caption("前缀缓存生效时，轮次越靠后命中的 tokens 越多，单轮费用和首 token 延迟的增长会明显慢于输入 tokens。")
+
+# Cache
+with st.expander("🗄️ 响应缓存"):
+    cache_stats = get_llm_cache().stats()
+    k1, k2, k3 = st.columns(3)
+    k1.metric("条目数", cache_stats["entries"])
+    k2.metric("命中 / 未命中 (本进程)", f"{cache_stats['hits']} / {cache_stats['misses']}")
+    k3.metric("命中率", f"{cache_stats['hit_rate']:.1f}%")
+
+# Parsing
+with st.expander("🧩 JSON 解析 (本进程)"):
+    st.caption(f"结构化输出模式: `{LLM_STRUCTURED_OUTPUT}` (LLM_STRUCTURED_OUTPUT = off / json_schema / function_calling / json_mode)")
+    parse_rows = parse_stats.snapshot()
+    if not parse_rows:
+        st.info("本进程内暂无需要解析 JSON 的调用。")
+    else:
+        st.dataframe(pd.DataFrame([{
+            "功能": r["name"],
+            "次数": r["total"],
+            "结构化输出": r["structured"],
+            "文本解析": r["parsed"],
+            "修复后成功": r["repaired"],
+            "失败 (兜底)": r["failed"],
+            "失败率 %": round(r["failure_rate"], 1),
+            "回落文本": r["fallback"],
+        } for r in parse_rows]), use_container_width=True, hide_index=True)
+
+# Errors
+with st.expander(f"⚠️ 最近错误 ({len(recent_errors)})"):
+    for e in recent_errors:
+        st.write(f"`{e.created_at:%m-%d %H:%M}` **{e.agent}.{e.method}** — {e.error}")
@@ -0,0 +1,94 @@
+"""
+面试每轮对话的 prompt 构建开销基准测试
+
+对比两种写法 (LLM 用零延迟的 FakeListChatModel 代替，只测本地开销):
+- legacy: 旧写法，每轮重新 ChatPromptTemplate.from_messages(...)，历史对话用 f-string 拼进模板文本
+- prebuilt: InterviewerAgent 在 __init__ 中构建好的 chain，历史对话通过 MessagesPlaceholder 传入
+
+同时统计 legacy 写法在回答含花括号 (代码片段、JSON) 时的格式化失败次数。
+
+用法: python benchmarks/bench_prompt_build.py [--turns 20] [--repeat 300]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from core.agents.interviewer import InterviewerAgent
+from core.memory import format_messages
+from core.metrics import metrics_config
+
+CONTEXT = {"mode": "专项练习", "topic": "MySQL", "jd": "负责核心交易系统的存储层研发"}
+
+def build_history(turns, with_braces):
+    history = []
+    for i in range(turns):
+        history.append({"role": "ai", "content": f"第 {i + 1} 题: 请解释 InnoDB 的 MVCC 实现，以及 ReadView 的可见性判断规则。"})
+        answer = f"第 {i + 1} 次回答: 每行记录有 trx_id 和 roll_pointer，通过 undo log 构成版本链，ReadView 记录活跃事务列表。"
+        if with_braces:
+            answer += ' 例如 {"trx_id": 100, "roll_pointer": "0x1f"}'
+        history.append({"role": "human", "content": answer})
+    return history
+
+def legacy_invoke(llm, system_prompt, history, context):
+    """旧写法: 每轮重新解析模板，历史对话拼进模板文本"""
+    history_text = format_messages(history[-8:])
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("user", f"历史对话:\n{history_text}\n\n[面试官请回复]:")
+    ])
+    chain = (prompt | llm | StrOutputParser()).with_config(metrics_config("interviewer", "evaluate"))
+    return chain.invoke({
+        "mode": context.get("mode", "专项练习"),
+        "topic": context.get("topic", "未知"),
+        "jd": context.get("jd", "无")
+    })
+
+def time_call(fn, repeat):
+    samples = []
+    failures = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except (KeyError, ValueError):
+            failures += 1
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), statistics.quantiles(samples, n=20)[-1], failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20, help="历史对话轮数")
+    parser.add_argument("--repeat", type=int, default=300)
+    args = parser.parse_args()
+
+    llm = FakeListChatModel(responses=["[反馈与点评] 回答正确。\n[下一个问题] 请说明 RR 隔离级别下的幻读。"])
+    agent = InterviewerAgent(llm)
+    # 复用 agent 中的系统提示词 (固定指令 + 面试上下文)，保证两种写法送给模型的内容一致
+    system_prompt = "\n\n".join(m.prompt.template for m in agent.evaluate_chain.bound.first.messages[:2])
+
+    print(f"{'history':<14}{'method':<10}{'p50 (ms)':>10}{'p95 (ms)':>10}{'failures':>10}")
+    for with_braces in (False, True):
+        history = build_history(args.turns, with_braces)
+        label = "with braces" if with_braces else "plain"
+        results = {
+            "legacy": time_call(lambda: legacy_invoke(llm, system_prompt, history, CONTEXT), args.repeat),
+            "prebuilt": time_call(lambda: agent._evaluate_and_plan(history, CONTEXT), args.repeat),
+        }
+        for method, (p50, p95, failures) in results.items():
+            print(f"{label:<14}{method:<10}{p50:>10.3f}{p95:>10.3f}{failures:>10}")
+        if results["legacy"][2]:
+            # legacy 在格式化阶段就抛异常，耗时没有可比性
+            print(f"{'':<14}{'speedup':<10}{'n/a':>10}")
+        else:
+            speedup = results["legacy"][0] / results["prebuilt"][0]
+            print(f"{'':<14}{'speedup':<10}{speedup:>9.2f}x")
+
+if __name__ == "__main__":
+    main()
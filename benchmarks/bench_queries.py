@@ -0,0 +1,152 @@
+"""
+用户维度查询的索引基准测试
+
+在临时 SQLite 库中分别构建 "无索引" 与 "有索引" 两份相同的数据 (默认 100k 面试 + 100k 计划)，
+对 crud 中按 user_id 过滤的原始查询计时，并打印 SQLite 的查询计划。
+
+直接计时 SQL 语句本身而不是 crud 函数: get_study_stats 现在读 user_stats 汇总表 (未命中时重建并提交)，
+get_recent_weaknesses 读 session_weaknesses 表，它们的耗时已不取决于这里的索引。
+这里测的是这些函数依赖的底层查询: 汇总表重建用的聚合、弱点查询里取最近几场面试的子查询等。
+
+用法: python benchmarks/bench_queries.py [--rows 100000] [--users 1000] [--repeat 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.orm import sessionmaker
+from database.models import Base, StudyPlan, InterviewSession
+from database import crud
+
+USER_INDEXES = [
+    "ux_study_plans_user_date",
+    "ix_interview_sessions_user_created",
+    "ix_interview_sessions_user_score",
+]
+
+def build_db(path, rows, users, with_indexes):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        if not with_indexes:
+            for name in USER_INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+        rng = random.Random(42)
+        start = datetime(2024, 1, 1)
+        sessions = []
+        for i in range(rows):
+            scored = rng.random() < 0.7
+            sessions.append({
+                "user_id": i % users + 1,
+                "topic": rng.choice(["MySQL", "Redis", "计算机网络", "操作系统"]),
+                "score": rng.randint(40, 100) if scored else None,
+                "feedback": '{"weaknesses": ["索引失效", "MVCC"]}' if scored else None,
+                "created_at": start + timedelta(minutes=i),
+            })
+        conn.execute(insert(InterviewSession.__table__), sessions)
+
+        plans = []
+        for i in range(rows):
+            plans.append({
+                "user_id": i % users + 1,
+                "date": date(2000, 1, 1) + timedelta(days=i // users),
+                "content": [{"topic": "t", "description": "d", "estimated_time": "30min", "status": "completed"}],
+                "encouragement": "加油",
+            })
+        conn.execute(insert(StudyPlan.__table__), plans)
+    return engine
+
+def time_query(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+def run(engine, users, repeat):
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    rng = random.Random(7)
+    target_date = date(2000, 1, 1) + timedelta(days=50)
+    queries = {
+        "get_today_plan": lambda: db.query(StudyPlan).filter(
+            StudyPlan.user_id == rng.randint(1, users), StudyPlan.date == target_date
+        ).first(),
+        # get_recent_weaknesses 中取最近几场有反馈面试的子查询
+        "recent_feedback_sessions": lambda: db.execute(
+            select(InterviewSession.id, InterviewSession.created_at).where(
+                InterviewSession.user_id == rng.randint(1, users), InterviewSession.feedback.isnot(None)
+            ).order_by(InterviewSession.created_at.desc()).limit(3)
+        ).all(),
+        "get_all_finished_sessions": lambda: crud.get_all_finished_sessions(db, rng.randint(1, users)),
+        # _rebuild_user_stats 的两条聚合 (汇总行缺失 / 校准时执行)
+        "session_stats_aggregate": lambda: db.execute(
+            select(func.count(InterviewSession.id), func.coalesce(func.sum(InterviewSession.score), 0)).where(
+                InterviewSession.user_id == rng.randint(1, users), InterviewSession.score.isnot(None)
+            )
+        ).one(),
+        "plan_stats_aggregate": lambda: db.execute(
+            select(
+                func.count(StudyPlan.id),
+                func.coalesce(func.sum(StudyPlan.task_count), 0),
+                func.coalesce(func.sum(StudyPlan.completed_count), 0)
+            ).where(StudyPlan.user_id == rng.randint(1, users))
+        ).one(),
+    }
+    results = {name: time_query(fn, repeat) for name, fn in queries.items()}
+    db.close()
+    return results
+
+def explain(engine):
+    plans = {
+        "today_plan": "SELECT * FROM study_plans WHERE user_id = 1 AND date = '2000-02-20'",
+        "recent_sessions": "SELECT * FROM interview_sessions WHERE user_id = 1 AND feedback IS NOT NULL ORDER BY created_at DESC LIMIT 3",
+        "finished_sessions": "SELECT * FROM interview_sessions WHERE user_id = 1 AND score IS NOT NULL",
+        "session_aggregate": "SELECT count(id), sum(score) FROM interview_sessions WHERE user_id = 1 AND score IS NOT NULL",
+        "plan_aggregate": "SELECT count(id), sum(task_count), sum(completed_count) FROM study_plans WHERE user_id = 1",
+    }
+    with engine.connect() as conn:
+        for name, sql in plans.items():
+            detail = " | ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+            print(f"  {name:<20} {detail}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Building {args.rows} sessions + {args.rows} plans for {args.users} users...")
+        before = build_db(os.path.join(tmp, "before.db"), args.rows, args.users, with_indexes=False)
+        after = build_db(os.path.join(tmp, "after.db"), args.rows, args.users, with_indexes=True)
+
+        print("\nQuery plans without user indexes:")
+        explain(before)
+        print("Query plans with user indexes:")
+        explain(after)
+
+        before_ms = run(before, args.users, args.repeat)
+        after_ms = run(after, args.users, args.repeat)
+
+        print(f"\n{'query':<28}{'before (ms)':>12}{'after (ms)':>12}{'speedup':>10}")
+        for name in before_ms:
+            b, a = before_ms[name], after_ms[name]
+            print(f"{name:<28}{b:>12.2f}{a:>12.2f}{b / a:>9.1f}x")
+
+        before.dispose()
+        after.dispose()
+
+if __name__ == "__main__":
+    main()
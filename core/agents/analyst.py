@@ -1,19 +1,37 @@
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-import json
-import re
+from core.parsing import StructuredChain
+from core.schemas import ProgressReport
 
 class AnalystAgent:
     def __init__(self, llm):
         self.llm = llm
+        # chain 只构建一次，调用时只传入变量
+        self.progress_chain = self._build_progress_chain()
 
-    def analyze_progress(self, sessions, study_stats):
+    def analyze_progress(self, sessions, study_stats, topic_stats=None):
         """
         综合分析面试记录和学习数据
+        :param topic_stats: crud.get_topic_score_stats 的汇总结果，提供时不再逐场罗列 sessions
         """
+        try:
+            return self.progress_chain.invoke(self._progress_inputs(sessions, study_stats, topic_stats))
+        except Exception as e:
+            return self._report_fallback(e)
+
+    async def analyze_progress_async(self, sessions, study_stats, topic_stats=None):
+        """analyze_progress 的异步版本，可与其他 LLM 调用并发执行"""
+        try:
+            return await self.progress_chain.ainvoke(self._progress_inputs(sessions, study_stats, topic_stats))
+        except Exception as e:
+            return self._report_fallback(e)
+
+    def _progress_inputs(self, sessions, study_stats, topic_stats=None):
         # 整理面试数据
         session_summary = []
-        for s in sessions:
+        for t in topic_stats or []:
+            # 汇总表已按主题聚合好，直接使用
+            session_summary.append(f"- 主题: {t['topic']}, 场次: {t['sessions']}, 平均分: {t['average_score']:.1f}")
+        for s in sessions if not topic_stats else []:
             try:
                 # 尝试解析 topics
                 # 这里假设 s.topic 是单一主题，为了丰富维度，我们让 llm 归类
@@ -23,6 +41,13 @@ class AnalystAgent:
         
         history_text = "\n".join(session_summary) if session_summary else "暂无面试记录"
 
+        return {
+            "history_text": history_text,
+            "total_days": study_stats.get("total_days", 0),
+            "completion_rate": study_stats.get("completion_rate", 0)
+        }
+
+    def _build_progress_chain(self):
         system_prompt = """你是一位计算机教育专家和数据分析师。
 请根据学生的面试历史和学习打卡数据，生成一份能力评估报告。
 
@@ -52,24 +77,13 @@ class AnalystAgent:
             ("user", "请开始分析")
         ])
 
-        chain = prompt | self.llm | StrOutputParser()
-        
-        try:
-            response = chain.invoke({
-                "history_text": history_text,
-                "total_days": study_stats.get("total_days", 0),
-                "completion_rate": study_stats.get("completion_rate", 0)
-            })
-            
-            # 正则提取 JSON
-            match = re.search(r"\{[\s\S]*\}", response.strip())
-            clean_str = match.group(0) if match else response
-            return json.loads(clean_str)
-        except Exception as e:
-            # Fallback 数据
-            return {
-                "radar_chart": {"基础知识": 60, "算法能力": 60, "工程实践": 60, "表达逻辑": 60, "对标匹配度": 60},
-                "trend_analysis": "数据不足，暂无法分析趋势。",
-                "key_suggestion": "请多进行几次模拟面试以积累数据。",
-                "error": str(e)
-            }
+        return StructuredChain(prompt, self.llm, ProgressReport, "analyst", "analyze_progress")
+
+    def _report_fallback(self, e):
+        # Fallback 数据
+        return {
+            "radar_chart": {"基础知识": 60, "算法能力": 60, "工程实践": 60, "表达逻辑": 60, "对标匹配度": 60},
+            "trend_analysis": "数据不足，暂无法分析趋势。",
+            "key_suggestion": "请多进行几次模拟面试以积累数据。",
+            "error": str(e)
+        }
@@ -1,19 +1,75 @@
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
-import json
-import re
-import random
+import threading
+from core.config import INTERVIEW_PREFETCH_ENABLED, INTERVIEW_PREFETCH_MAX_SESSIONS
 from core.data.real_questions import get_real_questions
+from core.llm import with_response_cache, submit_async
+from core.memory import to_chat_messages
+from core.metrics import metrics_config
+from core.parsing import StructuredChain
+from core.schemas import FinalReport
+
+# 评估调用决定出新题时输出该标记，由预取好的题目替换
+NEXT_QUESTION_MARKER = "[NEXT_QUESTION]"
+
+DIFFICULTY_ORDER = {"简单": 0, "中等": 1, "困难": 2}
+
+def _partial_marker_len(text):
+    """text 末尾与标记开头重合的长度 (流式输出可能把标记拆在两个 chunk 里)"""
+    for k in range(min(len(NEXT_QUESTION_MARKER) - 1, len(text)), 0, -1):
+        if text.endswith(NEXT_QUESTION_MARKER[:k]):
+            return k
+    return 0
+
+def _splice_next_question(chunks, next_text):
+    """
+    把流式输出中的 [NEXT_QUESTION] 标记替换为预取的题目
+    标记之后模型多写的内容丢弃，但仍读完整个流 (保证埋点拿到用量)
+    与同步版本一致，标记前的点评去掉末尾空白再接题目；末尾的空白先暂存，确定后面还有正文时再输出
+    """
+    buffer = ""
+    spliced = False
+    for chunk in chunks:
+        if spliced:
+            continue
+        buffer += chunk
+        idx = buffer.find(NEXT_QUESTION_MARKER)
+        if idx >= 0:
+            critique = buffer[:idx].rstrip()
+            if critique:
+                yield critique
+            yield f"\n\n{next_text}"
+            spliced = True
+            continue
+        cut = len(buffer) - _partial_marker_len(buffer)
+        cut = len(buffer[:cut].rstrip())
+        if cut:
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    if not spliced and buffer:
+        yield buffer
 
 class InterviewerAgent:
     def __init__(self, llm):
         self.llm = llm
+        # 预取的引导语只取决于题目和岗位，走持久化缓存
+        self.cached_llm = with_response_cache(llm)
+        # chain 只构建一次，每轮对话只传入变量 (对话历史通过 MessagesPlaceholder 传入，回答中的花括号不会破坏模板)
+        self.evaluate_chain = self._build_evaluate_chain()
+        self.evaluate_next_chain = self._build_evaluate_chain(with_next_question=True)
+        self.report_chain = self._build_report_chain()
+        self.prefetch_chain = self._build_prefetch_chain()
+        # session_id -> (预取时的消息数, Future)，进程内共享 (Agent 由 st.cache_resource 缓存)
+        self._prefetched = {}
+        self._prefetch_lock = threading.Lock()
 
-    def conduct_interview(self, history, context):
+    def conduct_interview(self, history, context, memory=None, session_id=None):
         """
         主面试逻辑控制器 (CoT Deep Thinking)
         :param history: 聊天记录 list
         :param context: dict, 包含 mode, topic, jd
+        :param memory: ConversationMemory，提供早前对话的摘要；不传时只看最近 4 轮
+        :param session_id: 传入时使用 prefetch_next_question 预取好的下一题
         """
         # 1. 如果是第一次交互 (History 为空或仅有System)，则进行开场
         if not history or len(history) == 0:
@@ -22,31 +78,60 @@ class InterviewerAgent:
         # 2. 如果最后一条是用户回答，则进行 "评估 + 追问/新题"
         last_msg = history[-1]
         if last_msg.get("role") == "human":
-            # 获取用户最后一句回答
-            user_answer = last_msg.get("content", "")
-            
             # 使用 CoT 深度思考用户的回答
-            evaluation = self._evaluate_and_plan(history, context)
+            evaluation = self._evaluate_and_plan(history, context, memory, session_id)
             
             return evaluation
         
         return "请继续回答。"
 
+    def conduct_interview_stream(self, history, context, memory=None, session_id=None):
+        """
+        conduct_interview 的流式版本 (generator)，逐段 yield 回复文本
+        调用方负责拼接完整回复并写库
+        """
+        if not history:
+            yield self._generate_opening(context)
+            return
+
+        if history[-1].get("role") == "human":
+            yield from self._evaluate_and_plan_stream(history, context, memory, session_id)
+            return
+
+        yield "请继续回答。"
+
     def _generate_opening(self, context):
         topic = context.get("topic", "通用技术")
         return f"您好，我是您的 AI 面试官。今天我们将进行 {topic} 方向的模拟面试。请准备好后，简单通过打字做一个自我介绍。"
 
-    def _evaluate_and_plan(self, history, context):
+    def _history_messages(self, history, memory=None, limit=None):
+        """有记忆时: 早前对话摘要 + 未摘要的原文；否则截取最近 limit 条"""
+        if memory:
+            return memory.to_messages(history)
+        return to_chat_messages(history[-limit:] if limit else history)
+
+    def _turn_config(self, history):
+        """埋点: 标记这是面试第几轮，观察前缀缓存命中随轮数的变化"""
+        return {"metadata": {"turn": sum(1 for msg in history if msg.get("role") in ("human", "user"))}}
+
+    def _evaluate_inputs(self, history, context, memory=None):
+        # 无记忆时截取最近 4 轮对话作为 Context
+        return {
+            "mode": context.get("mode", "专项练习"),
+            "topic": context.get("topic", "未知"),
+            "jd": context.get("jd", "无"),
+            "history": self._history_messages(history, memory, limit=8)
+        }
+
+    def _build_evaluate_chain(self, with_next_question=False):
         """
-        深度评估用户回答，并决定下一步动作
+        构建 "评估 + 追问" 的 chain，同步和流式调用共用
+        :param with_next_question: True 时追加一条系统消息，告知模型下一题已预取好，出新题时只需输出标记
+        消息顺序按 "越稳定越靠前" 排列，便于命中服务端前缀缓存 (DeepSeek / 硅基流动等按前缀复用 KV cache):
+        固定指令 (所有面试相同) -> 面试上下文 (同一场面试不变) -> 早前对话摘要 -> 逐条追加的对话原文
         """
         system_prompt = """你是一位资深、严厉但公正的技术面试官 (Google L5/L6 级别)。
-你正在进行一场全中文的模拟面试。
-
-当前上下文:
-模式: {mode}
-主题: {topic}
-岗位描述: {jd}
+你正在进行一场全中文的模拟面试，面试的模式、主题和岗位描述见下一条系统消息。
 
 用户的最后一句回答是针对上一轮问题的。
 请按以下步骤进行 **深度思考 (Chain of Thought)**：
@@ -68,30 +153,157 @@ class InterviewerAgent:
 
 请保持全中文回复，专业术语可以用英文。
 """
-        # 构建 Prompt
-        # 截取最近 4 轮对话作为 Context
-        history_text = "\n".join([f"{msg.get('role')}: {msg.get('content')}" for msg in history[-8:]])
-        
-        prompt = ChatPromptTemplate.from_messages([
+        # 固定指令中不能出现变量，否则每场面试的前缀都不同
+        context_prompt = """当前上下文:
+模式: {mode}
+主题: {topic}
+岗位描述: {jd}"""
+        messages = [
             ("system", system_prompt),
-            ("user", f"历史对话:\n{history_text}\n\n[面试官请回复]:")
-        ])
+            ("system", context_prompt),
+            MessagesPlaceholder("history")
+        ]
+        if with_next_question:
+            # 每轮都变的内容放在最后，不影响前面的前缀缓存
+            messages.append(("system", f"""题库中已为下一题准备好一道真题 (候选人看不到本条消息):
+{{next_question}}
+
+如果决定出新题，请不要自己出题: 写完点评后单独一行输出 {NEXT_QUESTION_MARKER}，系统会自动接上这道题，标记之后不要再输出任何内容。
+如果需要追问当前问题，则照常输出追问，不要输出该标记。"""))
+        prompt = ChatPromptTemplate.from_messages(messages)
         
-        chain = prompt | self.llm | StrOutputParser()
+        return (prompt | self.llm | StrOutputParser()).with_config(metrics_config("interviewer", "evaluate"))
+
+    def _select_evaluate_chain(self, history, context, memory, session_id):
+        """有就绪的预取题目时使用带标记的 chain，返回 (chain, inputs, 预取结果)"""
+        inputs = self._evaluate_inputs(history, context, memory)
+        prepared = self._take_prefetched(session_id, history) if session_id is not None else None
+        if prepared is None:
+            return self.evaluate_chain, inputs, None
+        inputs["next_question"] = prepared["question"]
+        return self.evaluate_next_chain, inputs, prepared
+
+    def _evaluate_and_plan(self, history, context, memory=None, session_id=None):
+        """
+        深度评估用户回答，并决定下一步动作
+        """
         try:
-            response = chain.invoke({
-                "mode": context.get("mode", "专项练习"),
-                "topic": context.get("topic", "未知"),
-                "jd": context.get("jd", "无")
-            })
-            return response
+            chain, inputs, prepared = self._select_evaluate_chain(history, context, memory, session_id)
+            result = chain.invoke(inputs, config=self._turn_config(history))
         except Exception as e:
             return f"（系统错误：{str(e)}）请继续回答..."
+        if prepared and NEXT_QUESTION_MARKER in result:
+            result = f"{result[:result.index(NEXT_QUESTION_MARKER)].rstrip()}\n\n{prepared['text']}"
+        return result
 
-    def generate_final_report(self, history):
+    def _evaluate_and_plan_stream(self, history, context, memory=None, session_id=None):
+        """
+        流式版本: 逐 token 产出回复，出错时把错误信息作为最后一段输出
+        """
+        try:
+            chain, inputs, prepared = self._select_evaluate_chain(history, context, memory, session_id)
+            chunks = chain.stream(inputs, config=self._turn_config(history))
+            if prepared:
+                chunks = _splice_next_question(chunks, prepared["text"])
+            for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            yield f"（系统错误：{str(e)}）请继续回答..."
+
+    # --- Prefetch ---
+
+    def _pick_next_question(self, history, context):
+        """从题库挑一道本场还没问过的真题，按难度由浅入深"""
+        topic = context.get("topic")
+        if not topic:
+            return None
+        asked = "\n".join(msg.get("content") or "" for msg in history if msg.get("role") in ("ai", "assistant"))
+        candidates = [q for q in get_real_questions(topic) if q.get("question") and q["question"] not in asked]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda q: DIFFICULTY_ORDER.get(q.get("difficulty"), 1))
+
+    def _build_prefetch_chain(self):
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", """你是一位技术面试官，接下来要问候选人一道大厂真题。
+请结合岗位描述，用一两句话自然地引出这道题 (例如说明它在该岗位中的实际场景)。
+只输出引导语本身，不要复述题目，不要超过 80 字。"""),
+            ("user", "岗位描述: {jd}\n面试主题: {topic}\n真题: {question}")
+        ])
+        return (prompt | self.cached_llm | StrOutputParser()).with_config(metrics_config("interviewer", "prefetch_question"))
+
+    async def _prepare_question(self, question, context):
+        """生成引导语并拼好下一题的完整文本；原题原样保留，便于之后判断是否已问过"""
+        try:
+            lead_in = (await self.prefetch_chain.ainvoke({
+                "jd": context.get("jd") or "无",
+                "topic": context.get("topic", "未知"),
+                "question": question["question"]
+            })).strip()
+        except Exception:
+            lead_in = "" # 引导语只是锦上添花，失败时直接给出原题
+        source = " ".join(str(v) for v in (question.get("company"), question.get("year")) if v)
+        text = f"**下一题**（{source} 真题）: {question['question']}" if source else f"**下一题**: {question['question']}"
+        return {"question": question["question"], "text": f"{lead_in}\n\n{text}" if lead_in else text}
+
+    def prefetch_next_question(self, session_id, history, context):
+        """
+        投机预取: AI 提问之后、用户作答期间，在后台挑选下一道题库真题并生成引导语
+        用户提交回答时若已就绪，评估调用只需写点评，出新题时直接接上预取的题目；
+        模型决定追问时预取结果作废 (引导语有缓存，下次预取同一题不再产生费用)
+        :param history: 包含刚发出的 AI 消息的完整对话
+        :return: Future；未开启预取或题库中没有可用题目时返回 None
+        """
+        if not INTERVIEW_PREFETCH_ENABLED:
+            return None
+        question = self._pick_next_question(history, context)
+        if question is None:
+            return None
+        future = submit_async(self._prepare_question(question, context))
+        with self._prefetch_lock:
+            self._prefetched.pop(session_id, None)
+            self._prefetched[session_id] = (len(history), future)
+            while len(self._prefetched) > INTERVIEW_PREFETCH_MAX_SESSIONS:
+                self._prefetched.pop(next(iter(self._prefetched)))
+        return future
+
+    def _take_prefetched(self, session_id, history):
+        """取出与当前对话匹配且已完成的预取结果；还没完成时不等待，本轮照常由模型出题"""
+        with self._prefetch_lock:
+            entry = self._prefetched.pop(session_id, None)
+        if entry is None:
+            return None
+        message_count, future = entry
+        # 预取发生在用户回答之前，对话应正好多出这一条回答
+        if message_count != len(history) - 1 or not future.done() or future.exception() is not None:
+            return None
+        return future.result()
+
+    def generate_final_report(self, history, memory=None):
         """
         生成最终深度总结报告
+        :param memory: ConversationMemory；传入时先把窗口外的对话全部合并进摘要，
+                       报告只看 摘要 + 最近窗口，长面试的 token 数也有上限 (memory 会被更新，调用方负责保存)
+        失败时返回带 "error" 的兜底报告
         """
+        try:
+            if memory:
+                memory.update(history, force=True)
+            # 报告生成代价高，格式有误时只让 LLM 修复 JSON，不重新生成整份报告
+            return self.report_chain.invoke({"history": self._history_messages(history, memory)})
+        except Exception as e:
+            return self._report_fallback(e)
+
+    async def generate_final_report_async(self, history, memory=None):
+        """generate_final_report 的异步版本 (摘要合并也走异步调用，不阻塞共享事件循环)"""
+        try:
+            if memory:
+                await memory.aupdate(history, force=True)
+            return await self.report_chain.ainvoke({"history": self._history_messages(history, memory)})
+        except Exception as e:
+            return self._report_fallback(e)
+
+    def _build_report_chain(self):
         system_prompt = """你是一位资深技术专家。面试已结束，请对候选人进行全方位的深度画像。
 
 请进行 **Step-by-Step 思考**：
@@ -100,35 +312,30 @@ class InterviewerAgent:
 3. 沟通是否清晰？逻辑是否严密？
 
 请输出严格的 JSON 格式：
-{
+{{
     "total_score": 0-100,
     "summary": "深度的综合评价，不少于 100 字，言辞恳切。",
     "strengths": ["亮点1", "亮点2", "亮点3"],
     "weaknesses": ["致命弱点1", "弱点2", "弱点3"],
     "suggestions": ["具体的学习建议1 (例如推荐读什么书)", "建议2", "建议3"]
-}
+}}
 
 注意：JSON 必须合法，Key 必须用双引号。
 """
-        history_text = "\n".join([f"{msg.get('role')}: {msg.get('content')}" for msg in history])
-        
         prompt = ChatPromptTemplate.from_messages([
             ("system", system_prompt),
-            ("user", f"面试记录:\n{history_text}\n\n请生成深度报告 (JSON):")
+            MessagesPlaceholder("history"),
+            ("user", "面试已结束，请根据以上面试记录生成深度报告 (JSON):")
         ])
         
-        chain = prompt | self.llm | StrOutputParser()
-        result = chain.invoke({})
-        
-        try:
-            match = re.search(r"\{[\s\S]*\}", result.strip())
-            clean = match.group(0) if match else result
-            return json.loads(clean)
-        except Exception as e:
-            return {
-                "total_score": 0, 
-                "summary": f"生成报告时发生错误，请重试。错误: {str(e)}", 
-                "strengths": [], 
-                "weaknesses": [], 
-                "suggestions": []
-            }
+        return StructuredChain(prompt, self.llm, FinalReport, "interviewer", "final_report")
+
+    def _report_fallback(self, e):
+        return {
+            "total_score": 0,
+            "summary": f"生成报告时发生错误，请重试。错误: {str(e)}",
+            "strengths": [],
+            "weaknesses": [],
+            "suggestions": [],
+            "error": str(e)
+        }
@@ -0,0 +1,31 @@
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from core.llm import with_response_cache, bypass_llm_cache
+from core.metrics import metrics_config
+
+class ResearcherAgent:
+    def __init__(self, llm):
+        self.llm = llm
+        # 相同课题的研报可复用，走持久化缓存
+        self.cached_llm = with_response_cache(llm)
+        # chain 只构建一次，调用时只传入课题
+        self.report_chain = self._build_report_chain()
+
+    def _build_report_chain(self):
+        prompt = ChatPromptTemplate.from_template("""
+你是一名资深技术专家和大学教授。请为主题 "{topic}" 撰写一篇**深度技术内参**。
+要求：
+1. **结构清晰**：包含 核心概念、底层原理 (源码/数学级)、工业界应用场景、面试高频考察点 (Pros/Cons)。
+2. **拒绝浅薄**：不要只写百科简介，要写出"内行看门道"的深度。如果涉及算法，请简要解释关键公式；如果涉及系统，请提及架构取舍。
+3. **格式美观**：使用 Markdown，合理使用由标题、列表、代码块。
+4. **语言**：使用中文。
+        """)
+        return (prompt | self.cached_llm | StrOutputParser()).with_config(metrics_config("researcher", "write_report"))
+
+    def write_report(self, topic, use_cache=True):
+        """
+        为课题撰写 Markdown 深度研报
+        :param use_cache: False 时跳过缓存强制重新生成
+        """
+        with bypass_llm_cache(not use_cache):
+            return self.report_chain.invoke({"topic": topic})
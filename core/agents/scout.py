@@ -1,11 +1,18 @@
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-import json
+import hashlib
 import random
+from core.config import LLM_MAX_CONCURRENCY
+from core.llm import with_response_cache, bypass_llm_cache, iter_completed, single_flight
+from core.parsing import StructuredChain
+from core.schemas import JDAnalysis
 
 class ScoutAgent:
     def __init__(self, llm):
         self.llm = llm
+        # JD 分析对同一 JD 结果可复用，走持久化缓存
+        self.cached_llm = with_response_cache(llm)
+        # chain 只构建一次，JD 原文作为变量传入 (JD 中的花括号不会破坏模板)
+        self.analyze_chain = self._build_analyze_chain()
 
     def hunt_jobs(self, role_keyword):
         """
@@ -95,7 +102,7 @@ class ScoutAgent:
             
         return results
 
-    def analyze_jd(self, jd_text):
+    def analyze_jd(self, jd_text, use_cache=True):
         """
         利用 LLM 对 JD 进行深度剖析，减少信息差。
         分析维度：
@@ -103,7 +110,46 @@ class ScoutAgent:
         2. 潜在坑点/红线 (PUA 预警, 维护老代码, 只有运维杂活等)
         3. 简历匹配策略 (如何修改简历来命中该 JD)
         4. 面试难度预估
+        :param use_cache: False 时跳过缓存强制重新分析
         """
+        try:
+            # 多个用户同时分析同一份 JD 时只调用一次 LLM
+            with bypass_llm_cache(not use_cache):
+                return single_flight.do(self._flight_key(jd_text, use_cache), self.analyze_chain.invoke, {"jd_text": jd_text})
+        except Exception as e:
+            return self._analysis_fallback(e)
+
+    async def analyze_jd_async(self, jd_text, use_cache=True):
+        """analyze_jd 的异步版本，多个 JD 可并发分析"""
+        try:
+            # 与同步版本共用 flight key，批量分析和单个分析同一份 JD 也只调用一次
+            with bypass_llm_cache(not use_cache):
+                return await single_flight.ado(self._flight_key(jd_text, use_cache), self.analyze_chain.ainvoke, {"jd_text": jd_text})
+        except Exception as e:
+            return self._analysis_fallback(e)
+
+    def analyze_jobs(self, jobs, limit=LLM_MAX_CONCURRENCY, use_cache=True):
+        """
+        批量分析 hunt_jobs 返回的岗位，最多 limit 个并发
+        按完成先后 yield (下标, 分析结果)，成功的结果写回 job["analysis"]
+        失败的 (兜底结果带 "error") 只把错误写到 job["analysis_error"]，仍算待分析，下次批量分析会重试
+        已有分析结果的岗位直接跳过
+        """
+        pending = [(idx, job) for idx, job in enumerate(jobs) if not job.get("analysis")]
+        coros = [self.analyze_jd_async(job.get("content", ""), use_cache=use_cache) for _, job in pending]
+        for i, analysis in iter_completed(coros, limit):
+            idx, job = pending[i]
+            if "error" in analysis:
+                job["analysis_error"] = analysis["error"]
+            else:
+                job["analysis"] = analysis
+                job.pop("analysis_error", None)
+            yield idx, analysis
+
+    def _flight_key(self, jd_text, use_cache):
+        return f"scout:{use_cache}:{hashlib.sha256(jd_text.encode('utf-8')).hexdigest()}"
+
+    def _build_analyze_chain(self):
         system_prompt = """你是一位互联网职场内幕专家。你的任务是分析给定的职位描述 (JD)，挖掘字面意思背后的"内幕信息"，帮助求职者减少信息差。
 
 请输出 JSON 格式，包含以下字段：
@@ -118,22 +164,18 @@ class ScoutAgent:
 """
         prompt = ChatPromptTemplate.from_messages([
             ("system", system_prompt),
-            ("user", f"请分析以下这篇 JD：\n\n{jd_text}")
+            ("user", "请分析以下这篇 JD：\n\n{jd_text}")
         ])
         
-        chain = prompt | self.llm | StrOutputParser()
-        
-        try:
-            res = chain.invoke({})
-            # 清理可能存在的 markdown code block
-            cleaned = res.replace("```json", "").replace("```", "").strip()
-            return json.loads(cleaned)
-        except Exception as e:
-            return {
-                "error": f"分析失败: {str(e)}",
-                "estimated_salary": "无法评估",
-                "red_flags": [],
-                "resume_tips": ["请仔细阅读 JD"],
-                "difficulty_score": 50,
-                "insider_comment": "AI 暂时无法分析此 JD"
-            }
+        # 容错提取 (代码块标记、前后说明文字、截断) + 结构校验，修复走不带缓存的 llm
+        return StructuredChain(prompt, self.cached_llm, JDAnalysis, "scout", "analyze_jd", repair_llm=self.llm)
+
+    def _analysis_fallback(self, e):
+        return {
+            "error": f"分析失败: {str(e)}",
+            "estimated_salary": "无法评估",
+            "red_flags": [],
+            "resume_tips": ["请仔细阅读 JD"],
+            "difficulty_score": 50,
+            "insider_comment": "AI 暂时无法分析此 JD"
+        }
@@ -1,11 +1,16 @@
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-import json
-import re
+from core.llm import with_response_cache, bypass_llm_cache
+from core.parsing import StructuredChain
+from core.schemas import DailyPlan, Roadmap
 
 class SupervisorAgent:
     def __init__(self, llm):
         self.llm = llm
+        # 路线图只取决于岗位和天数，走持久化缓存
+        self.cached_llm = with_response_cache(llm)
+        # chain 只构建一次，调用时只传入变量
+        self.daily_plan_chain = self._build_daily_plan_chain()
+        self.roadmap_chain = self._build_roadmap_chain()
 
     def generate_daily_plan(self, user_profile, recent_weaknesses=None):
         """
@@ -13,12 +18,32 @@ class SupervisorAgent:
         :param user_profile: dict, 包含 target_role(目标岗位), days_left(剩余天数), current_level(当前水平)
         :param recent_weaknesses: list, 最近面试暴露的弱点
         """
-        
+        try:
+            return self.daily_plan_chain.invoke(self._daily_plan_inputs(user_profile, recent_weaknesses))
+        except Exception as e:
+            return self._daily_plan_fallback(e)
+
+    async def generate_daily_plan_async(self, user_profile, recent_weaknesses=None):
+        """generate_daily_plan 的异步版本，可与其他 LLM 调用并发执行"""
+        try:
+            return await self.daily_plan_chain.ainvoke(self._daily_plan_inputs(user_profile, recent_weaknesses))
+        except Exception as e:
+            return self._daily_plan_fallback(e)
+
+    def _daily_plan_inputs(self, user_profile, recent_weaknesses):
         # 将弱点列表转换为字符串
         weakness_str = "暂无明显弱点"
         if recent_weaknesses and len(recent_weaknesses) > 0:
             weakness_str = "; ".join(recent_weaknesses)
-        
+
+        return {
+            "target_role": user_profile.get("target_role", "后端工程师"),
+            "days_left": user_profile.get("days_left", 30),
+            "current_level": user_profile.get("current_level", "初级"),
+            "weakness_str": weakness_str
+        }
+
+    def _build_daily_plan_chain(self):
         system_prompt = """你是一位严厉但负责任的计算机面试学习监督导师。
 你的任务是根据学生的目标和剩余时间，制定今天的详细学习计划。
 
@@ -48,36 +73,31 @@ JSON 格式必须合法。
             ("user", "请生成今天的学习计划。")
         ])
 
-        chain = prompt | self.llm | StrOutputParser()
-        
-        try:
-            response = chain.invoke({
-                "target_role": user_profile.get("target_role", "后端工程师"),
-                "days_left": user_profile.get("days_left", 30),
-                "current_level": user_profile.get("current_level", "初级"),
-                "weakness_str": weakness_str
-            })
-            
-            # 使用正则提取 JSON，增强鲁棒性
-            json_match = re.search(r"\{[\s\S]*\}", response.strip())
-            
-            if json_match:
-                clean_response = json_match.group(0)
-            else:
-                clean_response = response.replace("```json", "").replace("```", "").strip()
-                
-            return json.loads(clean_response)
-        except Exception as e:
-            return {
-                "encouragement": "系统繁忙，但学习不能停！请复习昨天的错题。",
-                "tasks": [{"topic": "自主复习", "description": "系统暂时无法生成新计划，请复习笔记。", "estimated_time": "30min"}],
-                "error": str(e)
-            }
+        # 格式有误时只让 LLM 修复 JSON，不重新生成计划
+        return StructuredChain(prompt, self.llm, DailyPlan, "supervisor", "daily_plan")
+
+    def _daily_plan_fallback(self, e):
+        return {
+            "encouragement": "系统繁忙，但学习不能停！请复习昨天的错题。",
+            "tasks": [{"topic": "自主复习", "description": "系统暂时无法生成新计划，请复习笔记。", "estimated_time": "30min"}],
+            "error": str(e)
+        }
 
-    def generate_roadmap(self, user_profile):
+    def generate_roadmap(self, user_profile, use_cache=True):
         """
         生成长期学习路线图
+        :param use_cache: False 时跳过缓存强制重新生成
         """
+        try:
+            with bypass_llm_cache(not use_cache):
+                return self.roadmap_chain.invoke({
+                    "target_role": user_profile.get("target_role", "后端工程师"),
+                    "days_left": user_profile.get("days_left", 30)
+                })
+        except:
+             return {"phases": []}
+
+    def _build_roadmap_chain(self):
         system_prompt = """你是一位专业的计算机学习规划师。
 请根据学生的目标岗位和当前水平，制定一份阶段性的学习路线图（Roadmap）。
 学生目标：{target_role}
@@ -96,19 +116,4 @@ JSON 格式必须合法。
             ("user", "请生成学习路线图。")
         ])
 
-        chain = prompt | self.llm | StrOutputParser()
-        
-        try:
-            response = chain.invoke({
-                "target_role": user_profile.get("target_role", "后端工程师"),
-                "days_left": user_profile.get("days_left", 30)
-            })
-            
-            json_match = re.search(r"\{[\s\S]*\}", response.strip())
-            if json_match:
-                clean = json_match.group(0)
-            else:
-                clean = response
-            return json.loads(clean)
-        except:
-             return {"phases": []}
+        return StructuredChain(prompt, self.cached_llm, Roadmap, "supervisor", "roadmap", repair_llm=self.llm)
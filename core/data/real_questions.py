@@ -1,5 +1,12 @@
 # 预置的大厂高频真题库
 # 包含：题目、公司、年份、难度、考察点
+# 题量变大后可改为从 JSON / CSV / SQLite 加载，见 QuestionBank.from_*
+
+import csv
+import json
+import os
+import sqlite3
+from core.config import QUESTION_BANK_PATH
 
 REAL_QUESTIONS = [
     # --- Python 基础 ---
@@ -149,7 +156,116 @@ REAL_QUESTIONS = [
     }
 ]
 
+class QuestionBank:
+    """
+    带倒排索引的题库
+    加载时一次性为 topic / tags / company / year / difficulty 建索引，
+    查询时对各字段的命中集合求交集，不再线性扫描整个题库
+    """
+    INDEXED_FIELDS = ("topic", "tags", "company", "year", "difficulty")
+
+    def __init__(self, questions):
+        self.questions = list(questions)
+        # field -> value -> set(题目下标)
+        self._index = {field: {} for field in self.INDEXED_FIELDS}
+        for qid, q in enumerate(self.questions):
+            for field in self.INDEXED_FIELDS:
+                for value in self._values(q.get(field)):
+                    self._index[field].setdefault(value, set()).add(qid)
+
+    @staticmethod
+    def _values(raw):
+        if raw is None:
+            return []
+        if isinstance(raw, (list, tuple, set)):
+            return [str(v).strip() for v in raw]
+        return [str(raw).strip()]
+
+    def __len__(self):
+        return len(self.questions)
+
+    def values(self, field):
+        """某个字段的所有取值 (例如全部 topic)"""
+        return sorted(self._index[field].keys())
+
+    def query(self, **filters):
+        """
+        多字段联合查询，字段之间为 AND，同一字段传 list 时为 OR
+        例: bank.query(topic="MySQL", difficulty="困难")
+            bank.query(tags=["索引", "MVCC"], company="美团")
+        值为 None 的条件会被忽略；无条件时返回全部题目
+        """
+        hit_sets = []
+        for field, value in filters.items():
+            if value is None:
+                continue
+            if field not in self._index:
+                raise ValueError(f"Unsupported field: {field}")
+            ids = set()
+            for v in self._values(value):
+                ids |= self._index[field].get(v, set())
+            if not ids:
+                return []
+            hit_sets.append(ids)
+
+        if not hit_sets:
+            return list(self.questions)
+
+        # 从最小的集合开始求交集
+        hit_sets.sort(key=len)
+        result = set(hit_sets[0])
+        for ids in hit_sets[1:]:
+            result &= ids
+            if not result:
+                return []
+        return [self.questions[qid] for qid in sorted(result)]
+
+    # --- Loaders ---
+
+    @classmethod
+    def from_json(cls, path):
+        """JSON 文件: 题目 dict 组成的列表"""
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def from_csv(cls, path, tag_sep="|"):
+        """CSV 文件: 表头包含 topic,company,year,question,difficulty,tags，tags 用 tag_sep 分隔"""
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            row["tags"] = [t.strip() for t in (row.get("tags") or "").split(tag_sep) if t.strip()]
+        return cls(rows)
+
+    @classmethod
+    def from_sqlite(cls, path, table="questions"):
+        """SQLite 表: 列同 CSV，tags 列存 JSON 数组字符串"""
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = [dict(r) for r in conn.execute(f"SELECT * FROM {table}")]
+        finally:
+            conn.close()
+        for row in rows:
+            row["tags"] = json.loads(row["tags"]) if row.get("tags") else []
+        return cls(rows)
+
+def load_question_bank(path=None):
+    """按扩展名加载外部题库 (.json / .csv / .db|.sqlite)，未配置时使用内置题库"""
+    if not path:
+        return QuestionBank(REAL_QUESTIONS)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".json":
+        return QuestionBank.from_json(path)
+    if ext == ".csv":
+        return QuestionBank.from_csv(path)
+    if ext in (".db", ".sqlite", ".sqlite3"):
+        return QuestionBank.from_sqlite(path)
+    raise ValueError(f"Unsupported question bank format: {path}")
+
+DEFAULT_QUESTION_BANK = load_question_bank(QUESTION_BANK_PATH)
+
 def get_real_questions(topic=None):
     if not topic:
-        return REAL_QUESTIONS
-    return [q for q in REAL_QUESTIONS if q['topic'] == topic]
+        return DEFAULT_QUESTION_BANK.questions
+    return DEFAULT_QUESTION_BANK.query(topic=topic)
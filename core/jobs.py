@@ -0,0 +1,266 @@
+"""
+后台任务队列
+- 任务持久化在 jobs 表 (与业务数据同库)，进程重启后未完成的任务会重新执行
+- 执行中的任务定期刷新心跳，多进程部署时只收回心跳过期 (所属进程已退出) 的任务
+- 页面调用 submit() 入队后立即返回，通过 get_job / get_latest_job 轮询状态
+- 同一 dedupe_key 同时只会有一个进行中的任务 (例如同一场面试的最终报告 / 对话摘要)
+- 生成结果由任务直接写入业务表，job.result 只保存摘要 (路线图没有对应的表，整份存在 result 中)
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from core.config import JOB_WORKERS, JOB_POLL_INTERVAL, JOB_HEARTBEAT_INTERVAL, JOB_STALE_AFTER
+from core.llm import get_llm, single_flight
+from core.memory import ConversationMemory
+from database.models import session_scope
+from database import crud
+
+logger = logging.getLogger(__name__)
+
+# --- Handlers ---
+
+_agents = {}
+_agents_lock = threading.Lock()
+
+def _get_agent(agent_cls):
+    """工作线程共享的 Agent 实例 (共享同一个 LLM 连接池)"""
+    with _agents_lock:
+        if agent_cls not in _agents:
+            _agents[agent_cls] = agent_cls(get_llm())
+        return _agents[agent_cls]
+
+def _run_final_report(payload):
+    from core.agents.interviewer import InterviewerAgent
+
+    session_id = payload["session_id"]
+    with session_scope() as db:
+        session = crud.get_interview_session(db, session_id, with_feedback=True)
+        if session is None:
+            raise ValueError(f"面试 {session_id} 不存在")
+        if session.feedback:
+            # 已有报告 (例如重启后重复执行)，不再重新生成
+            return {"session_id": session_id, "score": session.score}
+        messages = crud.get_session_messages(db, session_id)
+        memory = ConversationMemory.from_state(get_llm(), session.memory)
+
+    report = _get_agent(InterviewerAgent).generate_final_report(messages, memory=memory)
+    score = report.get("total_score", 0)
+    with session_scope() as db:
+        crud.save_session_memory(db, session_id, memory.state())
+        if "error" not in report:
+            crud.update_session_feedback(db, session_id, score, json.dumps(report))
+    if "error" in report:
+        # 兜底报告不落库 (否则会以 0 分计入统计)，任务标记失败，页面可重新生成
+        raise RuntimeError(report["error"])
+    return {"session_id": session_id, "score": score}
+
+def _run_memory_summary(payload):
+    """把面试中较早的对话增量合并进滚动摘要 (每满 K 轮触发一次，在用户作答期间后台完成)"""
+    session_id = payload["session_id"]
+    with session_scope() as db:
+        session = crud.get_interview_session(db, session_id)
+        if session is None:
+            raise ValueError(f"面试 {session_id} 不存在")
+        messages = crud.get_session_messages(db, session_id)
+        memory = ConversationMemory.from_state(get_llm(), session.memory)
+
+    if memory.update(messages):
+        with session_scope() as db:
+            crud.save_session_memory(db, session_id, memory.state())
+    return {"summarized_count": memory.summarized_count}
+
+def _run_daily_plan(payload):
+    from core.agents.supervisor import SupervisorAgent
+
+    user_id = payload["user_id"]
+    with session_scope() as db:
+        existing = crud.get_today_plan(db, user_id)
+        if existing:
+            return {"plan_id": existing.id}
+        weaknesses = crud.get_recent_weaknesses(db, user_id)
+
+    plan = _get_agent(SupervisorAgent).generate_daily_plan(payload["user_profile"], recent_weaknesses=weaknesses)
+    if "error" in plan:
+        raise RuntimeError(plan["error"])
+
+    tasks = [{
+        "topic": t.get("topic", ""),
+        "description": t.get("description", ""),
+        "estimated_time": t.get("estimated_time", "30min"),
+        "status": "pending"
+    } for t in plan.get("tasks", [])]
+    with session_scope() as db:
+        created = crud.create_daily_plan(db, user_id, tasks, plan.get("encouragement"))
+    return {"plan_id": created.id}
+
+def _run_roadmap(payload):
+    from core.agents.supervisor import SupervisorAgent
+
+    return _get_agent(SupervisorAgent).generate_roadmap(payload["user_profile"], use_cache=payload.get("use_cache", True))
+
+def _run_research(payload):
+    from core.agents.researcher import ResearcherAgent
+
+    topic = payload["topic"]
+    overwrite = payload.get("overwrite", False)
+    if not overwrite:
+        with session_scope() as db:
+            existing = crud.get_knowledge_doc_by_topic(db, topic)
+        if existing:
+            return {"doc_id": existing.id}
+    content = _get_agent(ResearcherAgent).write_report(topic, use_cache=not overwrite)
+    with session_scope() as db:
+        doc = crud.save_knowledge_doc(db, payload["user_id"], topic, content, overwrite=overwrite)
+    return {"doc_id": doc.id}
+
+JOB_HANDLERS = {
+    "final_report": _run_final_report,
+    "memory_summary": _run_memory_summary,
+    "daily_plan": _run_daily_plan,
+    "roadmap": _run_roadmap,
+    "research": _run_research,
+}
+
+# --- Worker ---
+
+class JobWorker:
+    """
+    调度线程从 jobs 表领取任务，交给线程池执行
+    LLM 调用以网络等待为主，线程池即可；并发上限同时受 LLM_MAX_CONCURRENCY 连接池约束
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, poll_interval=JOB_POLL_INTERVAL,
+                 heartbeat_interval=JOB_HEARTBEAT_INTERVAL, stale_after=JOB_STALE_AFTER):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self._slots = threading.Semaphore(max_workers) # 只在有空闲线程时领取，避免任务在内存里排队
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._requeue_stale()
+        self._thread = threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True)
+        self._thread.start()
+        threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True).start()
+
+    def _requeue_stale(self):
+        with session_scope() as db:
+            requeued = crud.requeue_stale_jobs(db, self.stale_after)
+        if requeued:
+            logger.info("Requeued %s stale jobs", requeued)
+            self.notify()
+
+    def _heartbeat_loop(self):
+        """刷新自己名下任务的心跳，并顺带收回其他已退出进程遗留的任务"""
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                with session_scope() as db:
+                    crud.heartbeat_jobs(db, self.worker_id)
+                self._requeue_stale()
+            except Exception:
+                logger.exception("Job heartbeat failed")
+
+    def notify(self):
+        """有新任务入队时唤醒调度线程，不必等到下一次轮询"""
+        self._wakeup.set()
+
+    def _dispatch_loop(self):
+        while True:
+            self._slots.acquire()
+            self._wakeup.clear()
+            try:
+                with session_scope() as db:
+                    job = crud.claim_next_job(db, self.worker_id)
+            except Exception:
+                logger.exception("Failed to claim job")
+                job = None
+
+            if job is None:
+                self._slots.release()
+                self._wakeup.wait(self.poll_interval)
+                continue
+            self.executor.submit(self._execute, job.id, job.kind, job.dedupe_key, job.payload or {})
+
+    def _execute(self, job_id, kind, dedupe_key, payload):
+        result, error = None, None
+        try:
+            handler = JOB_HANDLERS.get(kind)
+            if handler is None:
+                raise ValueError(f"未知的任务类型: {kind}")
+            # 进程内再按逻辑请求合并一次: 重启后重新排队的任务与新任务撞在一起时也只执行一次
+            result = single_flight.do(f"job:{dedupe_key}", handler, payload)
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job_id, kind)
+            error = str(e) or e.__class__.__name__
+        finally:
+            try:
+                with session_scope() as db:
+                    crud.finish_job(db, job_id, result=result, error=error, worker_id=self.worker_id)
+            except Exception:
+                logger.exception("Failed to record result of job %s", job_id)
+            self._slots.release()
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def get_job_worker():
+    """进程内唯一的后台执行器，首次入队或查询任务状态时启动 (重启后轮询中的页面也会把遗留任务接着执行完)"""
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                worker = JobWorker()
+                worker.start()
+                _worker = worker
+    return _worker
+
+# --- Public API ---
+
+def final_report_key(session_id):
+    return f"final_report:{session_id}"
+
+def memory_summary_key(session_id):
+    return f"memory_summary:{session_id}"
+
+def daily_plan_key(user_id, plan_date):
+    return f"daily_plan:{user_id}:{plan_date}"
+
+def roadmap_key(user_id):
+    return f"roadmap:{user_id}"
+
+def research_key(topic):
+    return f"research:{crud.normalize_topic(topic)}"
+
+def submit(kind, dedupe_key, payload, user_id=None):
+    """
+    入队并返回 Job；同一 dedupe_key 已有进行中的任务时返回该任务
+    用法: job = submit("final_report", final_report_key(sid), {"session_id": sid}, user_id)
+    """
+    worker = get_job_worker()
+    with session_scope() as db:
+        job = crud.enqueue_job(db, kind, dedupe_key, payload, user_id=user_id)
+    worker.notify()
+    return job
+
+def get_job(job_id):
+    get_job_worker()
+    with session_scope() as db:
+        return crud.get_job(db, job_id)
+
+def get_latest_job(dedupe_key):
+    get_job_worker()
+    with session_scope() as db:
+        return crud.get_latest_job(db, dedupe_key)
+
+def is_active(job):
+    return job is not None and job.status in crud.JOB_ACTIVE_STATUSES
@@ -1,13 +1,42 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+
+import httpx
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
 from langchain_openai import ChatOpenAI
-from core.config import OPENAI_API_KEY, OPENAI_BASE_URL, MODEL_NAME
+from core.config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, MODEL_NAME,
+    LLM_MAX_CONCURRENCY, LLM_MAX_KEEPALIVE, LLM_KEEPALIVE_EXPIRY,
+    LLM_TIMEOUT, LLM_CONNECT_TIMEOUT, LLM_MAX_RETRIES,
+    LLM_CACHE_ENABLED, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES, LLM_METRICS_ENABLED,
+)
+from core.metrics import get_metrics_handler
+from database.models import SessionLocal, LLMCacheEntry
 
-def get_llm():
-    """
-    获取配置好的 LLM 实例
-    """
+_llm = None
+_llm_lock = threading.Lock()
+
+def _http_limits():
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONCURRENCY,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+    )
+
+def _http_timeout():
+    # pool: 连接池满 (达到最大并发) 时排队等待的上限
+    return httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT, pool=LLM_TIMEOUT)
+
+def _create_llm():
     if not OPENAI_API_KEY:
         raise ValueError("OPENAI_API_KEY not found. Please set it in .env file.")
-    
+
     # 硅基流动 (SiliconFlow) 特定参数配置
     # 注意：OpenAI 官方 SDK 不支持 top_k 和 min_p 直接作为参数，需要放入 extra_body 中
     model_kwargs = {
@@ -23,5 +52,288 @@ def get_llm():
         openai_api_key=OPENAI_API_KEY,
         openai_api_base=OPENAI_BASE_URL,
         temperature=0.7,
-        model_kwargs=model_kwargs
+        model_kwargs=model_kwargs,
+        timeout=_http_timeout(),
+        max_retries=LLM_MAX_RETRIES,
+        # 埋点: 记录每次调用的 token / 延迟，流式调用也要求服务端返回用量
+        callbacks=[get_metrics_handler()] if LLM_METRICS_ENABLED else None,
+        stream_usage=True,
+        # 长连接池在进程内复用，TLS 握手只在建连时付出一次
+        http_client=httpx.Client(limits=_http_limits(), timeout=_http_timeout()),
+        http_async_client=httpx.AsyncClient(limits=_http_limits(), timeout=_http_timeout())
     )
+
+def get_llm():
+    """
+    获取配置好的 LLM 实例 (进程内单例，所有页面和 Agent 共享同一个连接池)
+    """
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                _llm = _create_llm()
+    return _llm
+
+# --- Concurrency ---
+
+_loop = None
+_loop_lock = threading.Lock()
+
+def _get_event_loop():
+    """
+    后台常驻事件循环
+    共享的 httpx.AsyncClient 绑定在单个事件循环上，所有异步调用都提交到这里执行，
+    避免 asyncio.run 每次新建循环导致连接池失效
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+def submit_async(coro):
+    """在后台事件循环中执行协程，不等待结果，返回 concurrent.futures.Future (用于预取等投机任务)"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_event_loop())
+
+def run_async(coro):
+    """在后台事件循环中执行协程并阻塞等待结果 (供 Streamlit 同步脚本调用)"""
+    return submit_async(coro).result()
+
+def iter_completed(coros, limit=LLM_MAX_CONCURRENCY):
+    """
+    同步 generator: 并发执行协程，按完成先后 yield (下标, 结果)
+    适合边算边渲染的场景，先完成的结果先展示
+    """
+    loop = _get_event_loop()
+    semaphore = asyncio.Semaphore(limit)
+
+    async def _run(idx, coro):
+        async with semaphore:
+            return idx, await coro
+
+    futures = [asyncio.run_coroutine_threadsafe(_run(i, c), loop) for i, c in enumerate(coros)]
+    for future in concurrent.futures.as_completed(futures):
+        yield future.result()
+
+# --- Single Flight ---
+
+class SingleFlight:
+    """
+    合并并发的相同请求: 同一 key 同一时刻只执行一次，其余调用方阻塞等待并共享结果 (包括异常)
+    响应缓存只能复用 "已完成" 的结果，两个请求同时未命中时仍会各调一次 LLM，这里补上这一段
+    只在进程内生效；跨进程的去重由 jobs 表 active_key 唯一索引和业务表的唯一索引保证
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> Future
+        self._lock = threading.Lock()
+        self.shared = 0 # 被合并 (没有实际执行) 的调用次数
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self._calls[key] = future
+            else:
+                self.shared += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def ado(self, key, coro_fn, *args, **kwargs):
+        """
+        do 的异步版本，与同步调用共用同一组 key (同步线程和事件循环中的相同请求也会合并)
+        跟随者用 asyncio.wrap_future 等待，不阻塞事件循环
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self._calls[key] = future
+            else:
+                self.shared += 1
+
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            result = await coro_fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+single_flight = SingleFlight()
+
+# --- Response Cache ---
+
+_cache_bypass = ContextVar("llm_cache_bypass", default=False)
+
+@contextmanager
+def bypass_llm_cache(bypass=True):
+    """
+    在 with 块内跳过缓存读取 (仍会把新结果写回缓存)
+    用法: with bypass_llm_cache(not use_cache): chain.invoke(...)
+    """
+    token = _cache_bypass.set(bypass)
+    try:
+        yield
+    finally:
+        _cache_bypass.reset(token)
+
+class LLMResponseCache(BaseCache):
+    """
+    基于现有 SQLAlchemy 引擎的持久化 LLM 响应缓存
+    - key: sha256(llm_string + prompt)，llm_string 由 LangChain 生成，已包含模型名与采样参数
+    - 过期: 超过 ttl_seconds 的条目视为未命中并删除
+    - 淘汰: 条目数超过 max_entries 时按 last_accessed_at 删除最久未用的
+    """
+
+    def __init__(self, session_factory, ttl_seconds=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.session_factory = session_factory
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def lookup(self, prompt, llm_string):
+        if _cache_bypass.get():
+            return None
+
+        db = self.session_factory()
+        try:
+            entry = db.get(LLMCacheEntry, self._key(prompt, llm_string))
+            now = datetime.utcnow()
+            if entry is None:
+                self._count(False)
+                return None
+            if entry.created_at and now - entry.created_at > self.ttl:
+                db.delete(entry)
+                db.commit()
+                self._count(False)
+                return None
+
+            entry.last_accessed_at = now
+            entry.hit_count = (entry.hit_count or 0) + 1
+            db.commit()
+            self._count(True)
+            generations = loads(entry.response)
+            for generation in generations:
+                # 供埋点区分缓存命中 (不产生费用)
+                generation.generation_info = {**(generation.generation_info or {}), "cache_hit": True}
+            return generations
+        finally:
+            db.close()
+
+    def update(self, prompt, llm_string, return_val):
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            db.merge(LLMCacheEntry(
+                key=self._key(prompt, llm_string),
+                response=dumps(list(return_val)),
+                created_at=now,
+                last_accessed_at=now,
+                hit_count=0
+            ))
+            db.commit()
+            self._evict(db)
+        finally:
+            db.close()
+
+    def _evict(self, db):
+        db.query(LLMCacheEntry).filter(
+            LLMCacheEntry.created_at < datetime.utcnow() - self.ttl
+        ).delete(synchronize_session=False)
+
+        overflow = db.query(LLMCacheEntry).count() - self.max_entries
+        if overflow > 0:
+            stale_keys = [k for (k,) in db.query(LLMCacheEntry.key).order_by(
+                LLMCacheEntry.last_accessed_at
+            ).limit(overflow)]
+            db.query(LLMCacheEntry).filter(
+                LLMCacheEntry.key.in_(stale_keys)
+            ).delete(synchronize_session=False)
+        db.commit()
+
+    def clear(self, **kwargs):
+        db = self.session_factory()
+        try:
+            db.query(LLMCacheEntry).delete()
+            db.commit()
+        finally:
+            db.close()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """命中统计 (进程内计数) + 当前条目数"""
+        db = self.session_factory()
+        try:
+            entries = db.query(LLMCacheEntry).count()
+        finally:
+            db.close()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total * 100) if total > 0 else 0,
+            "entries": entries,
+        }
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    """进程内唯一的响应缓存实例"""
+    global _llm_cache
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                _llm_cache = LLMResponseCache(SessionLocal)
+    return _llm_cache
+
+def with_response_cache(llm):
+    """
+    返回一个启用了响应缓存的 LLM 副本 (共享底层 HTTP 客户端)
+    只用于输入相同则结果可复用的调用，面试对话等场景请直接用原 llm
+    """
+    if not LLM_CACHE_ENABLED:
+        return llm
+    return llm.model_copy(update={"cache": get_llm_cache()})
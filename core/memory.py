@@ -0,0 +1,110 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from core.config import MEMORY_WINDOW_MESSAGES, MEMORY_SUMMARIZE_EVERY, MEMORY_SUMMARY_MAX_CHARS
+from core.metrics import metrics_config
+
+def format_messages(messages):
+    return "\n".join(f"{msg.get('role')}: {msg.get('content')}" for msg in messages)
+
+def to_chat_messages(messages):
+    """数据库中的消息 -> LangChain 消息，供 MessagesPlaceholder 使用 (内容原样传递，不经过模板解析)"""
+    return [
+        AIMessage(content=msg.get("content") or "") if msg.get("role") in ("ai", "assistant")
+        else HumanMessage(content=msg.get("content") or "")
+        for msg in messages
+    ]
+
+class ConversationMemory:
+    """
+    面试对话记忆 = 滚动摘要 + 最近窗口原文
+    - 摘要覆盖 history[:summarized_count]，其后的消息原文保留
+    - 未摘要的旧消息每满 summarize_every 轮 (2 条消息为一轮) 增量合并进摘要，只把新增部分交给 LLM
+    - 无论面试多长，送进 prompt 的内容都有上限: 摘要 + 窗口 + 最多 summarize_every 轮待合并消息
+    状态通过 state() / from_state() 存取 (InterviewSession.memory)
+    """
+    SUMMARY_PROMPT = """你是面试记录员。请把新增的面试对话合并进已有摘要，输出更新后的完整摘要。
+
+摘要需要保留:
+1. 已经问过的问题 (避免面试官重复提问)
+2. 候选人每个问题的回答要点、答对的部分和暴露的知识盲区
+3. 面试官的评价倾向和追问方向
+
+要求: 使用中文，条目式，不超过 {max_chars} 字，只输出摘要本身。"""
+
+    # 模板只解析一次，所有实例共用
+    _prompt = ChatPromptTemplate.from_messages([
+        ("system", SUMMARY_PROMPT),
+        ("user", "已有摘要:\n{summary}\n\n新增对话:\n{conversation}\n\n请输出更新后的摘要:")
+    ])
+
+    def __init__(self, llm, summary="", summarized_count=0,
+                 window=MEMORY_WINDOW_MESSAGES, summarize_every=MEMORY_SUMMARIZE_EVERY):
+        self.llm = llm
+        self.summary = summary or ""
+        self.summarized_count = summarized_count or 0
+        self.window = window
+        self.summarize_every = summarize_every
+        self.chain = (self._prompt | llm | StrOutputParser()).with_config(metrics_config("memory", "summarize"))
+
+    @classmethod
+    def from_state(cls, llm, state, **kwargs):
+        state = state or {}
+        return cls(llm, summary=state.get("summary", ""), summarized_count=state.get("summarized_count", 0), **kwargs)
+
+    def state(self):
+        return {"summary": self.summary, "summarized_count": self.summarized_count}
+
+    def _foldable(self, message_count, force=False):
+        """可合并进摘要的消息数 (窗口内的消息始终保留原文)"""
+        foldable = message_count - self.window - self.summarized_count
+        if foldable <= 0:
+            return 0
+        if force or foldable >= self.summarize_every * 2:
+            return foldable
+        return 0
+
+    def needs_update(self, message_count):
+        return self._foldable(message_count) > 0
+
+    def _summary_inputs(self, history, foldable):
+        new_messages = history[self.summarized_count:self.summarized_count + foldable]
+        return {
+            "max_chars": MEMORY_SUMMARY_MAX_CHARS,
+            "summary": self.summary or "(无)",
+            "conversation": format_messages(new_messages),
+        }
+
+    def update(self, history, force=False):
+        """
+        把窗口之外、尚未摘要的消息合并进摘要，返回是否有变化
+        :param force: True 时不等攒满 summarize_every 轮 (生成最终报告前调用)
+        """
+        foldable = self._foldable(len(history), force=force)
+        if not foldable:
+            return False
+        self.summary = self.chain.invoke(self._summary_inputs(history, foldable)).strip()
+        self.summarized_count += foldable
+        return True
+
+    async def aupdate(self, history, force=False):
+        """update 的异步版本，在事件循环中调用时不阻塞其他协程"""
+        foldable = self._foldable(len(history), force=force)
+        if not foldable:
+            return False
+        self.summary = (await self.chain.ainvoke(self._summary_inputs(history, foldable))).strip()
+        self.summarized_count += foldable
+        return True
+
+    def recent(self, history):
+        """未被摘要覆盖的消息；摘要落后太多时 (例如后台合并失败) 只保留最近的部分，保证上限"""
+        pending = history[min(self.summarized_count, len(history)):]
+        limit = self.window + self.summarize_every * 2
+        return pending[-limit:]
+
+    def to_messages(self, history):
+        """送进 MessagesPlaceholder 的消息列表: 早前对话摘要 (如有) + 未摘要的原文"""
+        messages = to_chat_messages(self.recent(history))
+        if not self.summary:
+            return messages
+        return [SystemMessage(content=f"[早前对话摘要]\n{self.summary}")] + messages
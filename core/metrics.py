@@ -0,0 +1,271 @@
+"""
+LLM 调用埋点
+- LLMMetricsHandler 挂在共享 LLM 上 (见 core.llm)，所有 Agent 的调用都会经过它
+- 归属哪个功能由调用时的 metadata 决定: chain.with_config(metrics_config("interviewer", "evaluate"))
+- 记录异步批量写入 llm_call_metrics 表，不阻塞 LLM 调用本身
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from core.config import LLM_PRICE_PROMPT_PER_M, LLM_PRICE_COMPLETION_PER_M, LLM_PRICE_CACHED_PROMPT_PER_M
+from database.models import SessionLocal, LLMCallMetric
+
+logger = logging.getLogger(__name__)
+
+def metrics_config(agent, method):
+    """chain.with_config 的参数: 标记这次调用属于哪个 Agent 的哪个方法"""
+    return {"run_name": f"{agent}.{method}", "metadata": {"agent": agent, "method": method}}
+
+def estimate_cost(prompt_tokens, completion_tokens, cached_tokens=0):
+    """按配置的单价估算费用 (元)，命中前缀缓存的输入 tokens 按缓存单价计"""
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (
+        uncached * LLM_PRICE_PROMPT_PER_M
+        + cached_tokens * LLM_PRICE_CACHED_PROMPT_PER_M
+        + completion_tokens * LLM_PRICE_COMPLETION_PER_M
+    ) / 1_000_000
+
+def _cached_from_token_usage(token_usage):
+    """
+    服务端原始 usage 中的缓存命中 tokens: OpenAI 格式 prompt_tokens_details.cached_tokens / DeepSeek 格式 prompt_cache_hit_tokens
+    注意: 流式调用只有 OpenAI 格式会被 LangChain 转进 usage_metadata，只返回 DeepSeek 格式的服务端流式调用记为 0
+    """
+    details = token_usage.get("prompt_tokens_details") or {}
+    return details.get("cached_tokens") or token_usage.get("prompt_cache_hit_tokens") or 0
+
+def _extract_usage(response):
+    """返回 (prompt_tokens, completion_tokens, cached_tokens, cache_hit)"""
+    prompt_tokens, completion_tokens, cached_tokens, cache_hit = 0, 0, 0, False
+    for generations in response.generations:
+        for generation in generations:
+            if (generation.generation_info or {}).get("cache_hit"):
+                cache_hit = True
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+                cached_tokens += (usage.get("input_token_details") or {}).get("cache_read") or 0
+    # 旧版 / 非流式接口把用量放在 llm_output 里，DeepSeek 的缓存字段也只在原始 usage 中
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    if not (prompt_tokens or completion_tokens):
+        prompt_tokens = token_usage.get("prompt_tokens", 0) or 0
+        completion_tokens = token_usage.get("completion_tokens", 0) or 0
+    if not cached_tokens:
+        cached_tokens = _cached_from_token_usage(token_usage)
+    return prompt_tokens, completion_tokens, cached_tokens, cache_hit
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    LangChain 回调: 记录每次模型调用的 token 数、首 token 延迟、总延迟和错误
+    命中响应缓存的调用也会记录 (cache_hit=True)，统计费用时排除
+    """
+    run_inline = True # 异步调用中也同步执行回调，保证计时准确
+
+    def __init__(self, session_factory, flush_interval=2.0, batch_size=50):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._runs = {}  # run_id -> 进行中的调用
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._writer = None
+
+    # --- Callbacks ---
+
+    def _start(self, run_id, metadata, kwargs):
+        metadata = metadata or {}
+        params = kwargs.get("invocation_params") or {}
+        with self._lock:
+            self._runs[run_id] = {
+                "start": time.perf_counter(),
+                "first_token": None,
+                "chunks": 0, # 已收到的流式分块数，调用方提前停止时近似作为输出 tokens
+                "agent": metadata.get("agent", "unknown"),
+                "method": metadata.get("method", "unknown"),
+                "model": metadata.get("ls_model_name") or params.get("model") or params.get("model_name"),
+                "turn": metadata.get("turn"),
+            }
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, metadata, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, metadata, kwargs)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        now = time.perf_counter()
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is not None:
+                run["chunks"] += 1
+                if run["first_token"] is None:
+                    run["first_token"] = now
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        prompt_tokens, completion_tokens, cached_tokens, cache_hit = _extract_usage(response)
+        self._record(run, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                     cached_tokens=cached_tokens, cache_hit=cache_hit)
+
+    def on_llm_error(self, error, *, run_id, response=None, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        if isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+            # 调用方提前停止读取 (离开页面 / 取消协程) 不是模型错误，按正常结束记录，保留已收到的用量
+            prompt_tokens, completion_tokens, cached_tokens, cache_hit = _extract_usage(response) if response else (0, 0, 0, False)
+            self._record(run, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens or run["chunks"],
+                         cached_tokens=cached_tokens, cache_hit=cache_hit)
+            return
+        self._record(run, success=False, error=f"{error.__class__.__name__}: {error}"[:500])
+
+    # --- Writer ---
+
+    def _record(self, run, **fields):
+        now = time.perf_counter()
+        first_token = run["first_token"]
+        self._queue.put(LLMCallMetric(
+            agent=run["agent"],
+            method=run["method"],
+            model=run["model"],
+            turn=run["turn"],
+            latency_ms=(now - run["start"]) * 1000,
+            ttft_ms=(first_token - run["start"]) * 1000 if first_token else None,
+            streamed=first_token is not None,
+            **fields
+        ))
+        self._ensure_writer()
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="llm-metrics-writer", daemon=True)
+                    self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self.flush(batch)
+
+    def flush(self, batch=None):
+        """写入一批记录；不传时写入队列中的全部记录 (测试 / 退出前调用)"""
+        if batch is None:
+            batch = []
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+        if not batch:
+            return
+        db = self.session_factory()
+        try:
+            db.add_all(batch)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # 埋点失败不能影响业务调用
+            logger.exception("Failed to write %s LLM metrics", len(batch))
+        finally:
+            db.close()
+
+_handler = None
+_handler_lock = threading.Lock()
+
+def get_metrics_handler():
+    global _handler
+    if _handler is None:
+        with _handler_lock:
+            if _handler is None:
+                _handler = LLMMetricsHandler(SessionLocal)
+    return _handler
+
+# --- Reporting ---
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+def summarize_metrics(rows):
+    """
+    按 (agent, method) 汇总 crud.get_llm_call_metrics 的结果
+    延迟分位数只统计成功且未命中缓存的调用，费用只统计未命中缓存的调用
+    """
+    groups = {}
+    for row in rows:
+        g = groups.setdefault((row.agent, row.method), {
+            "agent": row.agent, "method": row.method, "calls": 0, "errors": 0, "cache_hits": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "latencies": [], "ttfts": []
+        })
+        g["calls"] += 1
+        if not row.success:
+            g["errors"] += 1
+            continue
+        if row.cache_hit:
+            g["cache_hits"] += 1
+            continue
+        g["prompt_tokens"] += row.prompt_tokens or 0
+        g["completion_tokens"] += row.completion_tokens or 0
+        g["cached_tokens"] += row.cached_tokens or 0
+        g["latencies"].append(row.latency_ms)
+        if row.ttft_ms is not None:
+            g["ttfts"].append(row.ttft_ms)
+
+    summary = []
+    for g in groups.values():
+        latencies, ttfts = g.pop("latencies"), g.pop("ttfts")
+        g.update({
+            "error_rate": g["errors"] / g["calls"] * 100,
+            "p50_ms": _percentile(latencies, 50),
+            "p95_ms": _percentile(latencies, 95),
+            "ttft_p50_ms": _percentile(ttfts, 50),
+            "cached_rate": (g["cached_tokens"] / g["prompt_tokens"] * 100) if g["prompt_tokens"] else 0,
+            "cost": estimate_cost(g["prompt_tokens"], g["completion_tokens"], g["cached_tokens"]),
+        })
+        summary.append(g)
+    return sorted(summary, key=lambda g: g["cost"], reverse=True)
+
+def summarize_turns(rows):
+    """
+    按面试轮次汇总 crud.get_turn_metrics 的结果
+    前缀缓存生效时，随着轮次增加 cached_rate 上升，单轮费用和首 token 延迟的增长应明显慢于 prompt_tokens
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(row.turn, []).append(row)
+
+    summary = []
+    for turn, items in sorted(groups.items()):
+        prompt_tokens = sum(r.prompt_tokens or 0 for r in items)
+        cached_tokens = sum(r.cached_tokens or 0 for r in items)
+        completion_tokens = sum(r.completion_tokens or 0 for r in items)
+        summary.append({
+            "turn": turn,
+            "calls": len(items),
+            "avg_prompt_tokens": prompt_tokens / len(items),
+            "avg_cached_tokens": cached_tokens / len(items),
+            "cached_rate": (cached_tokens / prompt_tokens * 100) if prompt_tokens else 0,
+            "p50_ms": _percentile([r.latency_ms for r in items], 50),
+            "ttft_p50_ms": _percentile([r.ttft_ms for r in items if r.ttft_ms is not None], 50),
+            "avg_cost": estimate_cost(prompt_tokens, completion_tokens, cached_tokens) / len(items),
+        })
+    return summary
@@ -0,0 +1,384 @@
+"""
+LLM 输出的 JSON 提取与校验 (所有 Agent 共用)
+- 单遍扫描的平衡括号提取器: 跳过 ```json 代码块标记和前后的说明文字，字符串内的括号不计数
+- 容错: 尾随逗号、输出被截断 (自动补齐未闭合的字符串和括号，必要时回退到最后一个完整元素)
+- 可增量喂入 (IncrementalJSONParser.feed)，流式输出时 JSON 一闭合即可解析
+- 校验失败时可只让 LLM 修复这段 JSON (parse_with_repair)，不必重新生成整份内容
+- StructuredChain: 开启 LLM_STRUCTURED_OUTPUT 时走服务端结构化输出，不支持时回落到文本解析
+- 每个功能的解析结果 (原生结构化 / 直接解析 / 修复后成功 / 失败) 计入 parse_stats
+"""
+import json
+import threading
+from collections import Counter, defaultdict
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from pydantic import ValidationError
+from core.config import LLM_STRUCTURED_OUTPUT
+from core.metrics import metrics_config
+
+class JSONParseError(ValueError):
+    """无法从 LLM 输出中得到合法 JSON (或不符合 schema)"""
+
+    def __init__(self, message, raw=""):
+        super().__init__(message)
+        self.raw = raw
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+def _strip_trailing_commas(text):
+    """去掉 } / ] 之前多余的逗号 (字符串内的不动)"""
+    out = []
+    in_string = escape = False
+    n = len(text)
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == ",":
+            j = i + 1
+            while j < n and text[j] in " \t\r\n":
+                j += 1
+            if j < n and text[j] in "}]":
+                continue
+        out.append(ch)
+    return "".join(out)
+
+class IncrementalJSONParser:
+    """
+    增量平衡括号扫描器
+    用法:
+        parser = IncrementalJSONParser()
+        for chunk in chain.stream(inputs):
+            if parser.feed(chunk):
+                break  # 第一个完整 JSON 已闭合
+        data = parser.parse()
+    每个字符只扫描一次，不会像贪婪正则那样在长输出上反复回溯
+    """
+
+    def __init__(self, expect="{"):
+        self.expect = expect # 顶层值的起始字符: "{" 或 "["
+        self.text = ""
+        self.start = None
+        self.end = None
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._commas = []  # (位置, 当时的括号栈)，截断修复时回退用
+
+    @property
+    def complete(self):
+        return self.end is not None
+
+    def feed(self, chunk):
+        """追加一段输出，返回第一个 JSON 是否已完整"""
+        self.text += chunk
+        self._scan()
+        return self.complete
+
+    def _scan(self):
+        text = self.text
+        i = self._pos
+        while i < len(text) and self.end is None:
+            ch = text[i]
+            if self.start is None:
+                if ch == self.expect:
+                    self.start = i
+                    self._stack.append(_CLOSERS[ch])
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in _CLOSERS:
+                self._stack.append(_CLOSERS[ch])
+            elif ch in "}]":
+                if self._stack and ch == self._stack[-1]:
+                    self._stack.pop()
+                    if not self._stack:
+                        self.end = i + 1
+            elif ch == ",":
+                self._commas.append((i, tuple(self._stack)))
+            i += 1
+        self._pos = i
+
+    def _candidates(self):
+        """依次产出: 原文 / 补齐截断后的文本 / 回退到最后几个完整元素后补齐的文本"""
+        if self.complete:
+            yield self.text[self.start:self.end]
+            return
+
+        body = self.text[self.start:]
+        tail = '"' if self._in_string else ""
+        yield body + tail + "".join(reversed(self._stack))
+        # 截断在 key 或值的中间时，丢掉最后一个不完整的元素
+        for pos, stack in reversed(self._commas[-20:]):
+            yield self.text[self.start:pos] + "".join(reversed(stack))
+
+    def parse(self):
+        """返回解析出的 Python 对象，失败抛出 JSONParseError"""
+        if self.start is None:
+            raise JSONParseError("输出中没有找到 JSON", self.text)
+        error = None
+        for candidate in self._candidates():
+            try:
+                return json.loads(_strip_trailing_commas(candidate))
+            except json.JSONDecodeError as e:
+                error = e
+        raise JSONParseError(f"JSON 解析失败: {error}", self.text)
+
+def extract_json(text, expect="{", max_attempts=20):
+    """
+    从 LLM 的完整输出中提取第一个合法 JSON
+    前面的说明文字里出现不成对的括号时，会从下一个起始括号重新尝试 (最多 max_attempts 次)
+    """
+    text = text or ""
+    offset = 0
+    first_error = None
+    for _ in range(max_attempts):
+        parser = IncrementalJSONParser(expect=expect)
+        parser.feed(text[offset:])
+        if parser.start is None:
+            break
+        try:
+            return parser.parse()
+        except JSONParseError as e:
+            first_error = first_error or JSONParseError(str(e), text)
+            offset += parser.start + 1
+    raise first_error or JSONParseError("输出中没有找到 JSON", text)
+
+def parse_model(text, schema):
+    """提取 JSON 并按 schema 校验，返回 dict"""
+    data = extract_json(text)
+    try:
+        return schema.model_validate(data).model_dump()
+    except ValidationError as e:
+        raise JSONParseError(f"字段校验失败: {e}", text) from e
+
+# --- Repair ---
+
+_REPAIR_SYSTEM = """你是 JSON 修复工具。下面是一段不合法或不符合结构要求的 JSON 输出，以及解析时的报错。
+请在尽量保留原有内容的前提下修正它，使其成为符合 JSON Schema 的合法 JSON。
+只输出修正后的 JSON，不要输出任何解释或 markdown 标记。"""
+
+_REPAIR_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", _REPAIR_SYSTEM),
+    ("user", "JSON Schema:\n{schema}\n\n报错:\n{error}\n\n原始输出:\n{raw}")
+])
+
+def _build_repair_chain(llm):
+    return (_REPAIR_PROMPT | llm | StrOutputParser()).with_config(metrics_config("parsing", "repair"))
+
+def _repair_inputs(raw, schema, error):
+    return {
+        "schema": json.dumps(schema.model_json_schema(), ensure_ascii=False),
+        "error": str(error)[:500],
+        "raw": raw[-8000:], # 修复只需要 JSON 本身，过长的前置说明截掉
+    }
+
+def parse_with_repair(text, schema, llm=None, name=None):
+    """
+    解析并校验；失败且提供了 llm 时，只把这段输出交给 LLM 修复一次
+    仍失败则抛出 JSONParseError，由调用方走兜底数据
+    :param name: 计入 parse_stats 的功能名，默认用 schema 类名
+    """
+    name = name or schema.__name__
+    try:
+        result = parse_model(text, schema)
+    except JSONParseError as e:
+        if llm is None:
+            parse_stats.record(name, "failed")
+            raise
+        repaired = _build_repair_chain(llm).invoke(_repair_inputs(text, schema, e))
+        return _parse_repaired(repaired, schema, name)
+    parse_stats.record(name, "parsed")
+    return result
+
+async def aparse_with_repair(text, schema, llm=None, name=None):
+    """parse_with_repair 的异步版本"""
+    name = name or schema.__name__
+    try:
+        result = parse_model(text, schema)
+    except JSONParseError as e:
+        if llm is None:
+            parse_stats.record(name, "failed")
+            raise
+        repaired = await _build_repair_chain(llm).ainvoke(_repair_inputs(text, schema, e))
+        return _parse_repaired(repaired, schema, name)
+    parse_stats.record(name, "parsed")
+    return result
+
+def _parse_repaired(repaired, schema, name):
+    try:
+        result = parse_model(repaired, schema)
+    except JSONParseError:
+        parse_stats.record(name, "failed")
+        raise
+    parse_stats.record(name, "repaired")
+    return result
+
+# --- Stats ---
+
+class ParseStats:
+    """
+    按功能统计 JSON 解析结果 (本进程内)
+    structured: 服务端结构化输出直接通过校验
+    parsed: 文本输出一次解析成功
+    repaired: 经 LLM 修复后成功
+    failed: 修复后仍失败，调用方返回了兜底数据
+    fallback: 结构化输出被服务端拒绝，改走文本解析 (同一次调用还会计入上面某一项)
+    """
+    OUTCOMES = ("structured", "parsed", "repaired", "failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(Counter)
+
+    def record(self, name, outcome):
+        with self._lock:
+            self._counts[name][outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = {name: dict(c) for name, c in self._counts.items()}
+        rows = []
+        for name in sorted(counts):
+            c = counts[name]
+            total = sum(c.get(o, 0) for o in self.OUTCOMES)
+            rows.append({
+                "name": name,
+                "total": total,
+                **{o: c.get(o, 0) for o in self.OUTCOMES},
+                "fallback": c.get("fallback", 0),
+                "failure_rate": (c.get("failed", 0) / total * 100) if total else 0,
+                "repair_rate": (c.get("repaired", 0) / total * 100) if total else 0,
+            })
+        return rows
+
+parse_stats = ParseStats()
+
+# --- Structured Output ---
+
+STRUCTURED_METHODS = ("json_schema", "function_calling", "json_mode")
+
+# 服务端明确拒绝过结构化输出参数的 (模型, 方式)，本进程内不再尝试
+_unsupported = set()
+_unsupported_lock = threading.Lock()
+
+# 400 / 422 的报错信息里出现这些字样才说明是结构化输出参数本身不被支持
+_STRUCTURED_PARAM_HINTS = ("response_format", "json_schema", "tools")
+
+def _is_rejection(e):
+    """服务端不支持 response_format / tools 时返回 400 / 422；超时等其他错误照常抛出"""
+    return isinstance(e, NotImplementedError) or getattr(e, "status_code", None) in (400, 422)
+
+def _is_unsupported(e):
+    """
+    拒绝是否针对结构化输出参数本身 (可以在本进程内记住不再尝试)
+    上下文超长、内容审核等其他 400 只影响这一次调用，不能让之后的调用都退回文本路径
+    """
+    if isinstance(e, NotImplementedError):
+        return True
+    message = str(e).lower()
+    return any(hint in message for hint in _STRUCTURED_PARAM_HINTS)
+
+def _message_json_text(message):
+    """结构化输出校验失败时，从原始消息中取出 JSON 文本交给修复流程"""
+    if getattr(message, "tool_calls", None):
+        return json.dumps(message.tool_calls[0]["args"], ensure_ascii=False)
+    if getattr(message, "invalid_tool_calls", None):
+        return message.invalid_tool_calls[0].get("args") or ""
+    content = getattr(message, "content", "")
+    return content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+
+class StructuredChain:
+    """
+    prompt + llm -> 通过 schema 校验的 dict
+    - mode 为 json_schema / function_calling / json_mode 时使用服务端结构化输出，校验失败的原始输出仍走修复流程
+    - 模型没有结构化输出能力或服务端拒绝时，回落到 "文本输出 + parse_with_repair"
+    - 文本路径用 invoke 而不是 stream: 流式调用不查响应缓存，提前停止也拿不到服务端最后一块返回的用量
+    - 两条路径使用同一个 metrics 标签 (agent.method)
+    """
+
+    def __init__(self, prompt, llm, schema, agent, method, repair_llm=None, mode=LLM_STRUCTURED_OUTPUT):
+        self.schema = schema
+        self.name = f"{agent}.{method}"
+        self.repair_llm = repair_llm or llm
+        config = metrics_config(agent, method)
+        self.text_chain = (prompt | llm | StrOutputParser()).with_config(config)
+
+        self.mode = mode if mode in STRUCTURED_METHODS else None
+        self.structured_chain = None
+        self._support_key = (getattr(llm, "model_name", None) or type(llm).__name__, self.mode)
+        if self.mode:
+            try:
+                # 传 JSON Schema 而不是 Pydantic 类: 校验由 _from_structured 负责，校验失败的输出还能进入修复流程
+                structured_llm = llm.with_structured_output(schema.model_json_schema(), method=self.mode, include_raw=True)
+                self.structured_chain = (prompt | structured_llm).with_config(config)
+            except (NotImplementedError, ValueError):
+                self.structured_chain = None
+
+    @property
+    def structured(self):
+        """本次调用是否走结构化输出"""
+        return self.structured_chain is not None and self._support_key not in _unsupported
+
+    def _fallback(self, e):
+        """结构化调用被拒绝: 本次回落到文本路径，只有参数本身不被支持时才记住不再尝试"""
+        if _is_unsupported(e):
+            with _unsupported_lock:
+                _unsupported.add(self._support_key)
+        parse_stats.record(self.name, "fallback")
+
+    def _from_structured(self, output):
+        """通过校验返回 dict，否则返回原始 JSON 文本供修复"""
+        parsed = output.get("parsed")
+        if isinstance(parsed, dict):
+            try:
+                result = self.schema.model_validate(parsed).model_dump()
+            except ValidationError:
+                return json.dumps(parsed, ensure_ascii=False)
+            parse_stats.record(self.name, "structured")
+            return result
+        return _message_json_text(output.get("raw"))
+
+    def invoke(self, inputs):
+        if self.structured:
+            try:
+                output = self.structured_chain.invoke(inputs)
+            except Exception as e:
+                if not _is_rejection(e):
+                    raise
+                self._fallback(e)
+            else:
+                result = self._from_structured(output)
+                if isinstance(result, dict):
+                    return result
+                return parse_with_repair(result, self.schema, self.repair_llm, name=self.name)
+        return parse_with_repair(self.text_chain.invoke(inputs), self.schema, self.repair_llm, name=self.name)
+
+    async def ainvoke(self, inputs):
+        if self.structured:
+            try:
+                output = await self.structured_chain.ainvoke(inputs)
+            except Exception as e:
+                if not _is_rejection(e):
+                    raise
+                self._fallback(e)
+            else:
+                result = self._from_structured(output)
+                if isinstance(result, dict):
+                    return result
+                return await aparse_with_repair(result, self.schema, self.repair_llm, name=self.name)
+        return await aparse_with_repair(await self.text_chain.ainvoke(inputs), self.schema, self.repair_llm, name=self.name)
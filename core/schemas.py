@@ -0,0 +1,78 @@
+"""
+各 Agent JSON 输出的结构定义 (Pydantic)
+- 校验宽松: 缺省字段给默认值，分数统一转成 0-100 的整数，列表元素统一转成字符串
+- 只有关键字段缺失时才判定失败，交给 core.parsing 的修复步骤
+"""
+import re
+from typing import Dict, List
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+def _to_score(value):
+    """85 / 85.5 / "85分" / "85/100" -> 0-100 的整数"""
+    if isinstance(value, str):
+        match = re.search(r"-?\d+(\.\d+)?", value)
+        if not match:
+            raise ValueError(f"无法解析分数: {value!r}")
+        value = match.group(0)
+    return max(0, min(100, int(round(float(value)))))
+
+def _to_str_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (str, dict)):
+        value = [value]
+    return [item if isinstance(item, str) else str(item) for item in value]
+
+class _Schema(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+class FinalReport(_Schema):
+    total_score: int
+    summary: str
+    strengths: List[str] = Field(default_factory=list)
+    weaknesses: List[str] = Field(default_factory=list)
+    suggestions: List[str] = Field(default_factory=list)
+
+    _score = field_validator("total_score", mode="before")(_to_score)
+    _lists = field_validator("strengths", "weaknesses", "suggestions", mode="before")(_to_str_list)
+
+class PlanTask(_Schema):
+    topic: str
+    description: str = ""
+    estimated_time: str = "30min"
+
+class DailyPlan(_Schema):
+    encouragement: str = ""
+    tasks: List[PlanTask] = Field(min_length=1)
+
+class RoadmapPhase(_Schema):
+    phase_name: str = "Phase"
+    duration: str = "?"
+    goals: List[str] = Field(default_factory=list)
+    key_topics: List[str] = Field(default_factory=list)
+
+    _lists = field_validator("goals", "key_topics", mode="before")(_to_str_list)
+
+class Roadmap(_Schema):
+    phases: List[RoadmapPhase]
+
+class JDAnalysis(_Schema):
+    estimated_salary: str
+    red_flags: List[str] = Field(default_factory=list)
+    resume_tips: List[str] = Field(default_factory=list)
+    difficulty_score: int = 50
+    insider_comment: str = ""
+
+    _score = field_validator("difficulty_score", mode="before")(_to_score)
+    _lists = field_validator("red_flags", "resume_tips", mode="before")(_to_str_list)
+
+class ProgressReport(_Schema):
+    radar_chart: Dict[str, int]
+    trend_analysis: str = ""
+    key_suggestion: str = ""
+
+    @field_validator("radar_chart", mode="before")
+    @classmethod
+    def _radar_scores(cls, value):
+        return {str(k): _to_score(v) for k, v in (value or {}).items()}
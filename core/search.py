@@ -0,0 +1,148 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+# 英文/数字按单词切分，中文按连续汉字切成二元组 (character bigram)
+_WORD_RE = re.compile(r"[a-z0-9]+|[一-鿿]+")
+_CJK_RE = re.compile(r"[一-鿿]")
+
+def tokenize(text):
+    """
+    中英文混合分词
+    - 英文: 小写单词 (redis, b+ 树 -> b, 树)
+    - 中文: 连续汉字切成二元组，"缓存雪崩" -> 缓存 / 存雪 / 雪崩；单个汉字保留为一元组
+    """
+    tokens = []
+    for piece in _WORD_RE.findall((text or "").lower()):
+        if not _CJK_RE.match(piece):
+            tokens.append(piece)
+        elif len(piece) == 1:
+            tokens.append(piece)
+        else:
+            tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+    return tokens
+
+class SearchIndex:
+    """
+    BM25 倒排索引
+    - 支持增量 add / remove，新生成的研报无需重建整个索引
+    - 可序列化为 JSON 落盘，进程重启后直接加载
+    """
+    TITLE_BOOST = 3 # 标题中的词按出现 3 次计
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> {doc_id: tf}
+        self.doc_terms = {}  # doc_id -> [term]，删除文档时只需访问它自己的词
+        self.doc_lengths = {}  # doc_id -> 文档词数
+        self.doc_signatures = {}  # doc_id -> 内容签名，用于判断是否需要重新索引
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_lengths
+
+    def signature(self, doc_id):
+        return self.doc_signatures.get(doc_id)
+
+    def add_document(self, doc_id, title, text, signature=None):
+        """新增或覆盖一篇文档 (doc_id 需为字符串，以便 JSON 序列化)"""
+        with self._lock:
+            if doc_id in self.doc_lengths:
+                self.remove_document(doc_id)
+
+            counts = Counter(tokenize(text))
+            for token in tokenize(title):
+                counts[token] += self.TITLE_BOOST
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+            self.doc_terms[doc_id] = list(counts)
+
+            length = sum(counts.values())
+            self.doc_lengths[doc_id] = length
+            self.doc_signatures[doc_id] = signature
+            self.total_length += length
+
+    def remove_document(self, doc_id):
+        with self._lock:
+            if doc_id not in self.doc_lengths:
+                return
+            for term in self.doc_terms.pop(doc_id, []):
+                docs = self.postings.get(term, {})
+                docs.pop(doc_id, None)
+                if not docs:
+                    self.postings.pop(term, None)
+            self.total_length -= self.doc_lengths.pop(doc_id)
+            self.doc_signatures.pop(doc_id, None)
+
+    def search(self, query, limit=20):
+        """返回 [(doc_id, score)]，按 BM25 得分降序"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        # 打分全程持锁: 后台线程增量 add / remove 时，postings 与 doc_lengths 可能短暂不一致
+        with self._lock:
+            if not self.doc_lengths:
+                return []
+            n_docs = len(self.doc_lengths)
+            avg_len = self.total_length / n_docs
+            scores = {}
+            for term in terms:
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id, tf in docs.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        return ranked[:limit]
+
+    # --- Persistence ---
+
+    def save(self, path):
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "postings": self.postings,
+            "doc_lengths": self.doc_lengths,
+            "doc_signatures": self.doc_signatures,
+        }
+        # 先写临时文件再替换，避免写一半时进程退出导致索引损坏
+        tmp_path = f"{path}.tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data.get("k1", 1.5), b=data.get("b", 0.75))
+        index.postings = data["postings"]
+        index.doc_lengths = data["doc_lengths"]
+        index.doc_signatures = data.get("doc_signatures", {})
+        index.total_length = sum(index.doc_lengths.values())
+        for term, docs in index.postings.items():
+            for doc_id in docs:
+                index.doc_terms.setdefault(doc_id, []).append(term)
+        return index
+
+    @classmethod
+    def load_or_create(cls, path):
+        if path and os.path.exists(path):
+            try:
+                return cls.load(path)
+            except (ValueError, KeyError):
+                pass # 索引文件损坏时重建
+        return cls()
@@ -1,20 +1,49 @@
-from sqlalchemy.orm import Session
-from database.models import StudyPlan, InterviewSession
-from datetime import date
+from sqlalchemy import func, select, or_, and_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only, undefer
+from database.models import (
+    StudyPlan, InterviewSession, InterviewMessage, KnowledgeDoc, UserStats, UserTopicStats, SessionWeakness, Job, LLMCallMetric
+)
+from datetime import date, datetime, timedelta
 import json
+import logging
+import re
+import unicodedata
+
+logger = logging.getLogger(__name__)
 
 def get_today_plan(db: Session, user_id: int):
     return db.query(StudyPlan).filter(StudyPlan.user_id == user_id, StudyPlan.date == date.today()).first()
 
+def _count_tasks(tasks):
+    """返回 (任务总数, 已完成数)"""
+    tasks = tasks if isinstance(tasks, list) else []
+    completed = sum(1 for t in tasks if isinstance(t, dict) and t.get("status") == "completed")
+    return len(tasks), completed
+
 def create_daily_plan(db: Session, user_id: int, plan_data: dict, encouragement: str):
     # plan_data is list of tasks
+    task_count, completed_count = _count_tasks(plan_data)
     db_plan = StudyPlan(
         user_id=user_id,
         content=plan_data,
         encouragement=encouragement,
-        date=date.today()
+        date=date.today(),
+        task_count=task_count,
+        completed_count=completed_count
     )
     db.add(db_plan)
+    try:
+        # 先单独 flush: 同一天的重复计划 (多个标签页/多进程同时生成) 在这里被
+        # (user_id, date) 唯一索引拦下，直接返回已有计划，也不会重复累计统计
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        return get_today_plan(db, user_id)
+    _bump_user_stats(db, user_id, total_days=1, total_tasks=task_count, completed_tasks=completed_count)
     db.commit()
     db.refresh(db_plan)
     return db_plan
@@ -22,89 +51,632 @@ def create_daily_plan(db: Session, user_id: int, plan_data: dict, encouragement:
 def update_plan_status(db: Session, plan_id: int, tasks: list):
     plan = db.query(StudyPlan).filter(StudyPlan.id == plan_id).first()
     if plan:
+        old_counts = (plan.task_count or 0, plan.completed_count or 0)
         plan.content = tasks # tasks should have updated status
+        plan.task_count, plan.completed_count = _count_tasks(tasks)
+        _bump_user_stats(
+            db, plan.user_id,
+            total_tasks=plan.task_count - old_counts[0],
+            completed_tasks=plan.completed_count - old_counts[1]
+        )
         db.commit()
         db.refresh(plan)
     return plan
 
 def create_interview_session(db: Session, user_id: int, topic: str):
-    session = InterviewSession(user_id=user_id, topic=topic, messages=[])
+    session = InterviewSession(user_id=user_id, topic=topic)
     db.add(session)
     db.commit()
     db.refresh(session)
     return session
 
-def add_message_to_session(db: Session, session_id: int, role: str, content: str):
-    session = db.query(InterviewSession).filter(InterviewSession.id == session_id).first()
-    if session:
-        # SQLAlchemy JSON mutations tracking issues, so we copy, append, reassign
-        current_msgs = list(session.messages) if session.messages else []
-        current_msgs.append({"role": role, "content": content, "timestamp": str(date.today())})
-        session.messages = current_msgs
+def _next_message_seq(db: Session, session_id: int):
+    # 走 (session_id, seq) 索引，只取最大值，不读取历史消息内容
+    max_seq = db.query(func.max(InterviewMessage.seq)).filter(InterviewMessage.session_id == session_id).scalar()
+    return 0 if max_seq is None else max_seq + 1
+
+def _explode_legacy_messages(db: Session, session: InterviewSession):
+    """把旧版 messages JSON 拆成 interview_messages 行，返回写入条数 (不提交)"""
+    legacy = session.legacy_messages or []
+    for seq, msg in enumerate(legacy):
+        try:
+            created_at = datetime.fromisoformat(str(msg.get("timestamp")))
+        except ValueError:
+            created_at = session.created_at or datetime.utcnow()
+        db.add(InterviewMessage(
+            session_id=session.id,
+            seq=seq,
+            role=msg.get("role", "human"),
+            content=msg.get("content", ""),
+            created_at=created_at
+        ))
+    session.legacy_messages = None
+    return len(legacy)
+
+def add_message_to_session(db: Session, session_id: int, role: str, content: str, max_attempts: int = 5):
+    """
+    追加一条消息，O(1) 写入，不再重写整段对话
+    并发追加同一会话时 seq 可能被别的请求先占用 ((session_id, seq) 唯一索引报错)，重新取号重试
+    """
+    for attempt in range(max_attempts):
+        seq = _next_message_seq(db, session_id)
+        if seq == 0:
+            # 尚未迁移的旧会话: 先把旧 JSON 拆成行，保证顺序连续
+            # 新会话没有旧 JSON，不做拆分，也就不会多出一条 UPDATE
+            session = db.get(InterviewSession, session_id, options=[undefer(InterviewSession.legacy_messages)])
+            if session is None:
+                return None
+            if session.legacy_messages:
+                seq = _explode_legacy_messages(db, session)
+
+        message = InterviewMessage(session_id=session_id, seq=seq, role=role, content=content)
+        db.add(message)
+        try:
+            db.commit()
+            return message
+        except IntegrityError:
+            db.rollback()
+            if attempt == max_attempts - 1:
+                raise
+
+def get_session_messages(db: Session, session_id: int):
+    """按顺序返回会话消息 (list of dict)，兼容旧版 messages 格式"""
+    rows = db.query(InterviewMessage).filter(
+        InterviewMessage.session_id == session_id
+    ).order_by(InterviewMessage.seq).all()
+    if rows:
+        return [m.to_dict() for m in rows]
+    session = db.get(InterviewSession, session_id, options=[undefer(InterviewSession.legacy_messages)])
+    return list(session.legacy_messages or []) if session else []
+
+def migrate_legacy_messages(db: Session, batch_size: int = 100):
+    """
+    一次性迁移: 把所有 InterviewSession.messages JSON 拆到 interview_messages 表
+    可重复执行，已迁移的会话会被跳过
+    """
+    migrated_sessions = 0
+    migrated_messages = 0
+    while True:
+        sessions = db.query(InterviewSession).options(
+            undefer(InterviewSession.legacy_messages)
+        ).filter(
+            InterviewSession.legacy_messages.isnot(None)
+        ).order_by(InterviewSession.id).limit(batch_size).all()
+        if not sessions:
+            break
+        for s in sessions:
+            if _next_message_seq(db, s.id) > 0:
+                # 已经有新表数据 (例如迁移中断后重跑)，只清理旧字段
+                s.legacy_messages = None
+                continue
+            migrated_messages += _explode_legacy_messages(db, s)
+            migrated_sessions += 1
         db.commit()
-        db.refresh(session)
+    return {"sessions": migrated_sessions, "messages": migrated_messages}
+
+def save_session_memory(db: Session, session_id: int, memory_state: dict):
+    """保存对话记忆 (滚动摘要)；已有更新的摘要时不回退 (后台合并与最终报告可能并发写)"""
+    session = db.get(InterviewSession, session_id)
+    if not session:
+        return None
+    current = session.memory or {}
+    if current.get("summarized_count", 0) > memory_state.get("summarized_count", 0):
+        return session
+    session.memory = memory_state
+    db.commit()
     return session
 
+def _coerce_score(score):
+    """85 / 85.5 / "85分" / "85/100" -> 0-100 的整数；无法解析时记 0 分"""
+    if isinstance(score, str):
+        match = re.search(r"-?\d+(\.\d+)?", score)
+        score = match.group(0) if match else None
+    try:
+        return max(0, min(100, int(round(float(score)))))
+    except (TypeError, ValueError):
+        logger.warning("Unparseable interview score: %r", score)
+        return 0
+
 def update_session_feedback(db: Session, session_id: int, score: float, feedback: str):
     session = db.query(InterviewSession).filter(InterviewSession.id == session_id).first()
     if session:
-        session.score = score
+        old_score = session.score
+        # 报告可能来自未经校验的 LLM 输出 (如 "85分")，先转成整数再参与统计
+        new_score = _coerce_score(score)
+        session.score = new_score
         session.feedback = feedback
+
+        finished_delta = 1 if old_score is None else 0
+        score_delta = new_score - (old_score or 0)
+        if _bump_user_stats(db, session.user_id, finished_sessions=finished_delta, score_sum=score_delta):
+            _bump_topic_stats(db, session.user_id, session.topic, session_count=finished_delta, score_sum=score_delta)
+        _replace_session_weaknesses(db, session)
         db.commit()
     return session
 
+# --- Weaknesses ---
+
+def normalize_term(text: str):
+    """全角转半角、忽略大小写和空白，"Redis 持久化" 与 "redis持久化" 视为同一词条"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return re.sub(r"\s+", "", text)
+
+def _parse_weaknesses(session: InterviewSession):
+    try:
+        # 这里的 feedback 是 JSON 字符串
+        report = json.loads(session.feedback)
+    except (TypeError, ValueError) as e:
+        logger.warning("Unparseable feedback for session %s: %s", session.id, e)
+        return []
+    w_list = report.get("weaknesses") if isinstance(report, dict) else None
+    if w_list is None:
+        return []
+    if isinstance(w_list, (str, dict)):
+        # 模型偶尔把单条弱点直接写成字符串，不能按字符拆开
+        w_list = [w_list]
+    return [str(w).strip() for w in w_list if str(w).strip()]
+
+def _replace_session_weaknesses(db: Session, session: InterviewSession):
+    """用报告中的 weaknesses 重写该场面试的弱点行 (不提交)"""
+    db.query(SessionWeakness).filter(SessionWeakness.session_id == session.id).delete(synchronize_session=False)
+    if not session.feedback:
+        return 0
+
+    seen = set()
+    for text in _parse_weaknesses(session):
+        term = normalize_term(text)[:200]
+        if term in seen:
+            continue
+        seen.add(term)
+        db.add(SessionWeakness(
+            user_id=session.user_id,
+            session_id=session.id,
+            topic=session.topic or "未知",
+            term=term,
+            text=text[:500],
+            created_at=session.created_at or datetime.utcnow()
+        ))
+    return len(seen)
+
+def backfill_session_weaknesses(db: Session, batch_size: int = 200):
+    """一次性从历史 feedback 中拆出弱点行 (升级后执行，可重复执行)"""
+    inserted = 0
+    last_id = 0
+    while True:
+        sessions = db.query(InterviewSession).options(
+            undefer(InterviewSession.feedback)
+        ).filter(
+            InterviewSession.id > last_id,
+            InterviewSession.feedback.isnot(None)
+        ).order_by(InterviewSession.id).limit(batch_size).all()
+        if not sessions:
+            break
+        for s in sessions:
+            inserted += _replace_session_weaknesses(db, s)
+        last_id = sessions[-1].id
+        db.commit()
+    return inserted
+
 def get_recent_weaknesses(db: Session, user_id: int, limit: int = 3):
     """
     获取最近 N 场面试中暴露的弱点 (Weaknesses)
     """
-    # 获取最近的有反馈的面试记录
-    sessions = db.query(InterviewSession).filter(
+    # 最近 N 场有反馈的面试 (派生表，走 user_id + created_at 索引)
+    recent = select(InterviewSession.id, InterviewSession.created_at).where(
         InterviewSession.user_id == user_id,
         InterviewSession.feedback.isnot(None)
-    ).order_by(InterviewSession.created_at.desc()).limit(limit).all()
-    
-    weaknesses = []
-    for s in sessions:
-        try:
-            # 这里的 feedback 是 JSON 字符串
-            report = json.loads(s.feedback)
-            # 提取 weaknesses 列表
-            w_list = report.get("weaknesses", [])
-            for w in w_list:
-                # 简单去重
-                val = f"{w} (From: {s.topic})"
-                if val not in weaknesses:
-                    weaknesses.append(val)
-        except:
-            continue
-            
-    return weaknesses
+    ).order_by(InterviewSession.created_at.desc()).limit(limit).subquery()
+
+    rows = db.query(SessionWeakness.text, SessionWeakness.term, SessionWeakness.topic).join(
+        recent, SessionWeakness.session_id == recent.c.id
+    ).order_by(recent.c.created_at.desc(), SessionWeakness.id).all()
+
+    # 按 (词条, 主题) 去重，保持时间顺序
+    weaknesses = {}
+    for text, term, topic in rows:
+        weaknesses.setdefault((term, topic), f"{text} (From: {topic})")
+    return list(weaknesses.values())
+
+def get_frequent_weaknesses(db: Session, user_id: int, days: int = 30, limit: int = 10):
+    """最近 days 天出现次数最多的弱点: [{"weakness", "count", "last_seen"}]"""
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = db.query(
+        SessionWeakness.term,
+        func.max(SessionWeakness.text),
+        func.count(SessionWeakness.id),
+        func.max(SessionWeakness.created_at)
+    ).filter(
+        SessionWeakness.user_id == user_id,
+        SessionWeakness.created_at >= since
+    ).group_by(SessionWeakness.term).order_by(func.count(SessionWeakness.id).desc()).limit(limit).all()
+    return [{"weakness": text, "count": count, "last_seen": last_seen} for _, text, count, last_seen in rows]
+
+def get_weakness_counts_by_topic(db: Session, user_id: int, days: int = None):
+    """各面试主题下暴露的弱点数量: {topic: count}"""
+    query = db.query(SessionWeakness.topic, func.count(SessionWeakness.id)).filter(SessionWeakness.user_id == user_id)
+    if days:
+        query = query.filter(SessionWeakness.created_at >= datetime.utcnow() - timedelta(days=days))
+    return dict(query.group_by(SessionWeakness.topic).all())
 
 def get_all_finished_sessions(db: Session, user_id: int):
-    """获取所有已完成评价的面试"""
-    return db.query(InterviewSession).filter(InterviewSession.user_id == user_id, InterviewSession.score.isnot(None)).all()
+    """获取所有已完成评价的面试 (只加载元数据列，对话记录和反馈按需读取)"""
+    return db.query(InterviewSession).options(
+        load_only(InterviewSession.id, InterviewSession.topic, InterviewSession.score, InterviewSession.created_at)
+    ).filter(InterviewSession.user_id == user_id, InterviewSession.score.isnot(None)).all()
 
-def get_study_stats(db: Session, user_id: int):
-    """计算学习任务完成率"""
-    plans = db.query(StudyPlan).filter(StudyPlan.user_id == user_id).all()
-    total_tasks = 0
-    completed_tasks = 0
-    for p in plans:
-        if p.content:
-            for t in p.content:
-                total_tasks += 1
-                if t.get("status") == "completed":
-                    completed_tasks += 1
-    
-    finished_sessions_count = db.query(InterviewSession).filter(
+def get_session_history_page(db: Session, user_id: int, limit: int = 20, cursor=None):
+    """
+    已完成面试的分页列表 (keyset 分页，按 created_at, id 倒序)
+    :param cursor: 上一页返回的 next_cursor，即 (created_at, id)；None 表示第一页
+    :return: (rows, next_cursor)，rows 只含 id/topic/score/created_at，没有下一页时 next_cursor 为 None
+    """
+    query = db.query(
+        InterviewSession.id, InterviewSession.topic, InterviewSession.score, InterviewSession.created_at
+    ).filter(
         InterviewSession.user_id == user_id,
         InterviewSession.score.isnot(None)
-    ).count()
+    )
+    if cursor:
+        created_at, session_id = cursor
+        query = query.filter(or_(
+            InterviewSession.created_at < created_at,
+            and_(InterviewSession.created_at == created_at, InterviewSession.id < session_id)
+        ))
+
+    # 多取一条判断是否还有下一页
+    rows = query.order_by(InterviewSession.created_at.desc(), InterviewSession.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = (rows[-1].created_at, rows[-1].id) if has_more else None
+    return rows, next_cursor
+
+def get_interview_session(db: Session, session_id: int, with_feedback: bool = False):
+    """
+    读取面试元数据 (topic / score 等)
+    feedback 与旧版 messages 为延迟加载列，只有报告页需要时才传 with_feedback=True 一并查出
+    """
+    if not with_feedback:
+        return db.get(InterviewSession, session_id)
+    # populate_existing: 身份映射中已有 (可能已过期) 的对象时也一次性带出 feedback
+    return db.get(
+        InterviewSession, session_id,
+        options=[undefer(InterviewSession.feedback)], populate_existing=True
+    )
+
+def get_session_detail(db: Session, session_id: int, user_id: int):
+    """读取单场面试 (含反馈)，校验归属"""
+    session = get_interview_session(db, session_id, with_feedback=True)
+    if not session or session.user_id != user_id:
+        return None
+    return session
+
+def get_score_trend(db: Session, user_id: int, limit: int = 100):
+    """最近 limit 场面试得分 (画趋势图用)，按时间正序: [{"date", "score"}]"""
+    rows = db.query(InterviewSession.created_at, InterviewSession.score).filter(
+        InterviewSession.user_id == user_id,
+        InterviewSession.score.isnot(None)
+    ).order_by(InterviewSession.created_at.desc()).limit(limit).all()
+    return [{"date": created_at, "score": score} for created_at, score in reversed(rows)]
+
+# --- Stats Rollup ---
+
+def _insert_ignore(db: Session, model, **values):
+    """
+    插入一行，主键已存在时什么也不做，返回是否插入
+    两个请求同时为新用户写入第一条汇总时，后到的不会因主键冲突回滚调用方的计划 / 反馈写入
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        stmt = sqlite_insert(model).values(**values).on_conflict_do_nothing()
+    elif dialect == "postgresql":
+        stmt = pg_insert(model).values(**values).on_conflict_do_nothing()
+    elif dialect == "mysql":
+        stmt = mysql_insert(model).values(**values).prefix_with("IGNORE")
+    else:
+        try:
+            with db.begin_nested():
+                db.add(model(**values))
+        except IntegrityError:
+            return False
+        return True
+    return db.execute(stmt).rowcount > 0
+
+def _bump_user_stats(db: Session, user_id: int, **deltas):
+    """
+    在调用方的事务内增量更新 user_stats (UPDATE col = col + delta，不读旧值)
+    汇总行不存在时 (新用户/尚未回填) 直接从原始数据重建，重建结果已包含本次改动
+    返回 False 表示走了重建分支，调用方无需再更新其他汇总
+    """
+    db.flush()
+    if db.get(UserStats, user_id) is None:
+        _rebuild_user_stats(db, user_id)
+        return False
+    values = {getattr(UserStats, k): getattr(UserStats, k) + v for k, v in deltas.items() if v}
+    if values:
+        db.query(UserStats).filter(UserStats.user_id == user_id).update(values, synchronize_session=False)
+    return True
+
+def _bump_topic_stats(db: Session, user_id: int, topic: str, session_count: int = 0, score_sum: int = 0):
+    topic = topic or "未知"
+    if _insert_ignore(db, UserTopicStats, user_id=user_id, topic=topic, session_count=session_count, score_sum=score_sum):
+        return
+    if session_count or score_sum:
+        db.query(UserTopicStats).filter(
+            UserTopicStats.user_id == user_id, UserTopicStats.topic == topic
+        ).update({
+            UserTopicStats.session_count: UserTopicStats.session_count + session_count,
+            UserTopicStats.score_sum: UserTopicStats.score_sum + score_sum
+        }, synchronize_session=False)
+
+def _rebuild_user_stats(db: Session, user_id: int):
+    """从原始数据重新计算某个用户的汇总 (不提交)"""
+    scored = InterviewSession.score.isnot(None)
+    session_agg = select(
+        func.count(InterviewSession.id), func.coalesce(func.sum(InterviewSession.score), 0)
+    ).where(InterviewSession.user_id == user_id, scored)
+    finished_sessions, score_sum = db.execute(session_agg).one()
+
+    plan_agg = select(
+        func.count(StudyPlan.id),
+        func.coalesce(func.sum(StudyPlan.task_count), 0),
+        func.coalesce(func.sum(StudyPlan.completed_count), 0)
+    ).where(StudyPlan.user_id == user_id)
+    total_days, total_tasks, completed_tasks = db.execute(plan_agg).one()
+
+    values = {
+        "total_days": int(total_days),
+        "total_tasks": int(total_tasks),
+        "completed_tasks": int(completed_tasks),
+        "finished_sessions": int(finished_sessions),
+        "score_sum": int(score_sum),
+    }
+    # 并发重建同一用户时 (如两个后台任务同时写入新用户的第一条数据) 先插先得，后到的改为覆盖；
+    # 两边看到的原始数据可能相差一次写入，rebuild_all_user_stats 可再校准
+    if not _insert_ignore(db, UserStats, user_id=user_id, **values):
+        db.query(UserStats).filter(UserStats.user_id == user_id).update(values, synchronize_session=False)
+
+    db.query(UserTopicStats).filter(UserTopicStats.user_id == user_id).delete(synchronize_session=False)
+    topic_rows = db.execute(
+        select(
+            func.coalesce(InterviewSession.topic, "未知"),
+            func.count(InterviewSession.id),
+            func.sum(InterviewSession.score)
+        ).where(InterviewSession.user_id == user_id, scored).group_by(func.coalesce(InterviewSession.topic, "未知"))
+    ).all()
+    for topic, count, total in topic_rows:
+        _insert_ignore(db, UserTopicStats, user_id=user_id, topic=topic, session_count=int(count), score_sum=int(total or 0))
+    db.flush()
+
+def rebuild_all_user_stats(db: Session):
+    """回填/校准所有用户的汇总表，返回处理的用户数"""
+    user_ids = {uid for (uid,) in db.query(StudyPlan.user_id).distinct()}
+    user_ids |= {uid for (uid,) in db.query(InterviewSession.user_id).distinct()}
+    for uid in sorted(user_ids):
+        _rebuild_user_stats(db, uid)
+        db.commit()
+    return len(user_ids)
+
+def get_study_stats(db: Session, user_id: int):
+    """
+    计算学习任务完成率
+    读取 user_stats 汇总行 (一次主键查询)，不存在时先从原始数据重建
+    """
+    stats = db.get(UserStats, user_id, populate_existing=True)
+    if stats is None:
+        _rebuild_user_stats(db, user_id)
+        db.commit()
+        stats = db.get(UserStats, user_id, populate_existing=True)
 
     return {
-        "total_days": len(plans),
-        "total_tasks": total_tasks,
-        "completed_tasks": completed_tasks,
-        "completion_rate": (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0,
-        "finished_sessions": finished_sessions_count
+        "total_days": stats.total_days,
+        "total_tasks": stats.total_tasks,
+        "completed_tasks": stats.completed_tasks,
+        "completion_rate": (stats.completed_tasks / stats.total_tasks * 100) if stats.total_tasks > 0 else 0,
+        "finished_sessions": stats.finished_sessions,
+        "average_score": (stats.score_sum / stats.finished_sessions) if stats.finished_sessions > 0 else 0
     }
+
+def get_topic_score_stats(db: Session, user_id: int):
+    """各面试主题的已评分场次与平均分"""
+    rows = db.query(UserTopicStats).filter(UserTopicStats.user_id == user_id).all()
+    return [
+        {"topic": r.topic, "sessions": r.session_count, "average_score": r.score_sum / r.session_count if r.session_count else 0}
+        for r in rows
+    ]
+
+def backfill_plan_task_counts(db: Session, batch_size: int = 500):
+    """一次性回填 StudyPlan.task_count / completed_count (升级后执行)"""
+    updated = 0
+    last_id = 0
+    while True:
+        plans = db.query(StudyPlan).filter(StudyPlan.id > last_id).order_by(StudyPlan.id).limit(batch_size).all()
+        if not plans:
+            break
+        for p in plans:
+            counts = _count_tasks(p.content)
+            if (p.task_count, p.completed_count) != counts:
+                p.task_count, p.completed_count = counts
+                updated += 1
+        last_id = plans[-1].id
+        db.commit()
+    return updated
+
+# --- Knowledge Base ---
+
+def normalize_topic(topic: str):
+    """课题去重 key: 规则同 normalize_term，"K8s 架构" 与 "ｋ８ｓ架构" 视为同一课题"""
+    return normalize_term(topic)[:200]
+
+def get_knowledge_doc(db: Session, doc_id: int):
+    return db.get(KnowledgeDoc, doc_id)
+
+def get_knowledge_doc_by_topic(db: Session, topic: str):
+    return db.query(KnowledgeDoc).filter(KnowledgeDoc.topic_key == normalize_topic(topic)).first()
+
+def list_knowledge_doc_titles(db: Session):
+    """只取目录需要的列，不加载正文"""
+    return db.query(
+        KnowledgeDoc.id, KnowledgeDoc.topic, KnowledgeDoc.created_by, KnowledgeDoc.updated_at
+    ).order_by(KnowledgeDoc.created_at.desc()).all()
+
+def save_knowledge_doc(db: Session, user_id: int, topic: str, content: str, overwrite: bool = False):
+    """
+    保存研报；同一课题已存在时返回已有记录 (overwrite=True 时覆盖正文)
+    并发写同一课题时依赖 topic_key 唯一索引兜底
+    """
+    doc = get_knowledge_doc_by_topic(db, topic)
+    if doc:
+        if overwrite:
+            doc.content = content
+            db.commit()
+            db.refresh(doc)
+        return doc
+
+    # topic 与 topic_key 同为 String(200)，超长课题两者都截断，否则 MySQL 严格模式下插入报错
+    doc = KnowledgeDoc(topic=topic[:200], topic_key=normalize_topic(topic), content=content, created_by=user_id)
+    db.add(doc)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return get_knowledge_doc_by_topic(db, topic)
+    db.refresh(doc)
+    return doc
+
+def delete_knowledge_doc(db: Session, doc_id: int, user_id: int):
+    """只有创建者可以删除，返回是否删除成功"""
+    doc = db.get(KnowledgeDoc, doc_id)
+    if not doc or doc.created_by != user_id:
+        return False
+    db.delete(doc)
+    db.commit()
+    return True
+
+# --- Background Jobs ---
+
+JOB_ACTIVE_STATUSES = ("pending", "running")
+
+def get_job(db: Session, job_id: int):
+    return db.get(Job, job_id)
+
+def get_active_job(db: Session, dedupe_key: str):
+    """同一逻辑请求当前进行中的任务 (pending / running)，没有则返回 None"""
+    return db.query(Job).filter(Job.active_key == dedupe_key).first()
+
+def get_latest_job(db: Session, dedupe_key: str):
+    """同一逻辑请求最近的一次任务 (含已结束的)，页面刷新后据此恢复轮询或读取结果"""
+    return db.query(Job).filter(Job.dedupe_key == dedupe_key).order_by(Job.id.desc()).first()
+
+def enqueue_job(db: Session, kind: str, dedupe_key: str, payload: dict, user_id: int = None):
+    """
+    入队；同一 dedupe_key 已有进行中的任务时直接返回该任务，不会重复生成
+    并发入队依赖 active_key 唯一索引兜底
+    """
+    existing = get_active_job(db, dedupe_key)
+    if existing:
+        return existing
+
+    job = Job(
+        kind=kind, user_id=user_id, dedupe_key=dedupe_key, active_key=dedupe_key,
+        status="pending", payload=payload
+    )
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return get_active_job(db, dedupe_key)
+    db.refresh(job)
+    return job
+
+def claim_next_job(db: Session, worker_id: str = None):
+    """
+    领取最早的待执行任务，返回 Job 或 None
+    用带条件的 UPDATE 抢占，多个工作线程 / 进程同时领取也只有一个成功
+    """
+    while True:
+        job_id = db.query(Job.id).filter(Job.status == "pending").order_by(Job.id).limit(1).scalar()
+        if job_id is None:
+            return None
+        now = datetime.utcnow()
+        claimed = db.query(Job).filter(Job.id == job_id, Job.status == "pending").update({
+            Job.status: "running",
+            Job.worker_id: worker_id,
+            Job.started_at: now,
+            Job.heartbeat_at: now,
+            Job.attempts: Job.attempts + 1,
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return db.get(Job, job_id, populate_existing=True)
+
+def finish_job(db: Session, job_id: int, result=None, error: str = None, worker_id: str = None):
+    """
+    记录任务结果；传入 worker_id 时只在任务仍归该执行者所有时写入
+    (心跳中断期间任务可能已被收回并由别的进程重新领取)
+    """
+    job = db.get(Job, job_id)
+    if not job:
+        return None
+    if worker_id is not None and (job.status != "running" or job.worker_id != worker_id):
+        return None
+    job.status = "failed" if error else "done"
+    job.result = result
+    job.error = error
+    job.active_key = None
+    job.finished_at = datetime.utcnow()
+    db.commit()
+    return job
+
+def heartbeat_jobs(db: Session, worker_id: str):
+    """刷新该执行者名下所有 running 任务的心跳"""
+    count = db.query(Job).filter(Job.status == "running", Job.worker_id == worker_id).update(
+        {Job.heartbeat_at: datetime.utcnow()}, synchronize_session=False
+    )
+    db.commit()
+    return count
+
+def requeue_stale_jobs(db: Session, stale_after: float):
+    """
+    所属进程已退出 (心跳超过 stale_after 秒未更新) 的 running 任务重新排队
+    其他存活进程正在执行的任务心跳是新的，不会被收回
+    """
+    deadline = datetime.utcnow() - timedelta(seconds=stale_after)
+    count = db.query(Job).filter(
+        Job.status == "running",
+        or_(Job.heartbeat_at.is_(None), Job.heartbeat_at < deadline)
+    ).update(
+        {Job.status: "pending", Job.worker_id: None, Job.started_at: None, Job.heartbeat_at: None},
+        synchronize_session=False
+    )
+    db.commit()
+    return count
+
+# --- LLM Metrics ---
+
+def get_llm_call_metrics(db: Session, since: datetime):
+    """统计用的原始记录 (只取需要的列)，分位数在 core.metrics.summarize_metrics 中计算"""
+    return db.query(
+        LLMCallMetric.agent, LLMCallMetric.method, LLMCallMetric.prompt_tokens, LLMCallMetric.completion_tokens,
+        LLMCallMetric.cached_tokens, LLMCallMetric.latency_ms, LLMCallMetric.ttft_ms,
+        LLMCallMetric.cache_hit, LLMCallMetric.success
+    ).filter(LLMCallMetric.created_at >= since).all()
+
+def get_turn_metrics(db: Session, since: datetime, agent: str = "interviewer", method: str = "evaluate"):
+    """带轮次的成功调用 (排除响应缓存命中)，按轮次的汇总在 core.metrics.summarize_turns 中计算"""
+    return db.query(
+        LLMCallMetric.turn, LLMCallMetric.prompt_tokens, LLMCallMetric.completion_tokens,
+        LLMCallMetric.cached_tokens, LLMCallMetric.latency_ms, LLMCallMetric.ttft_ms
+    ).filter(
+        LLMCallMetric.agent == agent,
+        LLMCallMetric.method == method,
+        LLMCallMetric.created_at >= since,
+        LLMCallMetric.turn.isnot(None),
+        LLMCallMetric.success.is_(True),
+        LLMCallMetric.cache_hit.is_(False)
+    ).all()
+
+def get_recent_llm_errors(db: Session, limit: int = 20):
+    return db.query(LLMCallMetric).filter(
+        LLMCallMetric.success.is_(False)
+    ).order_by(LLMCallMetric.created_at.desc()).limit(limit).all()
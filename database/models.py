@@ -1,8 +1,12 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, JSON, DateTime, Date, ForeignKey
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import create_engine, Column, Integer, String, Text, JSON, DateTime, Date, ForeignKey, Index, Float, Boolean
+from sqlalchemy.orm import declarative_base, relationship, deferred
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from contextlib import contextmanager
 from datetime import datetime, date
-from core.config import DATABASE_URL
+import threading
+import time
+from core.config import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT
 
 Base = declarative_base()
 
@@ -18,29 +22,192 @@ class User(Base):
 
 class StudyPlan(Base):
     __tablename__ = 'study_plans'
+    __table_args__ = (
+        # 联合唯一索引: 同一个用户每天只能有一个计划 (get_today_plan 走这个索引)
+        Index("ux_study_plans_user_date", "user_id", "date", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, default=1) # 关联用户
-    # 联合唯一索引: 同一个用户每天只能有一个计划
     date = Column(Date, default=lambda: date.today()) 
     
     content = Column(JSON) # 存储任务列表 [{"topic":.., "status":..}]
+    # 冗余计数，写入时由 crud 维护，统计时直接 SUM，无需解析 content
+    task_count = Column(Integer, nullable=False, default=0, server_default="0")
+    completed_count = Column(Integer, nullable=False, default=0, server_default="0")
     encouragement = Column(String(500)) # MySQL String 需要长度，或者用 Text
     status = Column(String(50), default="in_progress") # in_progress, completed
     reflection = Column(Text, nullable=True)
 
 class InterviewSession(Base):
     __tablename__ = 'interview_sessions'
+    __table_args__ = (
+        # 最近 N 场面试 / 历史列表: WHERE user_id = ? ORDER BY created_at DESC
+        Index("ix_interview_sessions_user_created", "user_id", "created_at"),
+        # 已评分面试统计: WHERE user_id = ? AND score IS NOT NULL
+        Index("ix_interview_sessions_user_score", "user_id", "score"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, default=1) # 关联用户
     
     topic = Column(String(100))
-    messages = Column(JSON)
-    feedback = Column(Text, nullable=True)
+    # 大字段延迟加载: Streamlit 每次交互都会重跑脚本，列表/状态判断只需要 topic、score
+    # 需要时用 undefer() 显式加载，或首次访问属性时再单独查询
+    # 旧版整段 JSON 对话记录，新消息写入 interview_messages 表，这里只保留给迁移用
+    legacy_messages = deferred(Column("messages", JSON(none_as_null=True), nullable=True))
+    feedback = deferred(Column(Text, nullable=True))
+    # 对话记忆 {"summary": 滚动摘要, "summarized_count": 已摘要的消息数}，见 core.memory
+    memory = Column(JSON(none_as_null=True), nullable=True)
     score = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    message_rows = relationship(
+        "InterviewMessage",
+        order_by="InterviewMessage.seq",
+        cascade="all, delete-orphan",
+    )
+
+    @property
+    def messages(self):
+        """兼容旧接口: 返回 [{"role":.., "content":.., "timestamp":..}] 列表"""
+        if self.message_rows:
+            return [m.to_dict() for m in self.message_rows]
+        return list(self.legacy_messages or [])
+
+class UserStats(Base):
+    """按用户汇总的统计 (由 crud 在写入计划/面试反馈时同事务增量维护)，仪表盘读取只需一次主键查询"""
+    __tablename__ = 'user_stats'
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_days = Column(Integer, nullable=False, default=0)
+    total_tasks = Column(Integer, nullable=False, default=0)
+    completed_tasks = Column(Integer, nullable=False, default=0)
+    finished_sessions = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class UserTopicStats(Base):
+    """按 (用户, 面试主题) 汇总的已评分场次与总分，用于计算各主题平均分"""
+    __tablename__ = 'user_topic_stats'
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    topic = Column(String(100), primary_key=True)
+    session_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Integer, nullable=False, default=0)
+
+class SessionWeakness(Base):
+    """面试报告中的弱点，写入反馈时拆成结构化行，按用户/主题/规范化词条查询"""
+    __tablename__ = 'session_weaknesses'
+    __table_args__ = (
+        Index("ix_session_weaknesses_user_created", "user_id", "created_at"),
+        Index("ix_session_weaknesses_user_term", "user_id", "term"),
+        Index("ix_session_weaknesses_user_topic", "user_id", "topic"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    session_id = Column(Integer, ForeignKey("interview_sessions.id"), nullable=False, index=True)
+    topic = Column(String(100), nullable=False)
+    term = Column(String(200), nullable=False) # 规范化后的弱点，用于去重和计数
+    text = Column(String(500), nullable=False) # 报告中的原文
+    created_at = Column(DateTime, default=datetime.utcnow) # 取所属面试的时间
+
+class InterviewMessage(Base):
+    """面试对话的单条消息 (追加写入，避免每轮重写整段 JSON)"""
+    __tablename__ = 'interview_messages'
+    __table_args__ = (
+        Index("ix_interview_messages_session_seq", "session_id", "seq", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(Integer, ForeignKey("interview_sessions.id"), nullable=False)
+    seq = Column(Integer, nullable=False) # 会话内的消息序号，从 0 开始
+    role = Column(String(20), nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {"role": self.role, "content": self.content, "timestamp": str(self.created_at.date())}
+
+class KnowledgeDoc(Base):
+    """知识库研报，按规范化后的课题去重，所有用户共享"""
+    __tablename__ = 'knowledge_docs'
+
+    id = Column(Integer, primary_key=True, index=True)
+    topic = Column(String(200), nullable=False) # 展示用原始课题
+    topic_key = Column(String(200), unique=True, index=True, nullable=False) # 去重用，见 crud.normalize_topic
+    content = Column(Text(16777215), nullable=False)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class LLMCacheEntry(Base):
+    """LLM 响应缓存，key 为 (模型参数 + 渲染后的 prompt) 的哈希"""
+    __tablename__ = 'llm_cache'
+
+    key = Column(String(64), primary_key=True)
+    response = Column(Text(16777215), nullable=False) # 长文研报可能超过 64KB
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, index=True) # LRU 淘汰依据
+    hit_count = Column(Integer, default=0)
+
+class LLMCallMetric(Base):
+    """每次 LLM 调用的 token / 延迟 / 错误记录，由 core.metrics 的回调写入"""
+    __tablename__ = 'llm_call_metrics'
+    __table_args__ = (
+        # 按功能统计: WHERE created_at >= ? GROUP BY agent, method
+        Index("ix_llm_call_metrics_created", "created_at"),
+        Index("ix_llm_call_metrics_agent_method", "agent", "method", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    agent = Column(String(50), nullable=False, default="unknown") # interviewer / supervisor / scout ...
+    method = Column(String(100), nullable=False, default="unknown") # evaluate / final_report ...
+    model = Column(String(100))
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    # 命中服务端前缀缓存 (KV cache) 的输入 tokens，计入 prompt_tokens，按缓存单价计费
+    cached_tokens = Column(Integer, nullable=False, default=0, server_default="0")
+    turn = Column(Integer, nullable=True) # 面试第几轮 (仅 interviewer.evaluate)，用于观察前缀缓存随轮数的收益
+    latency_ms = Column(Float, nullable=False, default=0)
+    ttft_ms = Column(Float, nullable=True) # 首 token 延迟，仅流式调用有值
+    streamed = Column(Boolean, nullable=False, default=False)
+    cache_hit = Column(Boolean, nullable=False, default=False) # 命中响应缓存，不产生费用
+    success = Column(Boolean, nullable=False, default=True)
+    error = Column(String(500), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Job(Base):
+    """
+    后台任务队列 (最终报告 / 每日计划 / 路线图 / 研报)
+    页面只负责入队和轮询状态，生成由 core.jobs 的工作线程完成，用户离开页面也不会丢失
+    """
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # 工作线程取任务: WHERE status = 'pending' ORDER BY id
+        Index("ix_jobs_status_id", "status", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False) # final_report / daily_plan / roadmap / research
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    dedupe_key = Column(String(200), nullable=False, index=True) # 逻辑请求标识，如 final_report:<session_id>
+    # 仅在 pending / running 时等于 dedupe_key，结束后置空
+    # 唯一索引允许多个 NULL，从而保证同一请求同时最多只有一个进行中的任务
+    active_key = Column(String(200), nullable=True, unique=True)
+    status = Column(String(20), nullable=False, default="pending") # pending / running / done / failed
+    payload = Column(JSON)
+    result = Column(JSON(none_as_null=True), nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    # 执行者标识 (主机:进程:随机串) 与心跳，只有心跳过期的 running 任务才会被其他进程收回
+    worker_id = Column(String(100), nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
 # --- Engine Setup ---
 connect_args = {}
 
@@ -55,14 +222,97 @@ elif "mysql" in DATABASE_URL:
     ssl_context.verify_mode = ssl.CERT_NONE
     connect_args = {"ssl": ssl_context}
 
+class MonitoredQueuePool(QueuePool):
+    """记录每次取连接的等待时间，用于观察并发用户下连接池是否成为瓶颈"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = {"checkouts": 0, "timeouts": 0, "total_wait": 0.0, "max_wait": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self.wait_stats["timeouts"] += 1
+            raise
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self.wait_stats["checkouts"] += 1
+            self.wait_stats["total_wait"] += waited
+            self.wait_stats["max_wait"] = max(self.wait_stats["max_wait"], waited)
+        return conn
+
+    def recreate(self):
+        # pool_pre_ping / dispose 会重建连接池，沿用同一份统计
+        new_pool = super().recreate()
+        new_pool.wait_stats = self.wait_stats
+        new_pool._stats_lock = self._stats_lock
+        return new_pool
+
+pool_args = {}
+if "sqlite" not in DATABASE_URL:
+    pool_args = {
+        "poolclass": MonitoredQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
 engine = create_engine(
     DATABASE_URL, 
     connect_args=connect_args,
     pool_pre_ping=True, # 自动心跳检查，防止云数据库断连
-    pool_recycle=3600
+    pool_recycle=3600,
+    **pool_args
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 短事务专用: 提交后对象不过期，离开 with 块后仍可读取已加载的属性
+ScopedSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
+
+@contextmanager
+def session_scope():
+    """
+    请求级数据库会话: 正常退出提交，异常回滚，始终归还连接
+    用法:
+        with session_scope() as db:
+            plan = crud.get_today_plan(db, user_id)
+    注意: with 块内只做数据库操作，不要在其中调用 LLM，避免长时间占用连接池
+    延迟加载的列 / 关系需在块内访问，离开后对象已与会话分离
+    """
+    db = ScopedSessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def get_pool_stats():
+    """连接池状态: 容量、已借出数量，以及 (TiDB/MySQL 下) 取连接的等待时间"""
+    pool = engine.pool
+    stats = {"status": pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        })
+    wait_stats = getattr(pool, "wait_stats", None)
+    if wait_stats:
+        checkouts = wait_stats["checkouts"]
+        stats.update({
+            "checkouts": checkouts,
+            "timeouts": wait_stats["timeouts"],
+            "avg_wait_ms": wait_stats["total_wait"] / checkouts * 1000 if checkouts else 0,
+            "max_wait_ms": wait_stats["max_wait"] * 1000,
+        })
+    return stats
 
 def init_db():
     Base.metadata.create_all(bind=engine)
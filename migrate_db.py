@@ -0,0 +1,133 @@
+import sys
+import os
+
+# Init path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+from database.models import init_db, SessionLocal, Base, engine
+from database import crud
+
+def migrate_messages():
+    print("Exploding InterviewSession.messages JSON into interview_messages...")
+    db = SessionLocal()
+    try:
+        result = crud.migrate_legacy_messages(db)
+        print(f"✅ Migrated {result['messages']} messages from {result['sessions']} sessions.")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error: {e}")
+    finally:
+        db.close()
+
+def _ddl_default(column):
+    """ALTER TABLE 用的默认值: server_default，或数值型的 Python 端标量默认值 (如旧版单用户数据的 user_id=1)"""
+    if column.server_default is not None:
+        return column.server_default.arg
+    default = column.default
+    if default is not None and default.is_scalar and isinstance(default.arg, (int, float)) and not isinstance(default.arg, bool):
+        return str(default.arg)
+    return None
+
+def add_missing_columns():
+    """create_all 不会修改已有表，新增的列用 ALTER TABLE 补上 (SQLite / TiDB 通用写法)"""
+    print("Adding missing columns...")
+    try:
+        inspector = inspect(engine)
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue # 新表由 init_db 创建
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                default = _ddl_default(column)
+                if not column.nullable and default is None:
+                    # 已有数据行无法填值 (SQLite 直接报错)，需人工补数据后再加列
+                    print(f"⚠️ Skipped {table.name}.{column.name}: NOT NULL column without a default")
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                if default is not None:
+                    ddl += f" DEFAULT {default}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(text(ddl))
+                    print(f"  + {table.name}.{column.name}")
+                except Exception as e:
+                    print(f"❌ Failed to add {table.name}.{column.name}: {e}")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+
+def backfill_counters():
+    print("Backfilling StudyPlan task counters...")
+    db = SessionLocal()
+    try:
+        updated = crud.backfill_plan_task_counts(db)
+        print(f"✅ Updated {updated} plans.")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error: {e}")
+    finally:
+        db.close()
+
+def backfill_weaknesses():
+    print("Extracting weaknesses from historical feedback...")
+    db = SessionLocal()
+    try:
+        count = crud.backfill_session_weaknesses(db)
+        print(f"✅ Inserted {count} weakness rows.")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error: {e}")
+    finally:
+        db.close()
+
+def rebuild_stats():
+    print("Rebuilding user_stats rollup...")
+    db = SessionLocal()
+    try:
+        count = crud.rebuild_all_user_stats(db)
+        print(f"✅ Rebuilt stats for {count} users.")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error: {e}")
+    finally:
+        db.close()
+
+def create_missing_indexes():
+    """create_all 只会给新表建索引，已有表上后加的索引需要单独补建"""
+    print("Creating missing indexes...")
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                index.create(bind=engine)
+                print(f"  + {table.name}.{index.name}")
+            except Exception as e:
+                # 典型原因: 唯一索引遇到历史重复数据 (例如同一天两条 StudyPlan)，需人工清理后重跑
+                print(f"❌ Failed to create {table.name}.{index.name}: {e}")
+
+def migrate_database():
+    print("Creating missing tables...")
+    init_db()
+    add_missing_columns()
+    create_missing_indexes()
+    migrate_messages()
+    backfill_counters()
+    backfill_weaknesses()
+    rebuild_stats()
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    # python migrate_db.py              完整迁移
+    # python migrate_db.py rebuild-stats 仅重建汇总表
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild-stats":
+        rebuild_stats()
+    else:
+        migrate_database()
@@ -0,0 +1,26 @@
+"""
+测试公共配置
+- DATABASE_URL 在导入 database.models 时读取，必须先于任何业务模块导入设置为临时 SQLite 文件
+- db fixture: 每个测试重建全部表，返回一个 Session
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+
+from database.models import Base, engine, init_db, SessionLocal
+
+@pytest.fixture
+def db():
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,42 @@
+"""InterviewerAgent 最终报告: 兜底与异步摘要合并"""
+import asyncio
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from core.agents.interviewer import InterviewerAgent
+from core.memory import ConversationMemory
+
+REPORT = '{"total_score": 80, "summary": "扎实", "weaknesses": ["索引"]}'
+HISTORY = [{"role": "ai" if i % 2 == 0 else "human", "content": f"消息 {i}"} for i in range(6)]
+
+class FailingChatModel(FakeListChatModel):
+    def _call(self, *args, **kwargs):
+        raise RuntimeError("boom")
+
+    async def _acall(self, *args, **kwargs):
+        raise RuntimeError("boom")
+
+class LoopGuardChatModel(FakeListChatModel):
+    """在事件循环线程上被同步调用时报错 (异步调用会被放进线程池执行，不受影响)"""
+    def _call(self, *args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return super()._call(*args, **kwargs)
+        raise AssertionError("blocking LLM call on the event loop")
+
+def test_any_llm_error_returns_fallback_report():
+    report = InterviewerAgent(FailingChatModel(responses=["unused"])).generate_final_report(HISTORY)
+    assert report["total_score"] == 0
+    assert report["error"] == "boom"
+
+def test_async_llm_error_returns_fallback_report():
+    report = asyncio.run(InterviewerAgent(FailingChatModel(responses=["unused"])).generate_final_report_async(HISTORY))
+    assert report["error"] == "boom"
+
+def test_async_report_folds_memory_without_sync_calls():
+    llm = LoopGuardChatModel(responses=["早前摘要", REPORT])
+    memory = ConversationMemory(llm, window=2, summarize_every=1)
+
+    report = asyncio.run(InterviewerAgent(llm).generate_final_report_async(HISTORY, memory=memory))
+    assert report["total_score"] == 80
+    assert (memory.summary, memory.summarized_count) == ("早前摘要", 4)
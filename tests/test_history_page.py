@@ -0,0 +1,47 @@
+"""get_session_history_page: keyset 分页按 (created_at, id) 倒序，翻页不重不漏"""
+from datetime import datetime, timedelta
+from database import crud
+from database.models import InterviewSession
+
+def add_sessions(db, user_id, count, base=datetime(2024, 1, 1)):
+    sessions = []
+    for i in range(count):
+        # 每两场共用一个 created_at，验证时间相同时按 id 继续排序
+        sessions.append(InterviewSession(user_id=user_id, topic=f"t{i}", score=60 + i, created_at=base + timedelta(hours=i // 2)))
+    db.add_all(sessions)
+    db.commit()
+    return sessions
+
+def expected_order(sessions):
+    return [s.id for s in sorted(sessions, key=lambda s: (s.created_at, s.id), reverse=True)]
+
+def test_pages_cover_all_finished_sessions_in_order(db):
+    sessions = add_sessions(db, 1, 7)
+    db.add(InterviewSession(user_id=1, topic="unfinished", score=None, created_at=datetime(2025, 1, 1)))
+    add_sessions(db, 2, 3) # 其他用户的面试不出现
+    db.commit()
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = crud.get_session_history_page(db, 1, limit=3, cursor=cursor)
+        seen += [r.id for r in rows]
+        pages += 1
+        if cursor is None:
+            break
+    assert seen == expected_order(sessions)
+    assert pages == 3
+
+def test_exact_multiple_has_no_empty_last_page(db):
+    add_sessions(db, 1, 4)
+    rows, cursor = crud.get_session_history_page(db, 1, limit=2)
+    rows, cursor = crud.get_session_history_page(db, 1, limit=2, cursor=cursor)
+    assert len(rows) == 2 and cursor is None
+
+def test_rows_are_lightweight(db):
+    add_sessions(db, 1, 1)
+    rows, cursor = crud.get_session_history_page(db, 1)
+    assert cursor is None
+    assert set(rows[0]._fields) == {"id", "topic", "score", "created_at"}
+
+def test_empty_history(db):
+    assert crud.get_session_history_page(db, 1) == ([], None)
@@ -0,0 +1,47 @@
+"""InterviewerAgent 预取下一题: [NEXT_QUESTION] 标记替换 (假 LLM，逐字符分块返回)"""
+import concurrent.futures
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from core.agents.interviewer import InterviewerAgent, NEXT_QUESTION_MARKER, _splice_next_question
+
+CONTEXT = {"mode": "专项练习", "topic": "MySQL", "jd": "交易系统"}
+HISTORY = [
+    {"role": "ai", "content": "请解释 MVCC。"},
+    {"role": "human", "content": "每行有 trx_id 和 roll_pointer。"},
+]
+PREPARED = {"question": "B+ 树为什么适合索引？", "text": "**下一题**: B+ 树为什么适合索引？"}
+
+def make_prefetched_agent(response, session_id=42):
+    agent = InterviewerAgent(FakeListChatModel(responses=[response]))
+    future = concurrent.futures.Future()
+    future.set_result(PREPARED)
+    # 预取发生在用户回答之前，消息数比当前少一条
+    agent._prefetched[session_id] = (len(HISTORY) - 1, future)
+    return agent
+
+def test_splice_marker_split_across_chunks():
+    chunks = ["点评", "[NE", "XT_QUE", "STION]", "模型多写的题目"]
+    assert "".join(_splice_next_question(chunks, "下一题")) == "点评\n\n下一题"
+
+def test_splice_strips_whitespace_before_marker():
+    chunks = ["点评 ", "\n", "\n[NEXT_QUESTION]"]
+    assert "".join(_splice_next_question(chunks, "下一题")) == "点评\n\n下一题"
+
+def test_splice_passthrough_without_marker():
+    chunks = ["追问: ", "[N", "ot a marker]", "\n"]
+    assert "".join(_splice_next_question(chunks, "下一题")) == "追问: [Not a marker]\n"
+
+def test_stream_uses_prefetched_question():
+    agent = make_prefetched_agent(f"点评: 回答正确。\n{NEXT_QUESTION_MARKER}\n我自己出的题")
+    reply = "".join(agent.conduct_interview_stream(HISTORY, CONTEXT, session_id=42))
+    assert reply == "点评: 回答正确。\n\n**下一题**: B+ 树为什么适合索引？"
+    assert 42 not in agent._prefetched
+
+def test_stream_and_sync_splice_identically():
+    response = f"点评: 回答正确。\n\n{NEXT_QUESTION_MARKER}\n我自己出的题"
+    streamed = "".join(make_prefetched_agent(response).conduct_interview_stream(HISTORY, CONTEXT, session_id=42))
+    assert streamed == make_prefetched_agent(response).conduct_interview(HISTORY, CONTEXT, session_id=42)
@@ -0,0 +1,41 @@
+"""InterviewerAgent 流式输出 (假 LLM，逐字符分块返回)"""
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from core.agents.interviewer import InterviewerAgent
+
+CONTEXT = {"mode": "专项练习", "topic": "MySQL", "jd": "交易系统 {braces}"}
+HISTORY = [
+    {"role": "ai", "content": "请解释 MVCC。"},
+    {"role": "human", "content": '每行有 trx_id，例如 {"trx_id": 1}'},
+]
+
+class FailingChatModel(FakeListChatModel):
+    def _call(self, *args, **kwargs):
+        raise RuntimeError("boom")
+
+    def _stream(self, *args, **kwargs):
+        raise RuntimeError("boom")
+        yield
+
+def make_agent(*responses):
+    return InterviewerAgent(FakeListChatModel(responses=list(responses)))
+
+def test_stream_yields_chunks_in_order():
+    agent = make_agent("[反馈与点评] 不错。\n[下一个问题] 幻读怎么解决？")
+    chunks = list(agent.conduct_interview_stream(HISTORY, CONTEXT))
+    assert len(chunks) > 1
+    assert "".join(chunks) == "[反馈与点评] 不错。\n[下一个问题] 幻读怎么解决？"
+
+def test_stream_opening_without_history():
+    chunks = list(make_agent("unused").conduct_interview_stream([], CONTEXT))
+    assert len(chunks) == 1
+    assert "MySQL" in chunks[0]
+
+def test_stream_error_is_yielded_as_last_chunk():
+    agent = InterviewerAgent(FailingChatModel(responses=["unused"]))
+    chunks = list(agent.conduct_interview_stream(HISTORY, CONTEXT))
+    assert chunks[-1].startswith("（系统错误：")
@@ -0,0 +1,53 @@
+"""后台任务队列 (crud 层): 入队去重、抢占领取、心跳过期收回与归属校验"""
+from datetime import datetime, timedelta
+from database import crud
+from database.models import Job
+
+def test_enqueue_dedupes_active_jobs(db):
+    first = crud.enqueue_job(db, "final_report", "final_report:1", {"session_id": 1})
+    again = crud.enqueue_job(db, "final_report", "final_report:1", {"session_id": 1})
+    other = crud.enqueue_job(db, "final_report", "final_report:2", {"session_id": 2})
+    assert again.id == first.id and other.id != first.id
+
+    # 结束后同一 key 可以重新入队，latest 指向新任务
+    crud.finish_job(db, first.id, result={"ok": True})
+    retry = crud.enqueue_job(db, "final_report", "final_report:1", {"session_id": 1})
+    assert retry.id != first.id
+    assert crud.get_latest_job(db, "final_report:1").id == retry.id
+
+def test_claim_takes_oldest_pending_once(db):
+    a = crud.enqueue_job(db, "roadmap", "roadmap:1", {})
+    b = crud.enqueue_job(db, "roadmap", "roadmap:2", {})
+
+    claimed = crud.claim_next_job(db, "w1")
+    assert (claimed.id, claimed.status, claimed.worker_id, claimed.attempts) == (a.id, "running", "w1", 1)
+    assert crud.claim_next_job(db, "w2").id == b.id
+    assert crud.claim_next_job(db, "w3") is None
+
+def test_stale_running_job_is_reclaimed(db):
+    job = crud.enqueue_job(db, "research", "research:redis", {})
+    crud.claim_next_job(db, "dead")
+    db.query(Job).filter(Job.id == job.id).update({Job.heartbeat_at: datetime.utcnow() - timedelta(minutes=10)})
+    db.commit()
+
+    assert crud.requeue_stale_jobs(db, stale_after=60) == 1
+    reclaimed = crud.claim_next_job(db, "alive")
+    assert (reclaimed.id, reclaimed.worker_id, reclaimed.attempts) == (job.id, "alive", 2)
+
+    # 原执行者晚到的结果不能覆盖新执行者
+    assert crud.finish_job(db, job.id, result={"from": "dead"}, worker_id="dead") is None
+    done = crud.finish_job(db, job.id, result={"from": "alive"}, worker_id="alive")
+    assert (done.status, done.result, done.active_key) == ("done", {"from": "alive"}, None)
+
+def test_fresh_heartbeat_is_not_reclaimed(db):
+    crud.enqueue_job(db, "research", "research:mysql", {})
+    crud.claim_next_job(db, "w1")
+    assert crud.heartbeat_jobs(db, "w1") == 1
+    assert crud.requeue_stale_jobs(db, stale_after=60) == 0
+    assert crud.claim_next_job(db, "w2") is None
+
+def test_failed_job_records_error(db):
+    job = crud.enqueue_job(db, "daily_plan", "daily_plan:1:2024-01-01", {})
+    failed = crud.finish_job(db, job.id, error="boom")
+    assert (failed.status, failed.error) == ("failed", "boom")
+    assert crud.get_active_job(db, "daily_plan:1:2024-01-01") is None
@@ -0,0 +1,70 @@
+"""LLMResponseCache: 命中 / 未命中 / 按模型参数区分 key / 过期与 LRU 淘汰"""
+from datetime import datetime, timedelta
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.outputs import Generation
+from core.llm import LLMResponseCache, bypass_llm_cache
+from database.models import SessionLocal, LLMCacheEntry
+
+LLM_A = "model=a,temperature=0.7"
+LLM_B = "model=b,temperature=0.7"
+
+def texts(generations):
+    return [g.text for g in generations]
+
+def test_hit_and_miss(db):
+    cache = LLMResponseCache(SessionLocal)
+    assert cache.lookup("prompt", LLM_A) is None
+    cache.update("prompt", LLM_A, [Generation(text="answer")])
+
+    hit = cache.lookup("prompt", LLM_A)
+    assert texts(hit) == ["answer"]
+    assert hit[0].generation_info["cache_hit"] is True
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+def test_key_separates_model_params_and_prompt(db):
+    cache = LLMResponseCache(SessionLocal)
+    cache.update("prompt", LLM_A, [Generation(text="from a")])
+
+    assert cache.lookup("prompt", LLM_B) is None
+    assert cache.lookup("prompt", "model=a,temperature=0") is None
+    assert cache.lookup("other prompt", LLM_A) is None
+    assert texts(cache.lookup("prompt", LLM_A)) == ["from a"]
+
+def test_bypass_skips_lookup(db):
+    cache = LLMResponseCache(SessionLocal)
+    cache.update("prompt", LLM_A, [Generation(text="answer")])
+    with bypass_llm_cache():
+        assert cache.lookup("prompt", LLM_A) is None
+    assert cache.misses == 0
+
+def test_expired_entry_is_a_miss(db):
+    cache = LLMResponseCache(SessionLocal, ttl_seconds=60)
+    cache.update("prompt", LLM_A, [Generation(text="old")])
+    db.query(LLMCacheEntry).update({"created_at": datetime.utcnow() - timedelta(seconds=120)})
+    db.commit()
+
+    assert cache.lookup("prompt", LLM_A) is None
+    assert cache.stats()["entries"] == 0
+
+def test_evicts_least_recently_used(db):
+    cache = LLMResponseCache(SessionLocal, max_entries=2)
+    cache.update("p1", LLM_A, [Generation(text="1")])
+    cache.update("p2", LLM_A, [Generation(text="2")])
+    # 访问 p1 后 p2 成为最久未用的条目
+    db.query(LLMCacheEntry).update({"last_accessed_at": datetime.utcnow() - timedelta(minutes=5)})
+    db.commit()
+    assert cache.lookup("p1", LLM_A)
+    cache.update("p3", LLM_A, [Generation(text="3")])
+
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup("p2", LLM_A) is None
+    assert texts(cache.lookup("p1", LLM_A)) == ["1"]
+    assert texts(cache.lookup("p3", LLM_A)) == ["3"]
+
+def test_chat_model_reuses_cached_response(db):
+    cache = LLMResponseCache(SessionLocal)
+    llm = FakeListChatModel(responses=["first", "second"], cache=cache)
+    assert llm.invoke("hi").content == "first"
+    assert llm.invoke("hi").content == "first"
+    assert cache.hits == 1
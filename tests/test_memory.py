@@ -0,0 +1,55 @@
+"""ConversationMemory: 滚动摘要 + 最近窗口，送进 prompt 的消息数有上限"""
+import asyncio
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import SystemMessage
+from core.memory import ConversationMemory
+
+def history(n):
+    return [{"role": "ai" if i % 2 == 0 else "human", "content": f"m{i}"} for i in range(n)]
+
+def make_memory(responses=("摘要",), **state):
+    llm = FakeListChatModel(responses=list(responses))
+    return ConversationMemory.from_state(llm, state, window=4, summarize_every=2)
+
+def test_update_waits_for_full_batch():
+    memory = make_memory()
+    # 窗口 4 条 + 待合并 3 条，不足 summarize_every 轮 (4 条)
+    assert not memory.needs_update(7)
+    assert not memory.update(history(7))
+    assert memory.needs_update(8)
+
+def test_update_folds_only_messages_outside_window():
+    memory = make_memory(responses=[" 摘要1 ", "摘要2"])
+    msgs = history(8)
+    assert memory.update(msgs)
+    assert memory.state() == {"summary": "摘要1", "summarized_count": 4}
+    assert [m["content"] for m in memory.recent(msgs)] == ["m4", "m5", "m6", "m7"]
+
+    # 只把新增的消息交给 LLM
+    inputs = memory._summary_inputs(history(12), memory._foldable(12))
+    assert inputs["summary"] == "摘要1"
+    assert inputs["conversation"].splitlines() == ["ai: m4", "human: m5", "ai: m6", "human: m7"]
+
+def test_force_folds_partial_batch():
+    memory = make_memory()
+    assert memory.update(history(6), force=True)
+    assert memory.summarized_count == 2
+    assert not memory.update(history(6), force=True)
+
+def test_prompt_messages_stay_bounded_when_summary_lags():
+    # 后台摘要一直失败: 只保留最近 window + summarize_every 轮的原文
+    memory = make_memory()
+    messages = memory.to_messages(history(100))
+    assert len(messages) == 4 + 2 * 2
+    assert messages[-1].content == "m99"
+
+def test_summary_is_prepended_as_system_message():
+    memory = make_memory(summary="之前问过 GIL", summarized_count=96)
+    messages = memory.to_messages(history(100))
+    assert isinstance(messages[0], SystemMessage) and "之前问过 GIL" in messages[0].content
+    assert [m.content for m in messages[1:]] == ["m96", "m97", "m98", "m99"]
+
+def test_async_update_matches_sync():
+    memory = make_memory()
+    assert asyncio.run(memory.aupdate(history(8)))
+    assert memory.state() == {"summary": "摘要", "summarized_count": 4}
@@ -0,0 +1,65 @@
+"""LLMMetricsHandler 埋点 (假 LLM，逐字符分块返回)"""
+import asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from core.metrics import LLMMetricsHandler
+from database.models import SessionLocal, LLMCallMetric
+
+class FailingChatModel(FakeListChatModel):
+    def _stream(self, *args, **kwargs):
+        raise RuntimeError("boom")
+        yield
+
+def make_handler():
+    handler = LLMMetricsHandler(SessionLocal)
+    handler._ensure_writer = lambda: None # 不启动后台写线程，由测试显式 flush
+    return handler
+
+def recorded(db, handler):
+    handler.flush()
+    return db.query(LLMCallMetric).all()
+
+def test_early_stop_is_recorded_as_success(db):
+    handler = make_handler()
+    llm = FakeListChatModel(responses=["abcdefgh"], callbacks=[handler])
+    stream = llm.stream("q")
+    for i, _ in enumerate(stream):
+        if i == 2:
+            break
+    stream.close()
+
+    [row] = recorded(db, handler)
+    assert row.success and row.error is None
+    assert row.streamed and row.ttft_ms is not None
+    assert row.completion_tokens == 3
+
+def test_cancelled_async_stream_is_recorded_as_success(db):
+    handler = make_handler()
+    llm = FakeListChatModel(responses=["abcdefgh"], callbacks=[handler], sleep=0.05)
+
+    async def consume():
+        async for _ in llm.astream("q"):
+            pass
+
+    async def cancel_midway():
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.12)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_midway())
+    [row] = recorded(db, handler)
+    assert row.success and row.error is None
+    assert 0 < row.completion_tokens < len("abcdefgh")
+
+def test_model_error_is_recorded_as_failure(db):
+    handler = make_handler()
+    llm = FailingChatModel(responses=["unused"], callbacks=[handler])
+    with pytest.raises(RuntimeError):
+        list(llm.stream("q"))
+
+    [row] = recorded(db, handler)
+    assert not row.success
+    assert row.error == "RuntimeError: boom"
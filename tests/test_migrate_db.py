@@ -0,0 +1,28 @@
+"""migrate_db.add_missing_columns: 给旧版数据库补列"""
+from sqlalchemy import inspect, text
+
+import migrate_db
+from database.models import Base, engine
+
+def make_legacy_tables():
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(50) NOT NULL)"))
+        conn.execute(text("INSERT INTO users (id, username) VALUES (1, 'old')"))
+        conn.execute(text("CREATE TABLE study_plans (id INTEGER PRIMARY KEY, date DATE, content JSON)"))
+        conn.execute(text("INSERT INTO study_plans (id, date, content) VALUES (1, '2024-01-01', '[]')"))
+
+def columns(table):
+    return {col["name"] for col in inspect(engine).get_columns(table)}
+
+def test_skips_not_null_columns_without_default_and_continues(capsys):
+    make_legacy_tables()
+    migrate_db.add_missing_columns()
+
+    out = capsys.readouterr().out
+    assert "Skipped users.password_hash" in out
+    assert "password_hash" not in columns("users")
+    # 后面的列照常补上: Python 端数值默认值用作 DDL 默认值，server_default 原样使用
+    assert {"user_id", "task_count", "completed_count"} <= columns("study_plans")
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT user_id, task_count FROM study_plans")).one() == (1, 0)
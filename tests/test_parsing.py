@@ -0,0 +1,58 @@
+"""extract_json / IncrementalJSONParser 的容错，以及 schema 校验失败后的修复流程"""
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from pydantic import BaseModel
+from core.parsing import IncrementalJSONParser, JSONParseError, extract_json, parse_stats, parse_with_repair
+
+class Answer(BaseModel):
+    score: int
+    comment: str
+
+def test_fenced_json():
+    text = '好的，结果如下：\n```json\n{"score": 80, "comment": "ok"}\n```\n以上。'
+    assert extract_json(text) == {"score": 80, "comment": "ok"}
+
+def test_trailing_commas():
+    assert extract_json('{"a": [1, 2, ], "b": {"c": 1,},}') == {"a": [1, 2], "b": {"c": 1}}
+
+def test_trailing_comma_inside_string_is_kept():
+    assert extract_json('{"a": ",}"}') == {"a": ",}"}
+
+def test_truncated_array():
+    assert extract_json('{"tags": ["a", "b", "c') == {"tags": ["a", "b", "c"]}
+    assert extract_json('[1, 2, 3', expect="[") == [1, 2, 3]
+
+def test_truncated_string_value():
+    assert extract_json('{"score": 80, "comment": "回答很') == {"score": 80, "comment": "回答很"}
+
+def test_truncated_key_drops_incomplete_element():
+    assert extract_json('{"score": 80, "comm') == {"score": 80}
+
+def test_brace_in_preamble():
+    # 说明文字里不成对的 { 不能吞掉后面真正的 JSON
+    text = '注意 {这里不是 JSON。结果: {"score": 1, "comment": "x"}'
+    assert extract_json(text) == {"score": 1, "comment": "x"}
+
+def test_no_json_raises():
+    with pytest.raises(JSONParseError):
+        extract_json("没有任何结构化内容")
+
+def test_incremental_feed_completes_at_closing_brace():
+    parser = IncrementalJSONParser()
+    assert not parser.feed('前言 {"a": "}')
+    assert not parser.feed('", "b": [1')
+    assert parser.feed(']} 后面的内容')
+    assert parser.parse() == {"a": "}", "b": [1]}
+
+def test_schema_failure_falls_back_to_repair():
+    name = "test.repair"
+    # score 不是数字，校验失败后交给 LLM 修复
+    repair_llm = FakeListChatModel(responses=['{"score": 75, "comment": "fixed"}'])
+    result = parse_with_repair('{"score": "很高", "comment": "x"}', Answer, repair_llm, name=name)
+    assert result == {"score": 75, "comment": "fixed"}
+    row = next(r for r in parse_stats.snapshot() if r["name"] == name)
+    assert (row["parsed"], row["repaired"], row["failed"]) == (0, 1, 0)
+
+def test_schema_failure_without_llm_raises():
+    with pytest.raises(JSONParseError):
+        parse_with_repair('{"comment": "missing score"}', Answer, name="test.norepair")
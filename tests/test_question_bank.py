@@ -0,0 +1,65 @@
+"""QuestionBank: 倒排索引查询与 JSON / CSV / SQLite 加载"""
+import csv
+import json
+import sqlite3
+import pytest
+from core.data.real_questions import QuestionBank, load_question_bank
+
+QUESTIONS = [
+    {"topic": "MySQL", "company": "美团", "year": "2024", "question": "q1", "difficulty": "困难", "tags": ["索引", "MVCC"]},
+    {"topic": "MySQL", "company": "字节跳动", "year": "2023", "question": "q2", "difficulty": "中等", "tags": ["索引"]},
+    {"topic": "Redis", "company": "美团", "year": "2024", "question": "q3", "difficulty": "困难", "tags": ["持久化"]},
+]
+
+def questions(result):
+    return [q["question"] for q in result]
+
+def test_query_intersects_fields():
+    bank = QuestionBank(QUESTIONS)
+    assert questions(bank.query(topic="MySQL", difficulty="困难")) == ["q1"]
+    assert questions(bank.query(company="美团", year=2024)) == ["q1", "q3"]
+    assert bank.query(topic="MySQL", company="阿里") == []
+
+def test_list_value_is_or_within_field():
+    bank = QuestionBank(QUESTIONS)
+    assert questions(bank.query(tags=["MVCC", "持久化"])) == ["q1", "q3"]
+    assert questions(bank.query(tags="索引", company="字节跳动")) == ["q2"]
+
+def test_no_filters_and_none_values_return_all():
+    bank = QuestionBank(QUESTIONS)
+    assert len(bank) == 3
+    assert questions(bank.query()) == questions(bank.query(topic=None)) == ["q1", "q2", "q3"]
+    assert bank.values("topic") == ["MySQL", "Redis"]
+
+def test_unknown_field_raises():
+    with pytest.raises(ValueError):
+        QuestionBank(QUESTIONS).query(question="q1")
+
+def test_loaders_build_the_same_index(tmp_path):
+    json_path = tmp_path / "bank.json"
+    json_path.write_text(json.dumps(QUESTIONS, ensure_ascii=False), encoding="utf-8")
+
+    csv_path = tmp_path / "bank.csv"
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(QUESTIONS[0]))
+        writer.writeheader()
+        for q in QUESTIONS:
+            writer.writerow({**q, "tags": "|".join(q["tags"])})
+
+    db_path = tmp_path / "bank.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE questions (topic, company, year, question, difficulty, tags)")
+    conn.executemany(
+        "INSERT INTO questions VALUES (?, ?, ?, ?, ?, ?)",
+        [(q["topic"], q["company"], q["year"], q["question"], q["difficulty"], json.dumps(q["tags"], ensure_ascii=False)) for q in QUESTIONS]
+    )
+    conn.commit()
+    conn.close()
+
+    for path in (json_path, csv_path, db_path):
+        bank = load_question_bank(str(path))
+        assert questions(bank.query(tags="索引", company="美团")) == ["q1"]
+
+def test_unsupported_format_raises(tmp_path):
+    with pytest.raises(ValueError):
+        load_question_bank(str(tmp_path / "bank.xlsx"))
@@ -0,0 +1,19 @@
+"""ScoutAgent.analyze_jobs (假 LLM): 失败的分析不写回，仍算待分析"""
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from core.agents.scout import ScoutAgent
+
+GOOD = '{"estimated_salary": "30k", "insider_comment": "不错"}'
+
+def test_failed_analysis_stays_pending(db):
+    jobs = [{"content": "JD"}]
+    # 第一次回复无法解析 -> 兜底结果带 error
+    scout = ScoutAgent(FakeListChatModel(responses=["不是 JSON"]))
+    [(idx, analysis)] = list(scout.analyze_jobs(jobs, use_cache=False))
+    assert idx == 0 and "error" in analysis
+    assert "analysis" not in jobs[0] and jobs[0]["analysis_error"] == analysis["error"]
+
+    # 再次批量分析会重试，成功后清掉错误
+    scout = ScoutAgent(FakeListChatModel(responses=[GOOD]))
+    [(_, analysis)] = list(scout.analyze_jobs(jobs, use_cache=False))
+    assert jobs[0]["analysis"] == analysis and analysis["insider_comment"] == "不错"
+    assert "analysis_error" not in jobs[0]
@@ -0,0 +1,59 @@
+"""BM25 SearchIndex: 中英文分词、排序、增量增删与持久化"""
+from core.search import SearchIndex, tokenize
+
+def make_index():
+    index = SearchIndex()
+    index.add_document("1", "Redis 缓存雪崩", "缓存雪崩是大量 key 同时过期导致请求打到数据库", signature="s1")
+    index.add_document("2", "MySQL 索引", "B+ 树索引与回表，覆盖索引可以减少回表", signature="s2")
+    index.add_document("3", "Kafka 消息队列", "消息堆积时可以扩容消费者，redis 也能做简单队列", signature="s3")
+    return index
+
+def ids(results):
+    return [doc_id for doc_id, _ in results]
+
+def test_tokenize_mixed_text():
+    assert tokenize("Redis 缓存雪崩") == ["redis", "缓存", "存雪", "雪崩"]
+    assert tokenize("B+ 树") == ["b", "树"]
+    assert tokenize("") == []
+
+def test_search_ranks_title_matches_first():
+    index = make_index()
+    # 两篇都提到 redis，标题命中的排在前面
+    assert ids(index.search("redis")) == ["1", "3"]
+    assert ids(index.search("回表")) == ["2"]
+    assert index.search("不存在的词") == []
+    assert index.search("  ") == []
+
+def test_limit():
+    assert len(make_index().search("redis", limit=1)) == 1
+
+def test_incremental_add_and_remove():
+    index = make_index()
+    index.remove_document("1")
+    assert "1" not in index and len(index) == 2
+    assert ids(index.search("雪崩")) == []
+    assert ids(index.search("redis")) == ["3"]
+
+    # 覆盖已有文档时旧词不再命中
+    index.add_document("2", "MySQL 事务", "MVCC 与隔离级别", signature="s2b")
+    assert ids(index.search("回表")) == []
+    assert ids(index.search("mvcc")) == ["2"]
+    assert index.signature("2") == "s2b"
+    assert index.total_length == sum(index.doc_lengths.values())
+
+def test_save_and_load_round_trip(tmp_path):
+    index = make_index()
+    path = str(tmp_path / "index.json")
+    index.save(path)
+
+    loaded = SearchIndex.load_or_create(path)
+    assert len(loaded) == 3 and loaded.signature("3") == "s3"
+    assert loaded.search("redis") == index.search("redis")
+    # 加载后的索引仍可增量删除
+    loaded.remove_document("1")
+    assert ids(loaded.search("redis")) == ["3"]
+
+def test_corrupt_index_file_is_rebuilt(tmp_path):
+    path = tmp_path / "index.json"
+    path.write_text("{broken", encoding="utf-8")
+    assert len(SearchIndex.load_or_create(str(path))) == 0
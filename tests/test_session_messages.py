@@ -0,0 +1,38 @@
+"""add_message_to_session: 逐条写入消息，旧版 messages JSON 首次追加时拆分"""
+from sqlalchemy import event
+from database import crud
+from database.models import engine, InterviewSession
+
+def count_updates(fn):
+    statements = []
+    def before(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("UPDATE"):
+            statements.append(statement)
+    event.listen(engine, "before_cursor_execute", before)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
+    return statements
+
+def test_new_session_append_has_no_update(db):
+    sess = crud.create_interview_session(db, 1, "Redis")
+    # 旧版本建会话时写入的是空列表
+    sess.legacy_messages = []
+    db.commit()
+    updates = count_updates(lambda: crud.add_message_to_session(db, sess.id, "ai", "第一题"))
+    assert updates == []
+    assert [m["content"] for m in crud.get_session_messages(db, sess.id)] == ["第一题"]
+
+def test_legacy_messages_are_exploded_before_append(db):
+    sess = crud.create_interview_session(db, 1, "Redis")
+    sess.legacy_messages = [
+        {"role": "ai", "content": "旧题", "timestamp": "2024-01-01T00:00:00"},
+        {"role": "human", "content": "旧答", "timestamp": "2024-01-01T00:01:00"},
+    ]
+    db.commit()
+
+    crud.add_message_to_session(db, sess.id, "ai", "新题")
+    assert [m["content"] for m in crud.get_session_messages(db, sess.id)] == ["旧题", "旧答", "新题"]
+    db.expire_all()
+    assert db.get(InterviewSession, sess.id).legacy_messages is None
@@ -0,0 +1,81 @@
+"""SingleFlight: 并发的相同请求只执行一次，结果和异常共享给所有调用方"""
+import asyncio
+import threading
+import pytest
+from core.llm import SingleFlight
+
+def run_concurrently(flight, key, fn, n=5):
+    """n 个线程同时以同一 key 调用，返回各自拿到的结果 (异常对象也作为结果)"""
+    results = [None] * n
+    def worker(i):
+        try:
+            results[i] = flight.do(key, fn)
+        except Exception as e:
+            results[i] = e
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+    return results
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+    def fn():
+        calls.append(1)
+        release.wait(timeout=5)
+        return "result"
+
+    # 领头的调用阻塞到其余线程都已在等待时才返回
+    threading.Timer(0.2, release.set).start()
+    results = run_concurrently(flight, "k", fn)
+    assert results == ["result"] * 5
+    assert len(calls) == 1 and flight.shared == 4
+
+def test_exception_is_shared_and_key_is_released():
+    flight = SingleFlight()
+    release = threading.Event()
+    def fail():
+        release.wait(timeout=5)
+        raise RuntimeError("boom")
+
+    threading.Timer(0.2, release.set).start()
+    results = run_concurrently(flight, "k", fail, n=3)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    # 结束后同一 key 重新执行，不会拿到旧的异常
+    assert flight.do("k", lambda: "ok") == "ok"
+
+def test_different_keys_run_independently():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.shared == 0
+
+def test_async_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+    async def fetch(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return value * 2
+
+    async def main():
+        return await asyncio.gather(*(flight.ado("k", fetch, 21) for _ in range(4)))
+
+    assert asyncio.run(main()) == [42] * 4
+    assert calls == [21] and flight.shared == 3
+
+def test_async_exception_is_shared():
+    flight = SingleFlight()
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise ValueError("bad")
+
+    async def main():
+        return await asyncio.gather(*(flight.ado("k", fail) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in asyncio.run(main()))
+    with pytest.raises(ValueError):
+        asyncio.run(flight.ado("k", fail))
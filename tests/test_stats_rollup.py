@@ -0,0 +1,49 @@
+"""user_stats / user_topic_stats 汇总表的增量维护"""
+import json
+
+from database import crud
+from database.models import SessionLocal, UserStats, UserTopicStats
+
+TASKS = [{"topic": "Redis", "status": "completed"}, {"topic": "MySQL", "status": "pending"}]
+
+def test_first_writes_for_new_user_build_rollup(db):
+    crud.create_daily_plan(db, 1, TASKS, "加油")
+    session = crud.create_interview_session(db, 1, "Redis")
+    crud.update_session_feedback(db, session.id, "85分", json.dumps({"weaknesses": ["持久化"]}))
+
+    stats = crud.get_study_stats(db, 1)
+    assert (stats["total_days"], stats["total_tasks"], stats["completed_tasks"]) == (1, 2, 1)
+    assert (stats["finished_sessions"], stats["average_score"]) == (1, 85)
+    assert crud.get_topic_score_stats(db, 1) == [{"topic": "Redis", "sessions": 1, "average_score": 85}]
+
+def test_insert_ignore_keeps_caller_transaction(db):
+    assert crud._insert_ignore(db, UserTopicStats, user_id=1, topic="Redis", session_count=1, score_sum=60)
+    session = crud.create_interview_session(db, 1, "Redis") # 提交了上面的插入
+    session.topic = "Redis 2"
+    # 主键冲突被忽略，同一事务中调用方的改动照常提交
+    assert not crud._insert_ignore(db, UserTopicStats, user_id=1, topic="Redis", session_count=9, score_sum=9)
+    db.commit()
+    assert db.get(UserTopicStats, (1, "Redis")).score_sum == 60
+    assert crud.get_interview_session(db, session.id).topic == "Redis 2"
+
+def test_topic_row_created_by_another_writer_gets_delta(db):
+    other = SessionLocal()
+    crud._bump_topic_stats(other, 1, "Redis", session_count=1, score_sum=70)
+    other.commit()
+    other.close()
+
+    crud._bump_topic_stats(db, 1, "Redis", session_count=1, score_sum=90)
+    db.commit()
+    row = db.get(UserTopicStats, (1, "Redis"))
+    assert (row.session_count, row.score_sum) == (2, 160)
+
+def test_rebuild_overwrites_row_inserted_by_another_writer(db):
+    other = SessionLocal()
+    other.add(UserStats(user_id=1, total_days=5, total_tasks=5, completed_tasks=5, finished_sessions=0, score_sum=0))
+    other.commit()
+    other.close()
+
+    crud.create_daily_plan(db, 1, TASKS, "加油")
+    crud._rebuild_user_stats(db, 1)
+    db.commit()
+    assert crud.get_study_stats(db, 1)["total_days"] == 1
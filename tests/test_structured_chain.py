@@ -0,0 +1,78 @@
+"""StructuredChain 文本路径 (假 LLM): 响应缓存与埋点"""
+import asyncio
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+from core.llm import LLMResponseCache
+from core.metrics import LLMMetricsHandler
+from core.parsing import StructuredChain
+from database.models import SessionLocal, LLMCallMetric
+
+PROMPT = ChatPromptTemplate.from_messages([("user", "{question}")])
+
+class Answer(BaseModel):
+    score: int
+    comment: str
+
+def make_chain(llm):
+    return StructuredChain(PROMPT, llm, Answer, "test", "answer", mode=None)
+
+def make_handler():
+    handler = LLMMetricsHandler(SessionLocal)
+    handler._ensure_writer = lambda: None # 不启动后台写线程，由测试显式 flush
+    return handler
+
+def test_text_path_uses_response_cache(db):
+    cache = LLMResponseCache(SessionLocal)
+    # 第二次调用若未命中缓存会拿到另一条回复
+    llm = FakeListChatModel(responses=['{"score": 80, "comment": "ok"} 说明', '{"score": 1, "comment": "miss"}'], cache=cache)
+    chain = make_chain(llm)
+
+    assert chain.invoke({"question": "q"}) == {"score": 80, "comment": "ok"}
+    assert chain.invoke({"question": "q"}) == {"score": 80, "comment": "ok"}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+def test_async_text_path_uses_response_cache(db):
+    cache = LLMResponseCache(SessionLocal)
+    llm = FakeListChatModel(responses=['{"score": 70, "comment": "a"}', '{"score": 1, "comment": "miss"}'], cache=cache)
+    chain = make_chain(llm)
+
+    first = asyncio.run(chain.ainvoke({"question": "q"}))
+    assert asyncio.run(chain.ainvoke({"question": "q"})) == first == {"score": 70, "comment": "a"}
+    assert cache.hits == 1
+
+def test_text_path_records_successful_metrics_row(db):
+    handler = make_handler()
+    llm = FakeListChatModel(responses=['前言 {"score": 90, "comment": "好"} 后记'], callbacks=[handler])
+
+    assert make_chain(llm).invoke({"question": "q"}) == {"score": 90, "comment": "好"}
+    handler.flush()
+    rows = db.query(LLMCallMetric).all()
+    assert [(r.agent, r.method, r.success, r.error) for r in rows] == [("test", "answer", True, None)]
+
+class BadRequest(Exception):
+    status_code = 400
+
+def make_rejecting_chain(message):
+    """结构化路径恒返回 400 的 chain，文本路径用假 LLM"""
+    llm = FakeListChatModel(responses=['{"score": 60, "comment": "text"}'])
+    chain = make_chain(llm)
+    chain.mode = "json_schema"
+    chain._support_key = (message, chain.mode) # 每个用例独立的 key，互不影响
+    def reject(_):
+        raise BadRequest(message)
+    chain.structured_chain = RunnableLambda(reject)
+    return chain
+
+def test_unrelated_400_falls_back_for_one_call_only(db):
+    chain = make_rejecting_chain("This model's maximum context length is 8192 tokens")
+    assert chain.invoke({"question": "q"}) == {"score": 60, "comment": "text"}
+    assert chain.structured
+
+def test_structured_param_rejection_is_remembered(db):
+    chain = make_rejecting_chain("Invalid parameter: 'response_format' of type 'json_schema' is not supported")
+    assert chain.invoke({"question": "q"}) == {"score": 60, "comment": "text"}
+    assert not chain.structured